@@ -6,7 +6,9 @@
 import sys, os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+import io
 import os
+import time
 import secrets
 from datetime import datetime
 
@@ -14,8 +16,8 @@ from datetime import datetime
 from flask import (
     Flask, request, render_template,
     redirect, url_for, flash,
-    send_from_directory, current_app,
-    session, g, send_file, abort
+    current_app,
+    session, g, send_file, abort, stream_with_context
 )
 from dotenv import load_dotenv
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -43,9 +45,21 @@ if not app.debug:
     logging.basicConfig(level=logging.INFO)
 
 from backend.order_processing import create_order
-from backend.db import execute
-from backend.shop_routes import shop_bp
-from backend.email_utils import init_mail
+from backend.db import execute, pool_stats, transaction, start_recording, stop_recording
+from backend.shop_routes import shop_bp, render_order_page
+from backend.email_utils import init_mail, queue_staff_welcome_email
+from backend.dashboard import parse_filters, fetch_orders_page, fetch_facets, fetch_order_ids
+from backend.rollups import milestone_summary
+from backend.orders import get_order, load_order
+from backend.cache import ORDER_CACHE_TTL, cache_stats, invalidate_order
+from backend.documents import resolve_document, can_download, ensure_document, stream_work_orders, remove_order_files
+from backend.bulk_import import read_rows, import_orders
+from backend.live import event_stream, parse_event_id, feed
+from backend.events import record as record_event, order_timeline, employee_timeline
+from backend.analytics import weekly_throughput, stage_times, daily_completions
+from backend.search import search_orders
+from backend.labels import load_labels, render_labels
+from backend import metrics
 
 init_mail(app)  # Initialize Flask-Mail with app config
 
@@ -157,27 +171,9 @@ def create_order_page():
 
         flash(f"Invoice #{info['invoice_no']} created successfully!", "success")
 
-        # ————— Generate & persist a one-time registration token —————
-        customer_id = info["customer_id"]
-        token = secrets.token_urlsafe(16)
-        # store it on the customer record
-        execute(
-            "UPDATE customers SET register_token=%s WHERE customer_id=%s",
-            (token, customer_id)
-        )
-
-        # ————— Email the “complete your registration” link —————
-        from backend.email_utils import send_registration_email
-        try:
-            send_registration_email(
-                user_id=customer_id,
-                to_addr=email,
-                token=token,
-                order_id=info["order_id"],
-            )
-            app.logger.info("Registration email queued to %s", email)
-        except Exception as ex:
-            app.logger.error("Failed to send registration email: %s", ex)
+        # The registration token and "complete your registration" email were
+        # written in the order's transaction; the worker sends the email.
+        app.logger.info("Registration email queued to %s", email)
 
         # ————— Redirect to order confirmation page —————
         return redirect(url_for("order_created", order_id=info["order_id"]))
@@ -194,6 +190,79 @@ def email_config():
       "PW":     repr(app.config.get("MAIL_PASSWORD"))  # show quotes if any
     }
 
+@app.route("/pool-stats")
+def pool_stats_view():
+    if not session.get("is_staff"):
+        abort(403)
+    return pool_stats()
+
+@app.route("/cache-stats")
+def cache_stats_view():
+    if not session.get("is_staff"):
+        abort(403)
+    return cache_stats()
+
+# Orders are also changed by other processes (gunicorn workers, the
+# background worker, archive runs); the change feed drops this process's
+# cached copies of them (backend/live.py). Started on the first request
+# rather than at import, so it runs in each worker after the fork.
+@app.before_request
+def start_change_feed():
+    if ORDER_CACHE_TTL > 0:
+        feed.start()
+
+# ————— Prometheus metrics —————
+# Request latency and status counts for every endpoint, plus what
+# backend/metrics.py collects from the database, PDF/QR rendering and
+# email. /metrics adds up every worker process; Prometheus scrapes it with
+# "Authorization: Bearer $METRICS_TOKEN" (staff can open it when logged in).
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+metrics.start()
+
+@app.before_request
+def start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        # unknown URLs share one label so they can't grow the series count
+        endpoint = request.endpoint or "unmatched"
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started,
+                                             endpoint=endpoint, method=request.method)
+        metrics.HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method,
+                                  status=response.status_code)
+    return response
+
+@app.route("/metrics")
+def metrics_view():
+    token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    if not session.get("is_staff") and not (METRICS_TOKEN and secrets.compare_digest(token, METRICS_TOKEN)):
+        abort(403)
+    return app.response_class(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+# ————— Query budget —————
+# Every statement a request runs is recorded (backend/db.py). Requests over
+# QUERY_BUDGET statements or QUERY_TIME_BUDGET seconds of SQL, or running
+# one statement REPEATED_QUERY_LIMIT or more times (an N+1 loop), are
+# logged with what went over, so regressions show up before production.
+@app.before_request
+def start_query_log():
+    if request.endpoint not in FILE_ENDPOINTS:
+        g.queries = start_recording()
+
+@app.teardown_request
+def check_query_budget(exc):
+    queries = g.pop("queries", None)
+    if queries is None:
+        return
+    stop_recording(queries)
+    problems = queries.problems()
+    if problems:
+        app.logger.warning("%s %s (%s) over query budget: %s", request.method, request.path,
+                           request.endpoint, "; ".join(problems))
+
 
 @app.route("/test-email")
 def test_email():
@@ -228,10 +297,103 @@ def order_created(order_id):
         current_year=datetime.now().year
     )
 
-
+# Work-order PDFs are built on first download and cached under a hash of the
+# order data (backend/documents.py); the hash is the ETag. Staff can open
+# either copy, customers the client copy of their own orders; anyone else
+# gets a 404 before anything is rendered
 @app.route("/work_orders/<path:filename>")
 def work_orders(filename):
-    return send_from_directory("static/work_orders", filename)
+    doc = resolve_document(filename, BASE_URL)
+    if doc is None or not can_download(doc, session.get("customer_id"),
+                                       bool(session.get("is_staff"))):
+        abort(404)
+    if doc.etag in request.if_none_match:
+        resp = app.response_class(status=304)
+        resp.set_etag(doc.etag)
+        return resp
+    path = ensure_document(doc, BASE_URL)
+    return send_file(path, mimetype="application/pdf", etag=doc.etag,
+                     download_name=filename)
+
+# Print every order matching the dashboard filters (e.g. due this week, or at
+# one milestone) as a single PDF, streamed page by page while it renders
+BATCH_PRINT_MAX = int(os.getenv("BATCH_PRINT_MAX", 1000))
+
+@app.route("/print/work_orders.pdf")
+def print_work_orders():
+    if not session.get("is_staff"):
+        flash("Staff login required.", "danger")
+        return redirect(url_for("login"))
+    filters = parse_filters(request.args)
+    order_ids = fetch_order_ids(filters, BATCH_PRINT_MAX)
+    if not order_ids:
+        flash("No orders match these filters.", "info")
+        return redirect(url_for("portal", **request.args))
+    return app.response_class(
+        stream_with_context(stream_work_orders(order_ids, BASE_URL, archived=filters["archived"])),
+        mimetype="application/pdf",
+        headers={"Content-Disposition": 'inline; filename="work_orders.pdf"'},
+    )
+
+# Barcode labels for every item of one order (?order_id=), or of every order
+# matching the dashboard filters, as one PDF of label sheets
+@app.route("/print/labels.pdf")
+def print_item_labels():
+    if not session.get("is_staff"):
+        flash("Staff login required.", "danger")
+        return redirect(url_for("login"))
+    order_id = request.args.get("order_id", type=int)
+    if order_id is not None:
+        order_ids = [order_id]
+    else:
+        order_ids = fetch_order_ids(parse_filters(request.args), BATCH_PRINT_MAX)
+    items = load_labels(order_ids) if order_ids else []
+    if not items:
+        flash("No items to label for these orders.", "info")
+        return redirect(request.referrer or url_for("portal"))
+    buf = io.BytesIO()
+    render_labels(items, buf)
+    buf.seek(0)
+    return send_file(buf, mimetype="application/pdf", download_name="item_labels.pdf")
+
+# Live order/milestone changes for the dashboard and order pages
+# (server-sent events fed by Postgres NOTIFY, see backend/live.py). Each open
+# stream holds a web thread until it ends and the browser reconnects, see
+# WEB_THREADS in gunicorn.conf.py
+@app.route("/events")
+def events():
+    if not session.get("is_staff"):
+        abort(403)
+    last_event_id = parse_event_id(request.headers.get("Last-Event-ID"))
+    return app.response_class(
+        stream_with_context(event_stream(last_event_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# ————— Scan event timelines (staff only) —————
+# Status changes from scans and edits, from the scan_events log
+@app.route("/timeline/order/<int:order_id>")
+def order_timeline_json(order_id):
+    if not session.get("is_staff"):
+        abort(403)
+    return {"events": order_timeline(order_id)}
+
+@app.route("/timeline/employee/<int:employee_id>")
+def employee_timeline_json(employee_id):
+    if not session.get("is_staff"):
+        abort(403)
+    limit = min(request.args.get("limit", 200, type=int), 1000)
+    return {"events": employee_timeline(employee_id, limit)}
+
+# ————— Order search (staff only) —————
+# Ranked matches from the order_search index; see backend/search.py
+@app.route("/search")
+def search():
+    if not session.get("is_staff"):
+        abort(403)
+    page = max(request.args.get("page", 1, type=int), 1)
+    return search_orders(request.args.get("q", ""), page)
 
 # ————— Customer registration via token —————
 @app.route("/register", methods=["GET", "POST"])
@@ -246,7 +408,7 @@ def register():
             info_message="To register, please use the link sent to your email after placing an order."
         )
     rows = execute(
-        "SELECT customer_id, email FROM customers WHERE register_token = %s",
+        "SELECT customer_id, email, name FROM customers WHERE register_token = %s",
         (token,)
     )
     if not rows:
@@ -274,6 +436,7 @@ def register():
             )
             session["customer_id"] = cust["customer_id"]
             session["user_id"] = cust["customer_id"]  # or whatever your user ID field is
+            remember_name(cust["name"])
             flash("Registration complete! Welcome.", "success")
             return redirect(url_for("client_dashboard"))
         # now send directly to the status page
@@ -289,13 +452,14 @@ def login():
         email = request.form["email"].strip()
         pw    = request.form["password"]
         rows = execute(
-            "SELECT customer_id, password_hash, is_staff FROM customers WHERE email = %s",
+            "SELECT customer_id, name, password_hash, is_staff FROM customers WHERE email = %s",
             (email,)
         )
         if rows and rows[0]["password_hash"] and check_password_hash(rows[0]["password_hash"], pw):
             session["customer_id"] = rows[0]["customer_id"]
             session["user_id"] = rows[0]["customer_id"]  # or whatever your user ID field is
             session["is_staff"] = bool(rows[0].get("is_staff", False))
+            remember_name(rows[0]["name"])
             if session["is_staff"]:
                 return redirect(url_for("portal"))
             else:
@@ -308,6 +472,8 @@ def logout():
     session.pop("customer_id", None)
     session.pop("user_id", None)
     session.pop("is_staff", None)
+    session.pop("customer_name", None)
+    session.pop("customer_name_at", None)
     return redirect(url_for("home"))
 
 
@@ -318,39 +484,15 @@ def client_dashboard():
     if not cid:
         return redirect(url_for("login"))
     
+    # progress_status is a stored rollup of the order's milestones
     orders = execute(
-        "SELECT order_id, invoice_no, due_date, notes, status, client_pdf_path "
+        "SELECT order_id, invoice_no, due_date, notes, status, client_pdf_path, "
+        "progress_status AS computed_status "
         "FROM orders WHERE customer_id=%s "
         "ORDER BY invoice_no DESC",
         (cid,)
     ) or []
 
-    # Add computed status logic for client dashboard too
-    if orders:
-        order_ids = [o["order_id"] for o in orders]
-        
-        # Pull milestone statuses for these orders
-        ms = execute(
-            "SELECT order_id, status FROM order_milestones WHERE order_id IN %s",
-            (tuple(order_ids),)
-        ) or []
-
-        # Group statuses per order
-        from collections import defaultdict
-        grouped = defaultdict(list)
-        for r in ms:
-            grouped[r["order_id"]].append(r["status"])
-
-        # Compute master status per order
-        for o in orders:
-            sts = grouped[o["order_id"]]
-            if not sts or all(s == "Not Started" for s in sts):
-                o["computed_status"] = "Not Started"
-            elif all(s == "Completed" for s in sts):
-                o["computed_status"] = "Completed"
-            else:
-                o["computed_status"] = "In Progress"
-
     return render_template("client_dashboard.html", orders=orders)
 
 
@@ -361,28 +503,16 @@ def order_status(order_id):
     if not cid:
         return redirect(url_for("login"))
 
-    # fetch the single order, ensure it belongs to them
-    rows = execute(
-        "SELECT order_id, invoice_no, created_at, due_date, notes "
-        "FROM orders WHERE order_id=%s AND customer_id=%s",
-        (order_id, cid)
-    )
-    if not rows:
+    # order + milestones in one read; ensure it belongs to them
+    data = get_order(order_id)
+    if not data or data["order"]["customer_id"] != cid:
         flash(f"Order #{order_id} not found.", "danger")
         return redirect(url_for("client_dashboard"))
-    order = rows[0]
-
-    # fetch the milestone history
-    milestones = execute(
-        "SELECT milestone, created_at "
-        "FROM order_milestones WHERE order_id=%s ORDER BY created_at",
-        (order_id,)
-    ) or []
 
     return render_template(
         "status.html",
-        order=order,
-        milestones=milestones
+        order=data["order"],
+        milestones=data["milestones"]
     )
 # ————— Staff portal (master dashboard) —————
 @app.route("/portal")
@@ -391,97 +521,106 @@ def portal():
         flash("Staff login required.", "danger")
         return redirect(url_for("login"))
 
-    # fetch all orders
-    orders = execute(
-        """
-        SELECT o.*, c.name AS customer_name, c.email AS customer_email
-        FROM orders o
-        JOIN customers c ON o.customer_id = c.customer_id
-        ORDER BY o.order_id DESC
-        """
-    ) or []
+    # one page of orders; filters, sorting and paging run in SQL
+    filters = parse_filters(request.args)
+    page = fetch_orders_page(
+        filters,
+        after=request.args.get("after", type=int),
+        before=request.args.get("before", type=int),
+    )
+    orders = page["orders"]
 
-    # fetch counts by milestone name
-    milestone_counts = {}
-    if orders:
-        order_ids = [o["order_id"] for o in orders]
-        rows = execute(
-            "SELECT milestone_name, COUNT(*) AS count "
-            "FROM order_milestones WHERE order_id IN %s "
-            "GROUP BY milestone_name",
-            (tuple(order_ids),)
-        ) or []
-        for row in rows:
-            milestone_counts[row["milestone_name"]] = row["count"]
-
-        # now pull every milestone status for those orders
-        ms = execute(
-            "SELECT order_id, status FROM order_milestones WHERE order_id IN %s",
-            (tuple(order_ids),)
-        ) or []
-
-        # group statuses per order
-        from collections import defaultdict
-        grouped = defaultdict(list)
-        for r in ms:
-            grouped[r["order_id"]].append(r["status"])
-
-        # compute a master status per order
-        for o in orders:
-            sts = grouped[o["order_id"]]
-            if not sts or all(s == "Not Started" for s in sts):
-                o["computed_status"] = "Not Started"
-            elif all(s == "Completed" for s in sts):
-                o["computed_status"] = "Completed"
-            else:
-                o["computed_status"] = "In Progress"
+    # counts by milestone name, read from the trigger-maintained summary
+    milestone_counts = milestone_summary()
 
     return render_template(
         "master_dashboard.html",
         orders=orders,
+        page=page,
+        filters=filters,
+        facets=fetch_facets(filters),
         milestone_counts=milestone_counts
     )
 
 # ————— Edit order milestones (staff only) —————
+MILESTONE_STATUSES = ("Not Started", "In Progress", "Completed")
+
 @app.route("/order/<int:order_id>/edit", methods=["POST"])
 @login_required
 def edit_order(order_id):
     if not session.get("is_staff"):
         flash("Unauthorized", "danger")
-        return redirect(url_for("view_order", order_id=order_id))
-
-    # First, get the current milestone statuses
-    current_milestones = execute(
-        "SELECT milestone_id, status FROM order_milestones WHERE order_id = %s",
-        (order_id,)
-    ) or []
-    
-    # Create a dict of current statuses
-    current_status = {str(m["milestone_id"]): m["status"] for m in current_milestones}
+        return redirect(url_for("shop.view_order", order_id=order_id))
 
-    updated = 0
+    # Each select comes with the status and row version it was rendered
+    # with; only milestones the user actually changed are written
+    edits = []
     for field, value in request.form.items():
-        if field.startswith("milestone_status_"):
-            try:
-                milestone_id = int(field.replace("milestone_status_", ""))
-                milestone_id_str = str(milestone_id)
-                
-                # Only update if the status has actually changed
-                if milestone_id_str in current_status and current_status[milestone_id_str] != value:
-                    execute(
-                        "UPDATE order_milestones SET status = %s WHERE milestone_id = %s",
-                        (value, milestone_id)
-                    )
-                    updated += 1
-            except (ValueError, IndexError):
-                continue
-
-    if updated > 0:
+        if not field.startswith("milestone_status_"):
+            continue
+        suffix = field[len("milestone_status_"):]
+        if value == request.form.get(f"milestone_was_{suffix}"):
+            continue
+        try:
+            edits.append((int(suffix), order_id, value, int(request.form[f"milestone_version_{suffix}"])))
+        except (ValueError, KeyError):
+            abort(400)
+        if value not in MILESTONE_STATUSES:
+            abort(400)
+
+    # Lock the order's milestones, refuse the whole edit if any of them
+    # changed since the form was rendered, otherwise apply every change in
+    # one statement; either all of it is saved or none
+    conflicts, updated = [], []
+    if edits:
+        with transaction() as tx:
+            current = tx.fetchall(
+                "SELECT milestone_id, milestone_name, status, version FROM order_milestones "
+                "WHERE order_id = %s ORDER BY milestone_id FOR UPDATE",
+                (order_id,)
+            )
+            by_id = {m["milestone_id"]: m for m in current}
+            conflicts = [by_id.get(e[0]) or {"milestone_id": e[0], "milestone_name": None}
+                         for e in edits
+                         if e[0] not in by_id or by_id[e[0]]["version"] != e[3]]
+            if not conflicts:
+                updated = tx.execute_values(
+                    """
+                    UPDATE order_milestones m
+                       SET status = v.status
+                      FROM (VALUES %s) AS v(milestone_id, order_id, status, version),
+                           order_milestones old
+                     WHERE m.milestone_id = v.milestone_id
+                       AND m.order_id = v.order_id
+                       AND m.version = v.version
+                       AND old.milestone_id = m.milestone_id
+                    RETURNING m.milestone_id, m.status, old.status AS previous_status,
+                              now() AS changed_at
+                    """,
+                    edits,
+                    fetch=True,
+                )
+
+    if conflicts:
+        # someone else saved first: show them the current statuses instead,
+        # read past the cache, which may not have caught up with that save
+        data = load_order(order_id)
+        if not data:
+            abort(404)
+        return render_order_page(data, order_timeline(order_id), conflicts=conflicts), 409
+
+    for row in updated:
+        record_event(order_id=order_id, milestone_id=row["milestone_id"], status=row["status"],
+                     previous_status=row["previous_status"], source="edit",
+                     employee_id=session.get("user_id"), scan_time=row["changed_at"])
+
+    if updated:
+        invalidate_order(order_id)
         flash("All changes have been saved", "success")
     else:
         flash("No changes were made", "info")
 
-    return redirect(url_for("view_order", order_id=order_id))
+    return redirect(url_for("shop.view_order", order_id=order_id))
 
 # ————— Add new staff user (staff only) —————
 @app.route("/add_staff", methods=["GET", "POST"])
@@ -501,41 +640,71 @@ def add_staff():
             return render_template("add_staff.html")
 
         password_hash = generate_password_hash(password)
-        # Insert new staff user into the database
-        execute(
-            "INSERT INTO customers (name, email, password_hash, is_staff) VALUES (%s, %s, %s, TRUE)",
-            (name, email, password_hash)
-        )
-
-        # Send welcome email to staff
-        from backend.email_utils import mail, Message
-        msg = Message(
-            subject="Your Staff Account Has Been Created",
-            recipients=[email],
-            body=f"Hello {name},\n\nYour staff account for Lousso Designs has been created.\nYou can now log in at {app.config['BASE_URL']}/login\n\nIf you did not request this, please contact your administrator."
-        )
-        try:
-            mail.send(msg)
-        except Exception as e:
-            flash(f"Staff user added, but failed to send email: {e}", "warning")
+        # Insert new staff user and queue their welcome email together
+        with transaction() as tx:
+            tx.execute(
+                "INSERT INTO customers (name, email, password_hash, is_staff) VALUES (%s, %s, %s, TRUE)",
+                (name, email, password_hash)
+            )
+            queue_staff_welcome_email(tx, email, name, app.config['BASE_URL'])
 
         flash("Staff user added!", "success")
         return redirect(url_for("portal"))
     return render_template("add_staff.html")
 
-# ————— Scan view for staff (view order milestones) —————
-@app.route("/scan/<int:order_id>", methods=["GET"])
-@login_required
-def scan_view(order_id):
-    milestones = execute(
-        "SELECT milestone_id, milestone_name, stage_number, status, is_client_action, is_approved "
-        "FROM order_milestones WHERE order_id = %s ORDER BY stage_number",
-        (order_id,)
-    ) or []
+# ————— Bulk order import (staff only) —————
+# CSV/JSON upload with create_order's fields; see backend/bulk_import.py.
+# PDFs are not rendered here, they are built on first download.
+@app.route("/import_orders", methods=["GET", "POST"])
+def import_orders_page():
+    if not session.get("is_staff"):
+        flash("Unauthorized", "danger")
+        return redirect(url_for("login"))
+    if request.method == "POST":
+        upload = request.files.get("file")
+        if not upload or not upload.filename:
+            flash("Choose a CSV or JSON file to import.", "danger")
+            return render_template("import_orders.html")
+        fmt = "json" if upload.filename.lower().endswith(".json") else "csv"
+        try:
+            rows = read_rows(upload.read().decode("utf-8-sig"), fmt)
+        except (ValueError, UnicodeDecodeError) as e:
+            flash(f"Could not read {upload.filename}: {e}", "danger")
+            return render_template("import_orders.html")
+
+        report = import_orders(
+            rows, BASE_URL,
+            dry_run="dry_run" in request.form,
+            skip_invalid="skip_invalid" in request.form,
+            notify="notify" in request.form,
+        )
+        if report["order_ids"]:
+            flash(f"Imported {len(report['order_ids'])} orders.", "success")
+        elif report["dry_run"]:
+            flash(f"Dry run: {report['valid']} of {report['rows']} rows are valid.", "info")
+        else:
+            flash("Nothing was imported.", "danger")
+        return render_template("import_orders.html", report=report)
+    return render_template("import_orders.html")
+
+# ————— Shop analytics (staff only) —————
+# Reads only the rollup tables kept by triggers; see backend/analytics.py
+@app.route("/analytics")
+def analytics_page():
+    if not session.get("is_staff"):
+        flash("Unauthorized", "danger")
+        return redirect(url_for("home"))
+    weeks = min(max(request.args.get("weeks", 12, type=int), 1), 104)
+    throughput = weekly_throughput(weeks)
+    stages = stage_times(MILESTONE_CHOICES, weeks)
     return render_template(
-        "scan.html",
-        order_id=order_id,
-        milestones=milestones
+        "analytics.html",
+        weeks=weeks,
+        throughput=throughput,
+        stages=stages,
+        daily=daily_completions(30),
+        max_finished=max([t["orders_finished"] for t in throughput] + [1]),
+        max_avg=max([s["avg_hours"] or 0 for s in stages] + [1]),
     )
 
 # ————— Delete order (staff only) —————
@@ -544,24 +713,43 @@ def delete_order(order_id):
     if not session.get("is_staff"):
         flash("Unauthorized", "danger")
         return redirect(url_for("home"))
-    # Delete from all child tables first
-    execute("DELETE FROM order_items WHERE order_id=%s", (order_id,))
-    execute("DELETE FROM order_specs WHERE order_id=%s", (order_id,))
-    # Add more deletes here if you have other related tables (e.g., order_milestones)
-    execute("DELETE FROM order_milestones WHERE order_id=%s", (order_id,))
-    # Then delete the order
-    execute("DELETE FROM orders WHERE order_id=%s", (order_id,))
+    # Items, specs, milestones and queued jobs cascade from the order
+    # (sql/migrations/0011_order_archive.sql), so this is all or nothing
+    deleted = execute("DELETE FROM orders WHERE order_id=%s RETURNING order_id", (order_id,))
+    invalidate_order(order_id)
+    if not deleted:
+        flash("Order not found", "danger")
+        return redirect(url_for("portal"))
+    # files only go once the rows are gone for good
+    remove_order_files(order_id)
     flash(f"Order deleted", "success")
     return redirect(url_for("portal"))
 
 # ————— Load customer name into g.customer_name for templates —————
+# The name is stored in the signed session cookie at login/registration
+# (remember_name), so normal requests need no database lookup. It is read
+# again once it is CUSTOMER_NAME_MAX_AGE seconds old, so a rename made
+# anywhere (by staff, another worker, or by hand in the database) shows
+# up within that time.
+FILE_ENDPOINTS = {"static", "work_orders"}
+CUSTOMER_NAME_MAX_AGE = int(os.getenv("CUSTOMER_NAME_MAX_AGE", 300))
+
+def remember_name(name: str):
+    """Store the logged-in customer's name in the session, and when it was read."""
+    session["customer_name"] = name
+    session["customer_name_at"] = int(time.time())
+
 @app.before_request
 def load_customer():
-    g.customer_name = None
+    g.customer_name = session.get("customer_name")
+    if request.endpoint in FILE_ENDPOINTS:
+        return
     cid = session.get("customer_id")
-    if cid:
+    age = time.time() - session.get("customer_name_at", 0)
+    if cid and (g.customer_name is None or age >= CUSTOMER_NAME_MAX_AGE):
         rows = execute("SELECT name FROM customers WHERE customer_id=%s", (cid,))
         if rows:
+            remember_name(rows[0]["name"])
             g.customer_name = rows[0]["name"]
 
 # Inject customer name into all templates
@@ -587,56 +775,6 @@ MILESTONE_CHOICES = [
 def inject_milestone_choices():
     return dict(milestone_choices=MILESTONE_CHOICES)
 
-# ————— View order details (staff only) —————
-@app.route("/order/<int:order_id>")
-def view_order(order_id):
-    # Get order details
-    order_rows = execute(
-        """
-        SELECT o.*, c.name as customer_name, c.email, c.phone 
-        FROM orders o 
-        JOIN customers c ON o.customer_id = c.customer_id 
-        WHERE o.order_id = %s
-        """, 
-        (order_id,)
-    )
-    if not order_rows:
-        abort(404)
-    order = order_rows[0]
-
-    # Get order specifications
-    specs_rows = execute(
-        "SELECT * FROM order_specs WHERE order_id = %s", 
-        (order_id,)
-    )
-    specs = specs_rows[0] if specs_rows else {}
-
-    # Get product codes
-    items = execute(
-        "SELECT product_code FROM order_items WHERE order_id = %s", 
-        (order_id,)
-    )
-    product_codes = [item["product_code"] for item in items] if items else []
-
-    # Get current milestone statuses
-    milestones = execute(
-        """
-        SELECT milestone_id, milestone_name, status, is_approved, is_client_action
-        FROM order_milestones 
-        WHERE order_id = %s 
-        ORDER BY milestone_id
-        """, 
-        (order_id,)
-    )
-
-    return render_template(
-        "order_detail.html", 
-        order=order, 
-        specs=specs, 
-        product_codes=product_codes,
-        milestones=milestones or []  # Make sure milestones is passed
-    )
-
 # ————— Admin setup route (for first-time deployment) —————
 @app.route("/admin_setup", methods=["GET", "POST"])
 def admin_setup():
@@ -0,0 +1,98 @@
+# this file reads the cycle-time and throughput rollups behind /analytics
+# (sql/migrations/0009_analytics_rollups.sql); they are kept current by a
+# trigger on scan_events, so the page never touches the raw event log
+# run `python -m backend.analytics` to rebuild them from scan_events
+import logging
+from datetime import date, timedelta
+
+from backend.db import execute, query
+
+log = logging.getLogger(__name__)
+
+def _week_start(weeks: int) -> date:
+    """Monday of the earliest week in a `weeks`-week window ending this week."""
+    today = date.today()
+    return today - timedelta(days=today.weekday(), weeks=weeks - 1)
+
+def weekly_throughput(weeks: int = 12) -> list:
+    """Orders finished and milestones completed per week, oldest first."""
+    start = _week_start(weeks)
+    rows = query(
+        """
+        SELECT week, SUM(orders_finished) AS orders_finished,
+               SUM(completions) AS completions
+          FROM analytics_milestone_weekly
+         WHERE week >= %s
+         GROUP BY week
+        """,
+        (start,)
+    )
+    by_week = {r["week"]: r for r in rows}
+    # weeks without completions still get a row so charts keep their spacing
+    return [
+        {"week": w,
+         "orders_finished": int(by_week[w]["orders_finished"]) if w in by_week else 0,
+         "completions": int(by_week[w]["completions"]) if w in by_week else 0}
+        for w in (start + timedelta(weeks=i) for i in range(weeks))
+    ]
+
+def stage_times(milestones: list[str], weeks: int = 12) -> list:
+    """
+    Average and total time in each milestone's stage over the window, in
+    `milestones` order, plus how many orders are open at that stage now.
+    """
+    rows = query(
+        """
+        SELECT milestone_name, SUM(completions) AS completions,
+               SUM(timed) AS timed, SUM(stage_seconds) AS stage_seconds
+          FROM analytics_milestone_weekly
+         WHERE week >= %s
+         GROUP BY milestone_name
+        """,
+        (_week_start(weeks),)
+    )
+    done = {r["milestone_name"]: r for r in rows}
+    # open now = included in an order but not yet completed (rollups from 0003)
+    summary = query(
+        "SELECT milestone_name, total - completed AS open FROM milestone_summary"
+    )
+    open_now = {r["milestone_name"]: r["open"] for r in summary}
+
+    names = list(milestones) + sorted((set(done) | set(open_now)) - set(milestones))
+    stages = []
+    for name in names:
+        r = done.get(name)
+        timed = r["timed"] if r else 0
+        stages.append({
+            "milestone_name": name,
+            "completions": int(r["completions"]) if r else 0,
+            "avg_hours": r["stage_seconds"] / timed / 3600 if timed else None,
+            "total_hours": r["stage_seconds"] / 3600 if r else 0.0,
+            "open": open_now.get(name, 0),
+        })
+    return stages
+
+def daily_completions(days: int = 30) -> list:
+    """Milestones completed per day over the last `days` days, oldest first."""
+    start = date.today() - timedelta(days=days - 1)
+    rows = query(
+        """
+        SELECT day, SUM(completions) AS completions
+          FROM analytics_milestone_daily
+         WHERE day >= %s
+         GROUP BY day
+        """,
+        (start,)
+    )
+    by_day = {r["day"]: int(r["completions"]) for r in rows}
+    return [{"day": d, "completions": by_day.get(d, 0)}
+            for d in (start + timedelta(days=i) for i in range(days))]
+
+def rebuild_analytics():
+    """Recompute the daily and weekly rollups from scan_events."""
+    execute("SELECT rebuild_analytics()")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    rebuild_analytics()
+    log.info("Analytics rollups rebuilt")
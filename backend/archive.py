@@ -0,0 +1,59 @@
+# this file moves long-completed orders out of the hot tables into the
+# "archive" schema (sql/migrations/0011_order_archive.sql), a batch per
+# transaction so the move never holds many locks or one long transaction
+#   python -m backend.archive [--months 12] [--batch 500]
+# the worker also runs it daily when ARCHIVE_AFTER_MONTHS is set
+# archived orders are read with orders.load_orders(..., archived=True) and
+# listed on the master dashboard with ?archived=1
+import os
+import sys
+import logging
+
+from backend.db import execute
+from backend.cache import invalidate_order
+from backend.documents import remove_order_files
+
+log = logging.getLogger(__name__)
+
+# Archive orders completed more than this many months ago; 0 turns it off
+ARCHIVE_AFTER_MONTHS = int(os.getenv("ARCHIVE_AFTER_MONTHS", 0))
+ARCHIVE_BATCH = 500
+
+def archive_batch(months: int, batch: int = ARCHIVE_BATCH) -> list[int]:
+    """Move one batch; returns the archived order ids (empty when done)."""
+    row = execute(
+        "SELECT archive_orders((now() - make_interval(months => %s))::timestamp, %s) AS ids",
+        (months, batch)
+    )
+    ids = row[0]["ids"] if row else []
+    for order_id in ids:
+        invalidate_order(order_id)
+        # cached PDFs are rebuilt on demand if an archived order's are opened
+        remove_order_files(order_id)
+    return ids
+
+def archive_completed(months: int = ARCHIVE_AFTER_MONTHS, batch: int = ARCHIVE_BATCH) -> int:
+    """Archive every order completed more than `months` months ago; returns how many."""
+    if months <= 0:
+        return 0
+    total = 0
+    while True:
+        ids = archive_batch(months, batch)
+        if not ids:
+            break
+        total += len(ids)
+        log.info("Archived %d orders (%d so far)", len(ids), total)
+    return total
+
+def main(argv: list[str]) -> int:
+    months, batch = ARCHIVE_AFTER_MONTHS or 12, ARCHIVE_BATCH
+    if "--months" in argv:
+        months = int(argv[argv.index("--months") + 1])
+    if "--batch" in argv:
+        batch = int(argv[argv.index("--batch") + 1])
+    print(f"archived {archive_completed(months, batch)} orders completed over {months} months ago")
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main(sys.argv[1:]))
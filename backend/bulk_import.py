@@ -0,0 +1,316 @@
+# this file imports many orders at once from a CSV or JSON file
+# columns/keys match create_order() in order_processing.py; product_codes and
+# milestone_list hold several values separated by ";" or new lines (or are
+# JSON lists). Every row is validated first and problems are reported per row.
+# Valid orders are loaded with COPY in one transaction: all of them or none.
+#
+#   python -m backend.bulk_import orders.csv --dry-run      # validate only
+#   python -m backend.bulk_import orders.csv --render       # import + build PDFs
+#
+# staff can also upload a file at /import_orders
+import io
+import os
+import re
+import csv
+import sys
+import json
+import logging
+import secrets
+from datetime import date
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+
+from backend.db import transaction
+from backend.documents import document_urls, render_order_data
+from backend.email_utils import registration_email
+from backend.jobs import enqueue_new_jobs
+from backend.orders import load_orders
+
+log = logging.getLogger(__name__)
+
+REQUIRED_FIELDS = ("name", "email", "phone", "invoice_no")
+LIST_FIELDS = ("product_codes", "milestone_list")
+BOOL_FIELDS = ("repair_glue", "replace_springs", "new_back_insert", "new_seat_insert")
+TEXT_FIELDS = (
+    "notes", "back_style", "seat_style", "back_insert_type", "seat_insert_type",
+    "trim_style", "placement", "fabric_specs", "vendor_color", "frame_finish",
+    "specs_text", "topcoat", "customer_initials",
+)
+# Column limits from the schema, checked up front instead of failing the COPY
+MAX_LENGTHS = {"name": 100, "email": 100, "phone": 20, "invoice_no": 50}
+PRODUCT_CODE_MAX = 50
+
+TRUE_WORDS = {"true", "yes", "y", "1", "x"}
+FALSE_WORDS = {"false", "no", "n", "0", ""}
+
+# Orders per load_orders() query when rendering documents
+RENDER_BATCH = 500
+
+def read_rows(text: str, fmt: str) -> list[dict]:
+    """Parse an upload into raw row dicts; fmt is "csv" or "json"."""
+    if fmt == "json":
+        data = json.loads(text)
+        if isinstance(data, dict):
+            data = data.get("orders")
+        if not isinstance(data, list) or not all(isinstance(r, dict) for r in data):
+            raise ValueError("JSON must be a list of order objects (or {\"orders\": [...]})")
+        return data
+    return list(csv.DictReader(io.StringIO(text.lstrip("\ufeff"))))
+
+def _text(value) -> str:
+    return "" if value is None else str(value).strip()
+
+def _split(value) -> list[str]:
+    if isinstance(value, list):
+        items = value
+    else:
+        items = re.split(r"[;\n]", _text(value))
+    return [_text(v) for v in items if _text(v)]
+
+def validate_row(raw: dict) -> tuple[dict, list[tuple[str, str]]]:
+    """Clean one row into create_order()'s fields; returns (order, [(field, error)])."""
+    errors = []
+    order = {}
+
+    for field in REQUIRED_FIELDS:
+        order[field] = _text(raw.get(field))
+        if not order[field]:
+            errors.append((field, "required"))
+    for field, limit in MAX_LENGTHS.items():
+        if len(order[field]) > limit:
+            errors.append((field, f"longer than {limit} characters"))
+    if order["email"] and "@" not in order["email"]:
+        errors.append(("email", "not an email address"))
+
+    for field in LIST_FIELDS:
+        order[field] = _split(raw.get(field))
+        if not order[field]:
+            errors.append((field, "at least one value required"))
+    if any(len(code) > PRODUCT_CODE_MAX for code in order["product_codes"]):
+        errors.append(("product_codes", f"codes are limited to {PRODUCT_CODE_MAX} characters"))
+
+    due = _text(raw.get("due_date"))
+    order["due_date"] = None
+    if due:
+        try:
+            order["due_date"] = date.fromisoformat(due)
+        except ValueError:
+            errors.append(("due_date", "expected YYYY-MM-DD"))
+
+    qty = _text(raw.get("quantity")) or "1"
+    try:
+        order["quantity"] = int(qty)
+        if order["quantity"] < 1:
+            raise ValueError
+    except ValueError:
+        order["quantity"] = None
+        errors.append(("quantity", "expected a whole number of at least 1"))
+
+    for field in BOOL_FIELDS:
+        value = raw.get(field)
+        if isinstance(value, bool):
+            order[field] = value
+            continue
+        word = _text(value).lower()
+        if word in TRUE_WORDS:
+            order[field] = True
+        elif word in FALSE_WORDS:
+            order[field] = False
+        else:
+            order[field] = None
+            errors.append((field, "expected true/false"))
+
+    for field in TEXT_FIELDS:
+        # the form field is called "specs"; accept either name
+        value = raw.get(field, raw.get("specs") if field == "specs_text" else None)
+        order[field] = _text(value) or None
+
+    return order, errors
+
+def _load(orders: list[dict], base_url: str, notify: bool) -> list[int]:
+    """Insert validated orders in one transaction; returns their order ids."""
+    with transaction() as tx:
+        emails = sorted({o["email"] for o in orders})
+        rows = tx.execute(
+            "SELECT DISTINCT ON (email) email, customer_id "
+            "FROM customers WHERE email = ANY(%s) "
+            "ORDER BY email, customer_id",
+            (emails,)
+        ) or []
+        customer_ids = {r["email"]: r["customer_id"] for r in rows}
+        existing = set(customer_ids.values())
+
+        # New customers: reserve ids up front so every table can be COPYed
+        first_rows = {}
+        for o in orders:
+            first_rows.setdefault(o["email"], o)
+        new_emails = [e for e in emails if e not in customer_ids]
+        ids = tx.execute(
+            "SELECT nextval(pg_get_serial_sequence('customers', 'customer_id')) AS id "
+            "FROM generate_series(1, %s)",
+            (len(new_emails),)
+        ) or []
+        for email, r in zip(new_emails, ids):
+            customer_ids[email] = r["id"]
+        tokens = {e: secrets.token_urlsafe(16) for e in emails} if notify else {}
+        tx.copy_rows(
+            "customers", ["customer_id", "name", "email", "phone", "register_token"],
+            [(customer_ids[e], first_rows[e]["name"], e, first_rows[e]["phone"], tokens.get(e))
+             for e in new_emails],
+        )
+        if notify and existing:
+            tx.execute_values(
+                "UPDATE customers c SET register_token = v.token "
+                "FROM (VALUES %s) AS v(customer_id, token) "
+                "WHERE c.customer_id = v.customer_id",
+                [(customer_ids[e], tokens[e]) for e in emails if customer_ids[e] in existing]
+            )
+
+        ids = tx.execute(
+            "SELECT nextval(pg_get_serial_sequence('orders', 'order_id')) AS id "
+            "FROM generate_series(1, %s)",
+            (len(orders),)
+        ) or []
+        order_ids = [r["id"] for r in ids]
+
+        order_rows, milestone_rows, item_rows, spec_rows = [], [], [], []
+        for order_id, o in zip(order_ids, orders):
+            paths = document_urls(order_id, o["name"])
+            order_rows.append((
+                order_id, customer_ids[o["email"]], o["invoice_no"], o["due_date"],
+                o["notes"], paths["lousso_pdf_path"], paths["client_pdf_path"],
+            ))
+            milestone_rows.extend((order_id, m) for m in o["milestone_list"])
+            item_rows.extend((order_id, code, "Pending") for code in o["product_codes"])
+            spec_rows.append((
+                order_id, o["quantity"], o["repair_glue"], o["replace_springs"],
+                o["back_style"], o["seat_style"], o["new_back_insert"], o["new_seat_insert"],
+                o["back_insert_type"], o["seat_insert_type"], o["trim_style"], o["placement"],
+                o["fabric_specs"], o["vendor_color"], o["frame_finish"], o["specs_text"],
+                o["topcoat"], o["customer_initials"],
+            ))
+
+        tx.copy_rows(
+            "orders",
+            ["order_id", "customer_id", "invoice_no", "due_date", "notes",
+             "lousso_pdf_path", "client_pdf_path"],
+            order_rows,
+        )
+        tx.copy_rows("order_milestones", ["order_id", "milestone_name"], milestone_rows)
+        tx.copy_rows("order_items", ["order_id", "product_code", "status"], item_rows)
+        tx.copy_rows(
+            "order_specs",
+            ["order_id", "quantity", "repair_glue", "replace_springs",
+             "back_style", "seat_style", "new_back_insert", "new_seat_insert",
+             "back_insert_type", "seat_insert_type", "trim_style", "placement",
+             "fabric_specs", "vendor_color", "frame_finish", "specs", "topcoat",
+             "customer_initials"],
+            spec_rows,
+        )
+
+        # The worker pre-renders the PDFs (already done if --render was used)
+        enqueue_new_jobs(tx, order_ids, "documents", {"base_url": base_url})
+
+        # One registration email per customer, linking their first imported order
+        if notify:
+            first_order = {}
+            for order_id, o in zip(order_ids, orders):
+                first_order.setdefault(o["email"], order_id)
+            tx.execute_values(
+                "INSERT INTO email_outbox (recipient, subject, body) VALUES %s",
+                [(e, *registration_email(tokens[e], first_order[e], base_url)) for e in emails]
+            )
+
+    return order_ids
+
+def import_orders(rows: list[dict], base_url: str, *, dry_run: bool = False,
+                  skip_invalid: bool = False, notify: bool = False) -> dict:
+    """
+    Validate and import raw rows (see read_rows). Nothing is written when
+    dry_run is set, or when any row is invalid and skip_invalid is not.
+    Errors are reported as {"row": n, "field": ..., "error": ...}, with rows
+    numbered from 1 in file order.
+    """
+    orders, errors = [], []
+    for n, raw in enumerate(rows, start=1):
+        order, problems = validate_row(raw)
+        if problems:
+            errors.extend({"row": n, "field": f, "error": e} for f, e in problems)
+        else:
+            orders.append(order)
+
+    report = {
+        "rows": len(rows),
+        "valid": len(orders),
+        "invalid": len({e["row"] for e in errors}),
+        "errors": errors,
+        "dry_run": dry_run,
+        "order_ids": [],
+    }
+    if dry_run or not orders or (errors and not skip_invalid):
+        return report
+
+    report["order_ids"] = _load(orders, base_url, notify)
+    log.info("Imported %d orders", len(report["order_ids"]))
+    return report
+
+def render_documents(order_ids: list[int], base_url: str, workers: int | None = None) -> int:
+    """
+    Build both PDFs for each order up front, on a process pool sized to the
+    machine's cores. Order data is loaded here in batches; the worker
+    processes only render, so they never touch the database.
+    """
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        render = partial(render_order_data, base_url=base_url)
+        for start in range(0, len(order_ids), RENDER_BATCH):
+            batch = load_orders(order_ids[start:start + RENDER_BATCH])
+            for _ in pool.map(render, batch, chunksize=16):
+                done += 1
+    return done
+
+def main(argv: list[str]) -> int:
+    argv = list(argv)
+    fmt = base_url = None
+    if "--format" in argv:
+        i = argv.index("--format")
+        fmt = argv.pop(i + 1)
+    if "--base-url" in argv:
+        i = argv.index("--base-url")
+        base_url = argv.pop(i + 1).rstrip("/")
+    args = [a for a in argv if not a.startswith("--")]
+    if len(args) != 1:
+        print("usage: python -m backend.bulk_import FILE [--dry-run] [--skip-invalid] "
+              "[--notify] [--render] [--format csv|json] [--base-url URL]")
+        return 2
+    path = args[0]
+    fmt = fmt or ("json" if path.lower().endswith(".json") else "csv")
+    base_url = base_url or os.getenv("BASE_URL", "http://localhost:5000").rstrip("/")
+
+    with open(path, encoding="utf-8-sig") as f:
+        rows = read_rows(f.read(), fmt)
+    report = import_orders(
+        rows, base_url,
+        dry_run="--dry-run" in argv,
+        skip_invalid="--skip-invalid" in argv,
+        notify="--notify" in argv,
+    )
+    for e in report["errors"]:
+        print(f"row {e['row']}: {e['field']}: {e['error']}")
+    print(f"{report['rows']} rows, {report['valid']} valid, {report['invalid']} invalid")
+    if report["dry_run"]:
+        print("dry run: nothing imported")
+    elif not report["order_ids"]:
+        print("nothing imported" + (" (use --skip-invalid to import the valid rows)"
+                                    if report["errors"] else ""))
+        return 1
+    else:
+        print(f"imported {len(report['order_ids'])} orders "
+              f"(#{report['order_ids'][0]}-#{report['order_ids'][-1]})")
+        if "--render" in argv:
+            print(f"rendered documents for {render_documents(report['order_ids'], base_url)} orders")
+    return 1 if report["errors"] else 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main(sys.argv[1:]))
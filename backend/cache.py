@@ -0,0 +1,226 @@
+# this file is the read-through cache for order views
+# entries are keyed by order ID and tagged with that order's version number;
+# every write path calls invalidate_order(), which bumps the version, so a
+# page load that raced with a write can never re-cache the stale copy.
+# writes made by other processes (other gunicorn workers, the background
+# worker, the archive job, psql) reach this one through the change feed
+# (backend/live.py), which invalidates every order it hears about
+# backends:
+#   • in-process LRU with TTL and a size limit (default, per gunicorn worker)
+#   • Redis, shared by all workers, when ORDER_CACHE_URL is set
+#     (optional: pip install redis)
+import os
+import time
+import pickle
+import logging
+import threading
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:  # only needed for the shared backend
+    redis = None
+
+ORDER_CACHE_URL = os.getenv("ORDER_CACHE_URL")
+ORDER_CACHE_SIZE = int(os.getenv("ORDER_CACHE_SIZE", 1024))
+ORDER_CACHE_TTL = float(os.getenv("ORDER_CACHE_TTL", 30))  # seconds; 0 disables caching
+
+log = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    Thread-safe in-process backend. Entries expire after `ttl` seconds and
+    the least recently used one is evicted once `max_entries` is reached.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 30):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> ((generation, version), expires_at, value)
+        self._versions = {}             # key -> current version
+        self._generation = 0            # bumped to drop every version at once
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+
+    def version(self, key) -> tuple[int, int]:
+        with self._lock:
+            return self._generation, self._versions.get(key, 0)
+
+    def get(self, key):
+        """Return (hit, value)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                version, expires_at, value = entry
+                if expires_at < time.monotonic():
+                    del self._entries[key]
+                    self._stats["expired"] += 1
+                elif version == (self._generation, self._versions.get(key, 0)):
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return True, value
+            self._stats["misses"] += 1
+            return False, None
+
+    def set(self, key, version: tuple[int, int], value):
+        with self._lock:
+            if version != (self._generation, self._versions.get(key, 0)):
+                return  # invalidated while the value was loading
+            self._entries[key] = (version, time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self._stats["invalidations"] += 1
+            # Versions only matter for loads in flight; keep the map bounded
+            # by starting a new generation: loads in flight are dropped and
+            # the cached entries (all current) carry over at version 0
+            if len(self._versions) > 10 * self.max_entries:
+                self._generation += 1
+                self._versions = {}
+                for k, (_, expires_at, value) in self._entries.items():
+                    self._entries[k] = ((self._generation, 0), expires_at, value)
+
+    def invalidate_all(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._generation += 1
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            st = dict(self._stats)
+            st.update(backend="lru", entries=len(self._entries),
+                      max_entries=self.max_entries, ttl=self.ttl)
+        return st
+
+
+class RedisCache:
+    """
+    Shared backend. Each key is a Redis hash holding the current version
+    and, when cached, the pickled value plus the version it was loaded at.
+    Redis errors count as misses so the cache never breaks a page.
+    """
+
+    def __init__(self, url: str, ttl: float = 30, prefix: str = "opts:"):
+        if redis is None:
+            raise RuntimeError("ORDER_CACHE_URL is set but the redis package is not installed")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "errors": 0, "invalidations": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _key(self, key) -> str:
+        return f"{self.prefix}{key}"
+
+    def version(self, key) -> int:
+        try:
+            return int(self.client.hget(self._key(key), "version") or 0)
+        except redis.RedisError:
+            self._count("errors")
+            return -1
+
+    def get(self, key):
+        try:
+            version, loaded_at, data = self.client.hmget(
+                self._key(key), "version", "loaded_at", "data"
+            )
+        except redis.RedisError:
+            self._count("errors")
+            self._count("misses")
+            return False, None
+        if data is not None and int(loaded_at or -1) == int(version or 0):
+            self._count("hits")
+            return True, pickle.loads(data)
+        self._count("misses")
+        return False, None
+
+    def set(self, key, version: int, value):
+        if version < 0:
+            return
+        k = self._key(key)
+        try:
+            pipe = self.client.pipeline()
+            pipe.hset(k, mapping={"loaded_at": version, "data": pickle.dumps(value)})
+            pipe.expire(k, max(int(self.ttl), 1))
+            pipe.execute()
+        except redis.RedisError:
+            self._count("errors")
+
+    def invalidate(self, key):
+        k = self._key(key)
+        try:
+            pipe = self.client.pipeline()
+            pipe.hincrby(k, "version", 1)
+            pipe.hdel(k, "data", "loaded_at")
+            # Keep the version around well past any in-flight load
+            pipe.expire(k, max(int(self.ttl), 1) * 10)
+            pipe.execute()
+            self._count("invalidations")
+        except redis.RedisError:
+            self._count("errors")
+
+    def invalidate_all(self):
+        try:
+            for k in self.client.scan_iter(match=f"{self._key('order:')}*", count=500):
+                self.invalidate(k.decode()[len(self.prefix):])
+        except redis.RedisError:
+            self._count("errors")
+
+    def stats(self) -> dict:
+        with self._lock:
+            st = dict(self._stats)
+        st.update(backend="redis", ttl=self.ttl)
+        return st
+
+
+def _make_backend():
+    if ORDER_CACHE_URL:
+        return RedisCache(ORDER_CACHE_URL, ttl=ORDER_CACHE_TTL)
+    return LRUCache(max_entries=ORDER_CACHE_SIZE, ttl=ORDER_CACHE_TTL)
+
+_backend = _make_backend()
+
+def cached_order(order_id: int, loader):
+    """
+    Return loader(order_id) through the cache. Cached values are shared
+    between requests, so callers must treat them as read-only.
+    """
+    if ORDER_CACHE_TTL <= 0:
+        return loader(order_id)
+    key = f"order:{order_id}"
+    hit, value = _backend.get(key)
+    if hit:
+        return value
+    version = _backend.version(key)
+    value = loader(order_id)
+    if value is not None:
+        _backend.set(key, version, value)
+    return value
+
+def invalidate_order(order_id: int):
+    """Call after any write that changes what an order page shows."""
+    _backend.invalidate(f"order:{order_id}")
+
+def invalidate_all():
+    """Drop every cached order, e.g. after change notifications were missed."""
+    _backend.invalidate_all()
+
+def cache_stats() -> dict:
+    """Hit, miss and eviction counts for tuning size and TTL."""
+    st = _backend.stats()
+    lookups = st["hits"] + st["misses"]
+    st["hit_rate"] = st["hits"] / lookups if lookups else 0.0
+    return st
@@ -0,0 +1,220 @@
+# this file builds the master dashboard queries for the staff portal
+# filtering, sorting and paging all happen in SQL with keyset pagination,
+# so a page costs the same no matter how many orders are in history
+# filter dropdown options and their counts come from rollups kept by the
+# database, or are counted live for a search
+from datetime import date
+
+from backend.db import execute
+from backend.search import match_sql
+
+PAGE_SIZE = 50
+STATUSES = ["Not Started", "In Progress", "Completed"]
+DUE_RANGES = ["week"]
+
+# progress_status and the milestone counters on orders are kept current by
+# triggers (sql/migrations/0003_milestone_rollups.sql), so no milestone scan
+_FROM_ORDERS = """
+    FROM orders o
+    JOIN customers c ON c.customer_id = o.customer_id
+"""
+# archived=1 lists orders moved to the archive schema (backend/archive.py)
+_FROM_ARCHIVE = """
+    FROM archive.orders o
+    JOIN customers c ON c.customer_id = o.customer_id
+"""
+
+def _from(filters: dict) -> str:
+    return _FROM_ARCHIVE if filters["archived"] else _FROM_ORDERS
+
+def parse_filters(args) -> dict:
+    """
+    Read dashboard filters from the query string; bad values are ignored.
+    """
+    def _int(name):
+        try:
+            return int(args.get(name, ""))
+        except ValueError:
+            return None
+
+    due = args.get("due_date") or None
+    if due:
+        try:
+            due = date.fromisoformat(due)
+        except ValueError:
+            due = None
+    status = args.get("status") or None
+    due_range = args.get("due") or None
+    return {
+        "q": (args.get("q") or "").strip(),
+        "customer_id": _int("customer_id"),
+        "status": status if status in STATUSES else None,
+        "due_date": due,
+        "due": due_range if due_range in DUE_RANGES else None,
+        "milestone": (args.get("milestone") or "").strip() or None,
+        "archived": args.get("archived") == "1",
+    }
+
+def _where(filters: dict, facet_only: bool = False) -> tuple[str, dict]:
+    clauses, params = [], {}
+    if filters["q"] and not filters["archived"]:
+        # indexed search (backend/search.py); also covers phone, codes and
+        # specs. ARRAY() collects the matches from the GIN index up front;
+        # as a plain IN the planner may walk every order checking each one.
+        match = match_sql(filters["q"])
+        if match is None:
+            clauses.append("FALSE")
+        else:
+            clauses.append(f"o.order_id = ANY(ARRAY(SELECT s.order_id FROM order_search s WHERE {match[0]}))")
+            params.update(match[1])
+    elif filters["q"]:
+        clauses.append(
+            "(o.invoice_no ILIKE %(q)s OR c.name ILIKE %(q)s"
+            " OR c.email ILIKE %(q)s OR o.notes ILIKE %(q)s)"
+        )
+        params["q"] = f"%{filters['q']}%"
+    if not facet_only:
+        if filters["customer_id"] is not None:
+            clauses.append("o.customer_id = %(customer_id)s")
+            params["customer_id"] = filters["customer_id"]
+        if filters["status"]:
+            clauses.append("o.progress_status = %(status)s")
+            params["status"] = filters["status"]
+        if filters["due_date"]:
+            clauses.append("o.due_date = %(due_date)s")
+            params["due_date"] = filters["due_date"]
+        if filters["due"] == "week":
+            # Monday through Sunday of the current week
+            clauses.append(
+                "o.due_date BETWEEN date_trunc('week', current_date)::date"
+                " AND date_trunc('week', current_date)::date + 6"
+            )
+        if filters["milestone"]:
+            # orders whose first unfinished milestone is this one
+            clauses.append(
+                "EXISTS (SELECT 1 FROM order_milestones m"
+                " WHERE m.order_id = o.order_id AND m.milestone_name = %(milestone)s"
+                " AND m.status <> 'Completed'"
+                " AND NOT EXISTS (SELECT 1 FROM order_milestones p"
+                " WHERE p.order_id = o.order_id AND p.milestone_id < m.milestone_id"
+                " AND p.status <> 'Completed'))"
+            )
+            params["milestone"] = filters["milestone"]
+    return " AND ".join(clauses) or "TRUE", params
+
+def fetch_orders_page(filters: dict, after: int | None = None, before: int | None = None,
+                      limit: int = PAGE_SIZE) -> dict:
+    """
+    One page of orders, newest first. `after` continues past the last
+    order_id of the previous page, `before` walks back to newer orders.
+    Returns {"orders", "older", "newer"} where older/newer are the cursors
+    for the neighbouring pages (None at either end).
+    """
+    where, params = _where(filters)
+    params["limit"] = limit + 1
+    if before is not None:
+        where += " AND o.order_id > %(before)s"
+        params["before"] = before
+        order = "ASC"
+    else:
+        if after is not None:
+            where += " AND o.order_id < %(after)s"
+            params["after"] = after
+        order = "DESC"
+
+    rows = execute(
+        f"""
+        SELECT o.order_id, o.invoice_no, o.due_date, o.lousso_pdf_path,
+               c.name AS customer_name, c.email AS customer_email,
+               o.progress_status AS computed_status
+        {_from(filters)}
+        WHERE {where}
+        ORDER BY o.order_id {order}
+        LIMIT %(limit)s
+        """,
+        params
+    ) or []
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before is not None:
+        rows.reverse()
+        older = rows[-1]["order_id"] if rows else None
+        newer = rows[0]["order_id"] if rows and has_more else None
+    else:
+        older = rows[-1]["order_id"] if rows and has_more else None
+        newer = rows[0]["order_id"] if rows and after is not None else None
+    return {"orders": rows, "older": older, "newer": newer}
+
+def fetch_order_ids(filters: dict, limit: int) -> list[int]:
+    """Every matching order id (up to `limit`), soonest due first, for batch printing."""
+    where, params = _where(filters)
+    params["limit"] = limit
+    rows = execute(
+        f"""
+        SELECT o.order_id
+        {_from(filters)}
+        WHERE {where}
+        ORDER BY o.due_date NULLS LAST, o.order_id
+        LIMIT %(limit)s
+        """,
+        params
+    ) or []
+    return [r["order_id"] for r in rows]
+
+def fetch_facets(filters: dict) -> dict:
+    """
+    Counts for the customer, status and due-date dropdowns in one query.
+    Only the search box narrows the facets, so picking one dropdown value
+    does not hide the other choices. Without a search the counts come from
+    rollups kept by triggers (sql/migrations/0014_order_facet_rollups.sql),
+    so they cost the same however many orders there are.
+    """
+    if not filters["q"] and not filters["archived"]:
+        rows = execute(
+            """
+            SELECT 'customer' AS facet, f.customer_id, c.name AS customer_name,
+                   NULL AS computed_status, NULL::date AS due_date, f.total AS count
+              FROM order_facet_customers f
+              JOIN customers c ON c.customer_id = f.customer_id
+             WHERE f.total > 0
+            UNION ALL
+            SELECT 'status', NULL, NULL, f.progress_status, NULL, f.total
+              FROM order_facet_statuses f
+             WHERE f.total > 0
+            UNION ALL
+            SELECT 'due_date', NULL, NULL, NULL, f.due_date, f.total
+              FROM order_facet_due_dates f
+             WHERE f.total > 0
+            """
+        ) or []
+    else:
+        where, params = _where(filters, facet_only=True)
+        rows = execute(
+            f"""
+            SELECT CASE WHEN GROUPING(c.customer_id, c.name) = 0 THEN 'customer'
+                        WHEN GROUPING(o.progress_status) = 0 THEN 'status'
+                        ELSE 'due_date'
+                   END AS facet,
+                   c.customer_id, c.name AS customer_name,
+                   o.progress_status AS computed_status, o.due_date,
+                   COUNT(*) AS count
+            {_from(filters)}
+            WHERE {where}
+            GROUP BY GROUPING SETS ((c.customer_id, c.name), (o.progress_status), (o.due_date))
+            """,
+            params
+        ) or []
+
+    facets = {"customers": [], "statuses": [], "due_dates": []}
+    for r in rows:
+        if r["facet"] == "customer":
+            facets["customers"].append(r)
+        elif r["facet"] == "status":
+            facets["statuses"].append(r)
+        elif r["due_date"] is not None:
+            facets["due_dates"].append(r)
+    facets["customers"].sort(key=lambda r: (r["customer_name"] or "").lower())
+    facets["statuses"].sort(key=lambda r: STATUSES.index(r["computed_status"]))
+    facets["due_dates"].sort(key=lambda r: r["due_date"])
+    return facets
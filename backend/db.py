@@ -1,16 +1,209 @@
 # this file is for managing database connections and executing SQL queries
-# it uses a connection pool for efficient database access
+# it uses a thread-safe, blocking connection pool for efficient database access
 # it includes a function to execute SQL commands and return results
 # make sure to install psycopg2 and python-dotenv for this to work (see requirements.txt)
+import io
 import os
+import re
+import time
+import hashlib
 import logging
+import threading
 import urllib.parse
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
 from dotenv import load_dotenv
-from psycopg2.pool import SimpleConnectionPool
-from psycopg2.extras import RealDictCursor
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from psycopg2.pool import PoolError
+from psycopg2.extras import RealDictCursor, execute_values
+
+from backend import metrics
 
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
+
+class PoolTimeout(PoolError):
+    """Raised when no connection frees up within the checkout timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe connection pool that blocks until a connection is free.
+      • getconn() waits up to `timeout` seconds instead of failing right away.
+      • Connections are checked before being handed out: closed ones are
+        replaced, ones idle longer than `check_idle` get a quick SELECT 1,
+        and ones older than `max_age` seconds are recycled.
+      • stats() reports checkout wait time and usage for sizing maxconn.
+    """
+
+    def __init__(self, minconn: int, maxconn: int, *, timeout: float = 30.0,
+                 max_age: float = 1800.0, check_idle: float = 30.0, **connect_kwargs):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError("need 0 <= minconn <= maxconn and maxconn >= 1")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_age = max_age
+        self.check_idle = check_idle
+        self._connect_kwargs = connect_kwargs
+        self._cond = threading.Condition()
+        self._idle = deque()      # (conn, created_at, returned_at)
+        self._born = {}           # id(conn) -> created_at, for checked-out conns
+        self._size = 0            # open connections, idle + in use
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "timeouts": 0,
+            "connections_opened": 0,
+            "connections_recycled": 0,
+            "in_use_peak": 0,
+        }
+        for _ in range(minconn):
+            conn = self._connect()
+            now = time.monotonic()
+            self._idle.append((conn, now, now))
+            self._size += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(**self._connect_kwargs)
+        with self._cond:
+            self._stats["connections_opened"] += 1
+        return conn
+
+    def _is_usable(self, conn, created_at: float, returned_at: float) -> bool:
+        now = time.monotonic()
+        if conn.closed or now - created_at > self.max_age:
+            return False
+        if now - returned_at > self.check_idle:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._stats["connections_recycled"] += 1
+
+    def getconn(self, timeout: float | None = None):
+        """Check a connection out, waiting up to `timeout` seconds for one."""
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+                while not self._idle and self._size >= self.maxconn:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        metrics.DB_POOL_TIMEOUTS.inc()
+                        raise PoolTimeout(
+                            f"no database connection free after {timeout:.1f}s "
+                            f"(maxconn={self.maxconn})"
+                        )
+                    waited = True
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn, created_at, returned_at = self._idle.pop()
+                else:
+                    conn, created_at, returned_at = None, time.monotonic(), None
+                    self._size += 1
+
+            # Health checks and connects happen outside the lock
+            try:
+                if conn is not None and not self._is_usable(conn, created_at, returned_at):
+                    self._discard(conn)
+                    conn = None
+                if conn is None:
+                    conn = self._connect()
+                    created_at = time.monotonic()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+
+            with self._cond:
+                self._born[id(conn)] = created_at
+                wait = time.monotonic() - start
+                st = self._stats
+                st["checkouts"] += 1
+                if waited:
+                    st["waits"] += 1
+                st["wait_time_total"] += wait
+                st["wait_time_max"] = max(st["wait_time_max"], wait)
+                st["in_use_peak"] = max(st["in_use_peak"], len(self._born))
+            metrics.DB_POOL_WAIT_SECONDS.observe(wait)
+            if wait > 1.0:
+                log.warning("Waited %.2fs for a database connection (maxconn=%d)", wait, self.maxconn)
+            return conn
+
+    def putconn(self, conn, close: bool = False):
+        """Return a connection; broken or mid-transaction ones are closed."""
+        if not conn.closed and conn.info.transaction_status != TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                close = True
+        with self._cond:
+            created_at = self._born.pop(id(conn), None)
+            if created_at is None:
+                raise PoolError("trying to put back a connection not from this pool")
+            if close or conn.closed or self._closed:
+                self._size -= 1
+                self._discard(conn)
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        """Close idle connections and refuse new checkouts."""
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _, _ = self._idle.pop()
+                self._size -= 1
+                self._discard(conn)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        """Snapshot of pool usage and checkout wait times (seconds)."""
+        with self._cond:
+            st = dict(self._stats)
+            st.update(
+                minconn=self.minconn,
+                maxconn=self.maxconn,
+                size=self._size,
+                in_use=len(self._born),
+                idle=len(self._idle),
+            )
+        st["wait_time_avg"] = st["wait_time_total"] / st["checkouts"] if st["checkouts"] else 0.0
+        return st
+
+
+_pool_options = dict(
+    timeout=float(os.getenv("DB_POOL_TIMEOUT", 30)),
+    max_age=float(os.getenv("DB_CONN_MAX_AGE", 1800)),
+    check_idle=float(os.getenv("DB_CONN_CHECK_IDLE", 30)),
+    cursor_factory=RealDictCursor,
+)
+
 # For Render deployment - use DATABASE_URL if available
 database_url = os.getenv("DATABASE_URL")
 
@@ -20,15 +213,15 @@ if database_url:
     if '?sslmode=' not in database_url:
         database_url += '?sslmode=require'
     
-    _pool = SimpleConnectionPool(
+    _pool = ConnectionPool(
         minconn=1,
-        maxconn=3,  # Reduced for free tier
+        maxconn=int(os.getenv("DB_MAX_CONN", 3)),  # Reduced for free tier
         dsn=database_url,
-        cursor_factory=RealDictCursor,
+        **_pool_options,
     )
 else:
     # Development: Use individual environment variables
-    _pool = SimpleConnectionPool(
+    _pool = ConnectionPool(
         minconn=int(os.getenv("DB_MIN_CONN", 1)),
         maxconn=int(os.getenv("DB_MAX_CONN", 5)),
         dbname=os.getenv("DB_NAME"),
@@ -36,8 +229,304 @@ else:
         password=os.getenv("DB_PASSWORD"),
         host=os.getenv("DB_HOST", "127.0.0.1"),
         port=os.getenv("DB_PORT", "5432"),
-        cursor_factory=RealDictCursor,
+        **_pool_options,
     )
+
+metrics.DB_POOL_CONNECTIONS.read = lambda pool=_pool: {
+    ("in_use",): len(pool._born), ("idle",): len(pool._idle)}
+
+# Borrow a pooled connection for the duration of a with-block
+@contextmanager
+def connection():
+    conn = _pool.getconn()
+    try:
+        yield conn
+    finally:
+        _pool.putconn(conn)
+
+# A connection of its own, outside the pool, for long-lived uses such as LISTEN
+def direct_connection():
+    return psycopg2.connect(**_pool._connect_kwargs)
+
+class _SavepointConnection:
+    """A connection lent out by _SharedPool: commit and rollback end a savepoint."""
+
+    def __init__(self, conn, name: str):
+        self._conn = conn
+        self._name = name
+        self.done = False
+
+    def __getattr__(self, attr):
+        return getattr(self._conn, attr)
+
+    def _end(self, rollback: bool):
+        if not self.done:
+            with self._conn.cursor() as cur:
+                if rollback:
+                    cur.execute(f"ROLLBACK TO SAVEPOINT {self._name}")
+                cur.execute(f"RELEASE SAVEPOINT {self._name}")
+            self.done = True
+
+    def commit(self):
+        self._end(rollback=False)
+
+    def rollback(self):
+        self._end(rollback=True)
+
+class _SharedPool:
+    """
+    Stands in for the pool inside rolled_back(): every checkout gets the
+    same connection, one thread at a time, each in a savepoint of its own.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._lock = threading.RLock()
+        self._depth = 0
+
+    def getconn(self, timeout: float | None = None):
+        self._lock.acquire()
+        self._depth += 1
+        name = f"checkout_{self._depth}"
+        with self.conn.cursor() as cur:
+            cur.execute(f"SAVEPOINT {name}")
+        return _SavepointConnection(self.conn, name)
+
+    def putconn(self, conn, close: bool = False):
+        try:
+            conn.rollback()   # no-op when it was committed
+        finally:
+            self._depth -= 1
+            self._lock.release()
+
+    def stats(self) -> dict:
+        return {"shared": True}
+
+@contextmanager
+def rolled_back():
+    """
+    Run everything that uses connection()/transaction()/execute() during the
+    with-block on one connection, and roll all of it back at the end, so
+    checks and tests can write to a real database without leaving anything
+    behind. Yields that connection.
+    """
+    global _pool
+    conn = direct_connection()
+    real, _pool = _pool, _SharedPool(conn)
+    try:
+        yield conn
+    finally:
+        _pool = real
+        conn.rollback()
+        conn.close()
+
+def pool_stats() -> dict:
+    """
+    Pool usage and checkout wait times, for sizing DB_MAX_CONN.
+    """
+    return _pool.stats()
+
+# Shared by execute() and Transaction.execute() so both return the same shapes
+def _fetch_result(cur, sql: str):
+    if not cur.description:
+        return None
+    first_word = sql.lstrip().split()[0].upper()
+    if first_word == "SELECT":
+        return cur.fetchall()
+    return cur.fetchone()
+
+# ————— Statement recording: metrics, query budgets, N+1 detection —————
+# Per request (app.py) or per test (assert_max_queries): more statements or
+# SQL time than this is logged, as is one statement shape run this many times
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", 20))
+QUERY_TIME_BUDGET = float(os.getenv("QUERY_TIME_BUDGET", 0.5))  # seconds
+REPEATED_QUERY_LIMIT = int(os.getenv("REPEATED_QUERY_LIMIT", 5))
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_recording = threading.local()
+
+# The statement with whitespace collapsed and literals replaced by ?, so
+# "WHERE order_id = 7" and "WHERE order_id = 8" count as one shape
+@lru_cache(maxsize=1024)
+def _statement_shape(sql: str) -> str:
+    return _LITERAL.sub("?", " ".join(sql.split()))
+
+# Statements are counted and timed under their shape (see backend/metrics.py);
+# long ones are cut short for reading, with a hash of the whole shape so two
+# statements that start alike still get labels of their own
+@lru_cache(maxsize=1024)
+def _statement_label(shape: str) -> str:
+    if len(shape) <= 120:
+        return shape
+    digest = hashlib.sha1(shape.encode()).hexdigest()[:8]
+    return f"{shape[:106]}... [{digest}]"
+
+@contextmanager
+def _timed(sql: str):
+    shape = _statement_shape(sql)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.DB_STATEMENT_SECONDS.observe(elapsed, statement=_statement_label(shape))
+        for queries in getattr(_recording, "logs", ()):
+            queries.statements.append((shape, elapsed))
+
+class QueryLog:
+    """
+    Statements run on this thread while recording, as (shape, seconds),
+    in order. COMMITs are not counted.
+    """
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def total_time(self) -> float:
+        return sum(seconds for _, seconds in self.statements)
+
+    def repeated(self, limit: int = REPEATED_QUERY_LIMIT) -> dict:
+        """Shapes run at least `limit` times (likely N+1 loops) -> times run."""
+        counts = {}
+        for shape, _ in self.statements:
+            counts[shape] = counts.get(shape, 0) + 1
+        return {shape: n for shape, n in counts.items() if limit and n >= limit}
+
+    def problems(self, max_queries: int = QUERY_BUDGET,
+                 max_seconds: float = QUERY_TIME_BUDGET,
+                 repeat_limit: int = REPEATED_QUERY_LIMIT) -> list[str]:
+        """What went over budget, one line each; 0 turns a check off."""
+        found = []
+        if max_queries and self.count > max_queries:
+            found.append(f"{self.count} statements (budget {max_queries})")
+        if max_seconds and self.total_time > max_seconds:
+            found.append(f"{self.total_time * 1000:.0f}ms in SQL (budget {max_seconds * 1000:.0f}ms)")
+        for shape, n in self.repeated(repeat_limit).items():
+            found.append(f"{n}x {_statement_label(shape)}")
+        return found
+
+def start_recording() -> QueryLog:
+    """Record statements run on this thread until stop_recording()."""
+    queries = QueryLog()
+    _recording.__dict__.setdefault("logs", []).append(queries)
+    return queries
+
+def stop_recording(queries: QueryLog):
+    logs = getattr(_recording, "logs", [])
+    if queries in logs:
+        logs.remove(queries)
+
+@contextmanager
+def record_queries():
+    """
+    Record the statements run in a with-block (on this thread):
+
+        with record_queries() as queries:
+            client.get("/portal")
+        assert not queries.repeated()
+    """
+    queries = start_recording()
+    try:
+        yield queries
+    finally:
+        stop_recording(queries)
+
+@contextmanager
+def assert_max_queries(n: int):
+    """Fail with the statements listed if the with-block runs more than `n`."""
+    with record_queries() as queries:
+        yield queries
+    if queries.count > n:
+        listing = "\n".join(f"  {_statement_label(shape)}" for shape, _ in queries.statements)
+        raise AssertionError(f"{queries.count} statements run, expected at most {n}:\n{listing}")
+
+# COPY text format: tab-separated, \N for NULL, backslash escapes
+def _copy_value(v) -> str:
+    if v is None:
+        return "\\N"
+    return (str(v).replace("\\", "\\\\").replace("\t", "\\t")
+                  .replace("\n", "\\n").replace("\r", "\\r"))
+
+# Unit of work: several statements on one connection, one commit
+class Transaction:
+    """
+    Handle yielded by transaction(). Statements run on the same connection
+    and are committed together when the with-block exits cleanly.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql: str, params: tuple | dict = ()):
+        """Same return rules as the module-level execute(), without the commit."""
+        with self.conn.cursor() as cur, _timed(sql):
+            cur.execute(sql, params)
+            return _fetch_result(cur, sql)
+
+    def fetchall(self, sql: str, params: tuple | dict = ()) -> list:
+        """Every result row, whatever the statement (e.g. UPDATE ... RETURNING)."""
+        with self.conn.cursor() as cur, _timed(sql):
+            cur.execute(sql, params)
+            return cur.fetchall() if cur.description else []
+
+    def execute_values(self, sql: str, rows: list, template: str | None = None,
+                       fetch: bool = False):
+        """
+        Multi-row INSERT/UPDATE in a single round trip. `sql` holds one
+        `VALUES %s` placeholder that is expanded with every row in `rows`.
+        Returns the RETURNING rows when fetch=True.
+        """
+        if not rows:
+            return [] if fetch else None
+        with self.conn.cursor() as cur, _timed(sql):
+            result = execute_values(
+                cur, sql, rows, template=template,
+                page_size=len(rows), fetch=fetch,
+            )
+        return result if fetch else None
+
+    def copy_rows(self, table: str, columns: list[str], rows):
+        """
+        Bulk-load rows with COPY ... FROM STDIN, the fastest way to insert
+        thousands of rows. None becomes NULL; table/columns are trusted names.
+        """
+        buf = io.StringIO()
+        for row in rows:
+            buf.write("\t".join(_copy_value(v) for v in row))
+            buf.write("\n")
+        buf.seek(0)
+        sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+        with self.conn.cursor() as cur, _timed(sql):
+            cur.copy_expert(sql, buf)
+            return cur.rowcount
+
+@contextmanager
+def transaction():
+    """
+    Run several statements as one transaction:
+
+        with transaction() as tx:
+            row = tx.execute("INSERT ... RETURNING id", (...))
+            tx.execute_values("INSERT INTO t (a, b) VALUES %s", rows)
+
+    Commits once on success; rolls everything back if the block raises.
+    """
+    with connection() as conn:
+        try:
+            yield Transaction(conn)
+            with metrics.DB_STATEMENT_SECONDS.time(statement="COMMIT"):
+                conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            logging.exception("Database error executing SQL")
+            raise
+
 # execution context for the connection pool
 
 def execute(sql: str, params: tuple = ()):
@@ -46,26 +535,10 @@ def execute(sql: str, params: tuple = ()):
       • If it’s a SELECT, returns a list of rows (each a dict).
       • If it’s an INSERT/UPDATE/DELETE with RETURNING, returns a single dict.
       • Otherwise returns None.
+    Each call is its own transaction; use transaction() to group statements.
     """
-    conn = _pool.getconn()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(sql, params)
-            result = None
-            if cur.description:
-                first_word = sql.lstrip().split()[0].upper()
-                if first_word == "SELECT":
-                    result = cur.fetchall()
-                else:
-                    result = cur.fetchone()
-            conn.commit()
-            return result
-    except Exception:
-        conn.rollback()
-        logging.exception("Database error executing SQL")
-        raise
-    finally:
-        _pool.putconn(conn)
+    with transaction() as tx:
+        return tx.execute(sql, params)
 
 # Query execution context
 def query(sql: str, params: tuple = ()):
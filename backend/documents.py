@@ -0,0 +1,190 @@
+# this file serves work-order PDFs, building them on first request
+# a document is cached on disk under a hash of everything that goes into it
+# (order data, QR link, layout version), so:
+#   • nothing is rendered until someone opens it
+#   • files lost on redeploy are rebuilt on the next download
+#   • the hash doubles as a strong ETag, so repeat downloads get a 304
+# URLs stay stable per order: /work_orders/lousso_<name>_order_<id>.pdf
+# (internal copy, with QR) and /work_orders/client_<name>_order_<id>.pdf
+import io
+import os
+import re
+import json
+import hashlib
+import logging
+import pathlib
+import tempfile
+from dataclasses import dataclass
+
+from backend.orders import get_order, load_orders, load_archived_order
+from backend.pdf_engine import LAYOUT_VERSION, PageStream, WorkOrderLayout
+from backend.qr_utils import order_scan_url
+
+log = logging.getLogger(__name__)
+
+BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
+WORK_DIR = BASE_DIR / "static" / "work_orders"
+# QR PNGs written by older versions (orders.qr_path); codes are drawn inline now
+LEGACY_QR_DIR = BASE_DIR / "static" / "qr"
+
+# lousso = internal copy with the scan QR code, client = without
+KINDS = ("lousso", "client")
+FILENAME_RE = re.compile(r"^(lousso|client)_[^/]*_order_(\d+)\.pdf$")
+
+
+@dataclass
+class Document:
+    kind: str
+    order_id: int
+    data: dict
+    etag: str
+
+    @property
+    def path(self) -> pathlib.Path:
+        return WORK_DIR / f"{self.kind}_{self.order_id}_{self.etag}.pdf"
+
+
+def document_urls(order_id: int, customer_name: str) -> dict:
+    """The lousso_pdf_path / client_pdf_path values stored on the order."""
+    slug = customer_name.lower().replace(" ", "_")
+    return {
+        f"{kind}_pdf_path": f"/work_orders/{kind}_{slug}_order_{order_id}.pdf"
+        for kind in KINDS
+    }
+
+def _fingerprint(kind: str, data: dict, base_url: str) -> str:
+    """Hash of every input the rendered PDF depends on."""
+    o = data["order"]
+    inputs = {
+        "v": LAYOUT_VERSION,
+        "kind": kind,
+        "order": {k: o.get(k) for k in ("order_id", "invoice_no", "notes",
+                                        "customer_name", "order_date")},
+        "specs": data["specs"],
+        "product_codes": data["product_codes"],
+        "qr": order_scan_url(o["order_id"], base_url) if kind == "lousso" else None,
+    }
+    raw = json.dumps(inputs, sort_keys=True, default=str).encode()
+    return hashlib.sha256(raw).hexdigest()[:32]
+
+def resolve_document(filename: str, base_url: str) -> Document | None:
+    """Work out which document a /work_orders/ filename refers to, or None."""
+    m = FILENAME_RE.match(filename)
+    if not m:
+        return None
+    kind, order_id = m.group(1), int(m.group(2))
+    data = get_order(order_id) or load_archived_order(order_id)
+    if data is None:
+        return None
+    # the name must be the one stored on the order, so a bare id can't be
+    # guessed with any slug
+    o = data["order"]
+    stored = o.get(f"{kind}_pdf_path") or \
+        document_urls(order_id, o["customer_name"])[f"{kind}_pdf_path"]
+    if stored.rsplit("/", 1)[-1] != filename:
+        return None
+    return Document(kind, order_id, data, _fingerprint(kind, data, base_url))
+
+def can_download(doc: Document, customer_id: int | None, is_staff: bool) -> bool:
+    """Staff get either copy; a customer only the client copy of their own order."""
+    if is_staff:
+        return True
+    return (doc.kind == "client" and customer_id is not None
+            and doc.data["order"]["customer_id"] == customer_id)
+
+def _layout(data: dict) -> WorkOrderLayout:
+    o, s = data["order"], data["specs"]  # specs is empty without an order_specs row
+    return WorkOrderLayout(
+        o["order_id"], o["customer_name"], o["invoice_no"], s.get("quantity"),
+        data["product_codes"],
+        "Yes" if s.get("repair_glue") else "No",
+        s.get("fabric_specs") or "",
+        {"back": s.get("back_style") or "", "seat": s.get("seat_style") or ""},
+        {"back": "Yes" if s.get("new_back_insert") else "No",
+         "seat": "Yes" if s.get("new_seat_insert") else "No"},
+        {"back": s.get("back_insert_type") or "", "seat": s.get("seat_insert_type") or ""},
+        {"style": s.get("trim_style") or "", "placement": s.get("placement") or "",
+         "vendor": s.get("vendor_color") or ""},
+        {"type": s.get("frame_finish") or "", "specs": s.get("specs") or "",
+         "topcoat": s.get("topcoat") or ""},
+        o["notes"] or "",
+        s.get("customer_initials") or "",
+        printed_on=o.get("order_date"),
+    )
+
+def ensure_document(doc: Document, base_url: str) -> pathlib.Path:
+    """Render the document unless this exact version is already on disk."""
+    path = doc.path
+    if path.exists():
+        return path
+    WORK_DIR.mkdir(parents=True, exist_ok=True)
+    qr_url = order_scan_url(doc.order_id, base_url) if doc.kind == "lousso" else None
+    # write to a temp file first so a concurrent download never sees half a
+    # file; the name is unique per call, so two threads rendering the same
+    # document don't write into each other's
+    with tempfile.NamedTemporaryFile(dir=WORK_DIR, prefix=f".{path.name}.",
+                                     suffix=".tmp", delete=False) as tmp:
+        pass
+    try:
+        _layout(doc.data).render(tmp.name, qr_url)
+        os.replace(tmp.name, path)
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+    log.info("Rendered %s", path.name)
+
+    # drop older versions of the same document
+    for old in WORK_DIR.glob(f"{doc.kind}_{doc.order_id}_*.pdf"):
+        if old != path:
+            old.unlink(missing_ok=True)
+    return path
+
+def remove_order_files(order_id: int) -> int:
+    """
+    Delete every file kept on disk for an order: cached PDFs, files from
+    before PDFs were cached by hash, and the old QR PNG. Returns how many.
+    Called after the order is gone; the PDFs could be rebuilt anyway.
+    """
+    paths = [p for kind in KINDS for p in WORK_DIR.glob(f"{kind}_{order_id}_*.pdf")]
+    paths += WORK_DIR.glob(f"*_order_{order_id}.pdf")
+    paths.append(LEGACY_QR_DIR / f"qr_{order_id}.png")
+    removed = 0
+    for path in paths:
+        try:
+            path.unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+def render_order_data(data: dict, base_url: str):
+    """
+    Render both copies of an already-loaded order (see orders.load_orders).
+    Needs no database, so it can run in a worker process.
+    """
+    order_id = data["order"]["order_id"]
+    for kind in KINDS:
+        ensure_document(Document(kind, order_id, data, _fingerprint(kind, data, base_url)), base_url)
+
+def prewarm_documents(order_id: int, base_url: str):
+    """Render both copies now rather than on first download."""
+    data = get_order(order_id)
+    if data is None:
+        raise LookupError(f"order {order_id} not found")
+    render_order_data(data, base_url)
+
+def stream_work_orders(order_ids: list[int], base_url: str, batch: int = 50,
+                       archived: bool = False):
+    """
+    Internal copies of many orders as one multi-page PDF, yielded in chunks
+    as each page is rendered. Orders are loaded `batch` at a time and pages
+    are not kept, so memory use doesn't grow with the number of orders.
+    """
+    out = PageStream()
+    yield out.header()
+    for start in range(0, len(order_ids), batch):
+        for data in load_orders(order_ids[start:start + batch], archived=archived):
+            buf = io.BytesIO()
+            _layout(data).render(buf, order_scan_url(data["order"]["order_id"], base_url))
+            yield out.add_page(buf.getvalue())
+    yield out.finish()
@@ -1,11 +1,16 @@
 # this file is for sending emails using Flask-Mail and Google SMTP
-# it includes a function to send registration emails
+# it includes functions to queue registration and staff welcome emails
+# in the outbox (backend/outbox.py), a direct registration send,
 # and a function to initialize the Flask-Mail instance
 
 import os
+import time
 from flask_mail import Mail, Message
 from flask import current_app
 
+from backend import metrics
+from backend.outbox import queue_email
+
 # create the Mail instance
 mail = Mail()
 
@@ -26,31 +31,52 @@ def init_mail(app):
     app.config["MAIL_DEBUG"] = True
     mail.init_app(app)
 
+# Registration email text, shared by the queued and direct senders
+def registration_email(token: str, order_id: int, base_url: str) -> tuple[str, str]:
+    """
+    Return (subject, body) for the account setup email.
+    """
+    link = f"{base_url}/register?token={token}&order_id={order_id}"
+    body = (
+        "Hi there!\n\n"
+        "You have a new order with Lousso Designs! Your project can now be viewed in our Order Tracker!\n\n"
+        f"Click here to finish setting up your account:\n{link}\n\n"
+        "If you already have an account with us, you can log in here:\n"
+        f"{base_url}/login"
+    )
+    return "Complete Your Registration", body
+
+# Queue the registration email in the caller's transaction
+def queue_registration_email(tx, to_addr: str, token: str, order_id: int, base_url: str):
+    subject, body = registration_email(token, order_id, base_url)
+    queue_email(tx, to_addr, subject, body)
+
+# Queue the staff welcome email in the caller's transaction
+def queue_staff_welcome_email(tx, to_addr: str, name: str, base_url: str):
+    queue_email(
+        tx, to_addr,
+        "Your Staff Account Has Been Created",
+        f"Hello {name},\n\nYour staff account for Lousso Designs has been created.\nYou can now log in at {base_url}/login\n\nIf you did not request this, please contact your administrator."
+    )
+
 # Sending registration email
 def send_registration_email(user_id: int, to_addr: str, token: str, order_id: int):
     """
     Send registration email to new customer with account setup link.
+    Sends immediately over Flask-Mail; order creation queues it instead.
     """
+    subject, body = registration_email(token, order_id, current_app.config['BASE_URL'])
     msg = Message(
-        subject="Complete Your Registration",
+        subject=subject,
         recipients=[to_addr],
     )
-    link = (
-    f"{current_app.config['BASE_URL']}"
-    f"/register?token={token}&order_id={order_id}"
-    )
-    msg.subject = "Complete Your Registration"
-    msg.body = (
-        "Hi there!\n\n"
-        "You have a new order with Lousso Designs! Your project can now be viewed in our Order Tracker!\n\n"
-        f"Click here to finish setting up your account:\n{link}\n\n"
-        "If you already have an account with us, you can log in here:\n"
-        f"{current_app.config['BASE_URL']}/login"
-    )
+    msg.body = body
+    start = time.perf_counter()
     try:
         mail.send(msg)
         current_app.logger.info("Email sent OK")
     except Exception as e:
+        metrics.EMAIL_SEND_SECONDS.observe(time.perf_counter() - start, result="error")
         current_app.logger.error(f"Email send failed: {e}")
         raise
-
+    metrics.EMAIL_SEND_SECONDS.observe(time.perf_counter() - start, result="ok")
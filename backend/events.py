@@ -0,0 +1,138 @@
+# this file records milestone status changes in scan_events, the
+# append-only history behind order and employee timelines
+# (sql/migrations/0008_scan_event_log.sql). Requests don't write events
+# themselves: record() adds them to an in-process buffer and a background
+# thread COPYs the buffer in one batch every SCAN_EVENT_FLUSH_SECONDS, or
+# sooner once SCAN_EVENT_FLUSH_SIZE events are waiting. A scan therefore
+# costs no extra round trip; the trade-off is that a crashing process can
+# lose its last unflushed second of history (a clean shutdown flushes).
+import os
+import atexit
+import logging
+import threading
+from datetime import datetime
+
+import psycopg2
+
+from backend.db import transaction, query
+
+log = logging.getLogger(__name__)
+
+FLUSH_SECONDS = float(os.getenv("SCAN_EVENT_FLUSH_SECONDS", 1))
+FLUSH_SIZE = int(os.getenv("SCAN_EVENT_FLUSH_SIZE", 500))
+# Events kept for retry while the database is unreachable; oldest go first
+MAX_PENDING = 50_000
+# Errors caused by the rows themselves rather than the connection: the batch
+# is split until the offending rows are found, and only those are dropped
+BAD_ROW_ERRORS = (psycopg2.DataError, psycopg2.IntegrityError)
+
+COLUMNS = ["scan_time", "order_id", "milestone_id", "item_id", "employee_id",
+           "status", "previous_status", "source", "notes"]
+
+class EventBuffer:
+    """Collects events and writes them to scan_events in batches."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._pending = []
+        self._thread = None
+        self._pid = None
+
+    def record(self, *, order_id: int, milestone_id: int | None, status: str,
+               previous_status: str | None, source: str,
+               employee_id: int | None = None, item_id: int | None = None,
+               scan_time: datetime | None = None, notes: str | None = None):
+        """Queue one status change; scan_time defaults to now."""
+        row = (scan_time or datetime.now(), order_id, milestone_id, item_id,
+               employee_id, status, previous_status, source, notes)
+        with self._cond:
+            self._start()
+            self._pending.append(row)
+            if len(self._pending) >= FLUSH_SIZE:
+                self._cond.notify()
+
+    def _start(self):
+        # one flusher per process, started lazily so forked workers get their own
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="scan-events", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._pending) >= FLUSH_SIZE, FLUSH_SECONDS)
+            self.flush()
+
+    def flush(self) -> int:
+        """Write everything buffered so far; returns how many events were written."""
+        with self._cond:
+            rows, self._pending = self._pending, []
+        written, chunks = 0, [rows] if rows else []
+        while chunks:
+            chunk = chunks.pop()
+            try:
+                with transaction() as tx:
+                    tx.copy_rows("scan_events", COLUMNS, chunk)
+                written += len(chunk)
+            except BAD_ROW_ERRORS as e:
+                if len(chunk) == 1:
+                    log.error("Dropped a scan event the database rejects: %r (%s)",
+                              chunk[0], str(e).strip())
+                    continue
+                # write the halves separately, the older half first
+                half = len(chunk) // 2
+                chunks += [chunk[half:], chunk[:half]]
+            except Exception:
+                unwritten = chunk + [row for later in reversed(chunks) for row in later]
+                log.exception("Could not write %d scan events; will retry", len(unwritten))
+                self._requeue(unwritten)
+                break
+        return written
+
+    def _requeue(self, rows: list):
+        with self._cond:
+            self._pending[:0] = rows
+            if len(self._pending) > MAX_PENDING:
+                dropped = len(self._pending) - MAX_PENDING
+                del self._pending[:dropped]
+                log.error("Dropped %d unwritten scan events", dropped)
+
+buffer = EventBuffer()
+record = buffer.record
+atexit.register(buffer.flush)
+
+def order_timeline(order_id: int) -> list:
+    """Every recorded milestone and item status change for an order, oldest first."""
+    return query(
+        """
+        SELECT e.scan_time, e.milestone_id,
+               COALESCE(m.milestone_name, am.milestone_name) AS milestone_name,
+               e.item_id, COALESCE(i.product_code, ai.product_code) AS product_code,
+               e.status, e.previous_status, e.source, c.name AS employee_name
+          FROM scan_events e
+          LEFT JOIN order_milestones m ON m.milestone_id = e.milestone_id
+          LEFT JOIN archive.order_milestones am ON am.milestone_id = e.milestone_id
+          LEFT JOIN order_items i ON i.item_id = e.item_id
+          LEFT JOIN archive.order_items ai ON ai.order_id = e.order_id AND ai.item_id = e.item_id
+          LEFT JOIN customers c ON c.customer_id = e.employee_id
+         WHERE e.order_id = %s
+         ORDER BY e.scan_time, e.scan_id
+        """,
+        (order_id,)
+    )
+
+def employee_timeline(employee_id: int, limit: int = 200) -> list:
+    """An employee's most recent status changes, newest first."""
+    return query(
+        """
+        SELECT e.scan_time, e.order_id, e.milestone_id, m.milestone_name,
+               e.status, e.previous_status, e.source
+          FROM scan_events e
+          LEFT JOIN order_milestones m ON m.milestone_id = e.milestone_id
+         WHERE e.employee_id = %s
+         ORDER BY e.scan_time DESC, e.scan_id DESC
+         LIMIT %s
+        """,
+        (employee_id, limit)
+    )
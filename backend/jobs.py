@@ -0,0 +1,132 @@
+# this file is the durable job queue behind background document generation
+# jobs live in the document_jobs table (sql/migrations/0001_document_jobs.sql)
+# the web request only enqueues; backend/worker.py claims and runs the jobs
+import os
+import json
+import logging
+from psycopg2.extras import Json
+
+from backend.db import execute, transaction
+
+# How long a claimed job may run before another worker may take it over
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 600))
+# Retry backoff: 30s, 60s, 120s, ... capped at one hour
+JOB_RETRY_BASE_SECONDS = int(os.getenv("JOB_RETRY_BASE_SECONDS", 30))
+JOB_RETRY_MAX_SECONDS = 3600
+
+log = logging.getLogger(__name__)
+
+# Enqueue (or re-arm) a job inside the caller's transaction
+def enqueue_job(tx, order_id: int, kind: str, payload: dict | None = None):
+    """
+    Queue `kind` work for an order. One row per (order, kind): enqueueing
+    again resets the existing job instead of adding a duplicate.
+    """
+    tx.execute(
+        """
+        INSERT INTO document_jobs (order_id, kind, payload)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (order_id, kind) DO UPDATE
+           SET payload    = EXCLUDED.payload,
+               status     = 'pending',
+               attempts   = 0,
+               run_after  = now(),
+               last_error = NULL
+        """,
+        (order_id, kind, Json(payload or {}))
+    )
+
+def enqueue_new_jobs(tx, order_ids: list[int], kind: str, payload: dict | None = None):
+    """
+    enqueue_job() for many orders created in this same transaction (so none
+    has a job yet), loaded with COPY in one round trip.
+    """
+    data = json.dumps(payload or {})
+    tx.copy_rows("document_jobs", ["order_id", "kind", "payload"],
+                 [(order_id, kind, data) for order_id in order_ids])
+
+def fail_expired_jobs() -> list[dict]:
+    """
+    Give up on 'running' jobs whose lease ran out on their last attempt.
+    A job that kills its worker (out of memory, a crash in rendering) never
+    reaches fail_job(), so this is where max_attempts stops it.
+    """
+    with transaction() as tx:
+        jobs = tx.fetchall(
+            """
+            UPDATE document_jobs
+               SET status     = 'failed',
+                   last_error = 'lease expired on the last attempt; the worker may have crashed'
+             WHERE job_id IN (
+                    SELECT job_id
+                      FROM document_jobs
+                     WHERE status = 'running'
+                       AND run_after <= now()
+                       AND attempts >= max_attempts
+                       FOR UPDATE SKIP LOCKED
+                   )
+            RETURNING job_id, order_id, kind, attempts
+            """
+        )
+    for job in jobs:
+        log.error("Job %s (%s, order %s) failed for good: lease expired after %s attempts",
+                  job["job_id"], job["kind"], job["order_id"], job["attempts"])
+    return jobs
+
+def claim_job() -> dict | None:
+    """
+    Claim the oldest runnable job, skipping rows other workers hold.
+    Also picks up 'running' jobs whose lease ran out (worker crashed),
+    unless that was their last attempt (see fail_expired_jobs).
+    """
+    fail_expired_jobs()
+    return execute(
+        """
+        UPDATE document_jobs
+           SET status    = 'running',
+               attempts  = attempts + 1,
+               run_after = now() + make_interval(secs => %s)
+         WHERE job_id = (
+                SELECT job_id
+                  FROM document_jobs
+                 WHERE status IN ('pending', 'running')
+                   AND (status = 'pending' OR attempts < max_attempts)
+                   AND run_after <= now()
+                 ORDER BY run_after
+                 LIMIT 1
+                   FOR UPDATE SKIP LOCKED
+               )
+        RETURNING job_id, order_id, kind, payload, attempts, max_attempts
+        """,
+        (JOB_LEASE_SECONDS,)
+    )
+
+def complete_job(job_id: int):
+    execute(
+        "UPDATE document_jobs SET status = 'done', last_error = NULL WHERE job_id = %s",
+        (job_id,)
+    )
+
+def fail_job(job: dict, error: str):
+    """Schedule a retry with exponential backoff, or give up after max_attempts."""
+    if job["attempts"] >= job["max_attempts"]:
+        log.error("Job %s (%s, order %s) failed for good: %s",
+                  job["job_id"], job["kind"], job["order_id"], error)
+        execute(
+            "UPDATE document_jobs SET status = 'failed', last_error = %s WHERE job_id = %s",
+            (error, job["job_id"])
+        )
+        return
+    delay = min(JOB_RETRY_BASE_SECONDS * 2 ** (job["attempts"] - 1), JOB_RETRY_MAX_SECONDS)
+    log.warning("Job %s (%s, order %s) failed, retrying in %ss: %s",
+                job["job_id"], job["kind"], job["order_id"], delay, error)
+    execute(
+        """
+        UPDATE document_jobs
+           SET status     = 'pending',
+               last_error = %s,
+               run_after  = now() + make_interval(secs => %s)
+         WHERE job_id = %s
+        """,
+        (error, delay, job["job_id"])
+    )
@@ -0,0 +1,68 @@
+# this file draws item barcode labels: one label per order item, 30 to a
+# letter sheet (the common 1" x 2-5/8" address-label layout, e.g. Avery
+# 5160), each with a Code 128 barcode of the item's barcode
+# (sql/migrations/0013_item_barcodes.sql) that /scan/item reads back
+# labels for any number of orders come out as one PDF, so a whole order,
+# or everything the dashboard filters select, prints as one job
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+from reportlab.graphics.barcode.code128 import Code128
+
+from backend import metrics
+from backend.db import query
+from backend.pdf_engine import PAGE_W, PAGE_H
+
+COLS, ROWS = 3, 10
+LABEL_W, LABEL_H = 2.625 * inch, 1 * inch
+LEFT, TOP = 0.1875 * inch, 0.5 * inch
+COL_GAP = 0.125 * inch
+PAD = 0.1 * inch
+BAR_H = 0.42 * inch
+
+def load_labels(order_ids: list[int]) -> list:
+    """Every item of these orders, in the given order, with what goes on its label."""
+    return query(
+        """
+        SELECT i.barcode, i.product_code, o.invoice_no, c.name AS customer_name,
+               row_number() OVER (PARTITION BY i.order_id ORDER BY i.item_id) AS n,
+               count(*) OVER (PARTITION BY i.order_id) AS of
+          FROM order_items i
+          JOIN orders o ON o.order_id = i.order_id
+          JOIN customers c ON c.customer_id = o.customer_id
+         WHERE i.order_id = ANY(%s)
+         ORDER BY array_position(%s, i.order_id), i.item_id
+        """,
+        (list(order_ids), list(order_ids))
+    )
+
+def _label(c: canvas.Canvas, item: dict, x: float, y: float):
+    """One label with its bottom-left corner at (x, y)."""
+    top = y + LABEL_H - PAD
+    c.setFont("Helvetica-Bold", 9)
+    c.drawString(x + PAD, top - 8, f"#{item['invoice_no']}  {item['product_code']}")
+    c.setFont("Helvetica", 7)
+    c.drawRightString(x + LABEL_W - PAD, top - 8, f"{item['n']} of {item['of']}")
+    c.drawString(x + PAD, top - 17, (item["customer_name"] or "")[:40])
+    # narrow the bars for long values so the barcode stays inside the label
+    bar = Code128(item["barcode"], barHeight=BAR_H, barWidth=0.012 * inch, quiet=False)
+    if bar.width > LABEL_W - 2 * PAD:
+        bar = Code128(item["barcode"], barHeight=BAR_H, quiet=False,
+                      barWidth=0.012 * inch * (LABEL_W - 2 * PAD) / bar.width)
+    bar.drawOn(c, x + PAD, y + PAD + 7)
+    c.drawString(x + PAD, y + PAD, item["barcode"])
+
+@metrics.RENDER_SECONDS.time(kind="labels_pdf")
+def render_labels(items: list, out):
+    """Draw the labels for `items` (from load_labels) to the file-like `out`."""
+    c = canvas.Canvas(out, pagesize=(PAGE_W, PAGE_H))
+    c.setTitle("Item labels")
+    per_page = COLS * ROWS
+    for i, item in enumerate(items):
+        if i and i % per_page == 0:
+            c.showPage()
+        row, col = divmod(i % per_page, COLS)
+        x = LEFT + col * (LABEL_W + COL_GAP)
+        y = PAGE_H - TOP - (row + 1) * LABEL_H
+        _label(c, item, x, y)
+    c.showPage()
+    c.save()
@@ -0,0 +1,226 @@
+# this file pushes order and milestone changes to open browser pages
+# database triggers NOTIFY "opts_changes" with the affected order ids
+# (sql/migrations/0006_change_notifications.sql); each web process runs one
+# listener thread that loads the changed orders once and hands them to every
+# connected /events stream (server-sent events), so pages update in place
+# instead of polling. The same notifications keep this process's order
+# cache (backend/cache.py) in step with writes made by other processes, so
+# the listener runs whenever the cache is on, not just while pages listen.
+# A stream ends after SSE_STREAM_SECONDS so it doesn't hold a web thread for
+# good; the browser reconnects and sends the id of the last event it saw,
+# and the changes it missed in between are replayed from a short history.
+import os
+import json
+import queue
+import select
+import logging
+import threading
+import time
+from collections import deque
+
+from backend.db import direct_connection
+from backend.orders import load_orders
+from backend.cache import invalidate_order, invalidate_all
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "opts_changes"
+# Wait this long after a notification for more to arrive, then send them together
+COALESCE_SECONDS = 0.2
+# Events a slow browser may fall behind by before it is told to reload
+SUBSCRIBER_QUEUE = 100
+# How long one /events response stays open before the browser reconnects
+STREAM_SECONDS = int(os.getenv("SSE_STREAM_SECONDS", 60))
+# Replay from this much before the browser's last event id: ids are wall-clock
+# times, and a reconnect can land on another worker. Seeing a change twice is harmless
+REPLAY_MARGIN = 1.0
+
+def order_event(data: dict) -> dict:
+    """The part of an order that the dashboard and order pages patch in."""
+    o = data["order"]
+    return {
+        "order_id": o["order_id"],
+        "invoice_no": o["invoice_no"],
+        "customer_name": o["customer_name"],
+        "due_date": o["due_date"].isoformat() if o["due_date"] else None,
+        "status": o["progress_status"],
+        "milestones": [
+            {"milestone_id": m["milestone_id"], "status": m["status"],
+             "is_approved": m["is_approved"], "version": m["version"]}
+            for m in data["milestones"]
+        ],
+    }
+
+class ChangeFeed:
+    """
+    One LISTEN connection per process, fanned out to any number of
+    subscribers. The listener thread starts with start() or the first
+    subscriber and reconnects on its own if the connection drops.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+        # the last SUBSCRIBER_QUEUE events as (time, event); every change
+        # since _complete_since is in there, or the history is too short
+        self._recent = deque(maxlen=SUBSCRIBER_QUEUE)
+        self._complete_since = None
+        self._last_unsubscribe = 0.0
+
+    def start(self):
+        """Start the listener thread unless it is already running."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="change-feed", daemon=True)
+                self._thread.start()
+
+    def subscribe(self, since: float | None = None) -> queue.Queue:
+        """
+        A queue of (time, event) pairs. `since` is the time of the last event
+        a reconnecting browser saw: later events are queued up first, or a
+        reload if this process can't tell what happened since then.
+        """
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE)
+        with self._lock:
+            if since is not None:
+                complete = self._complete_since
+                if complete is None or since < complete or (
+                        len(self._recent) == self._recent.maxlen
+                        and since < self._recent[0][0]):
+                    q.put_nowait((time.time(), {"reload": True}))
+                else:
+                    for stamp, event in self._recent:
+                        if stamp > since - REPLAY_MARGIN:
+                            q.put_nowait((stamp, event))
+            self._subscribers.add(q)
+        self.start()
+        return q
+
+    def unsubscribe(self, q: queue.Queue):
+        with self._lock:
+            self._subscribers.discard(q)
+            self._last_unsubscribe = time.time()
+
+    def publish(self, event: dict):
+        stamp = time.time()
+        with self._lock:
+            self._recent.append((stamp, event))
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait((stamp, event))
+            except queue.Full:
+                # too far behind to patch rows; have the page reload instead
+                with q.mutex:
+                    q.queue.clear()
+                q.put_nowait((stamp, {"reload": True}))
+
+    def _run(self):
+        delay = 1
+        while True:
+            try:
+                self._listen()
+                delay = 1
+            except Exception:
+                log.exception("Change feed stopped; reconnecting in %ss", delay)
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+
+    def _listen(self):
+        conn = direct_connection()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CHANNEL}")
+            log.info("Listening for %s", CHANNEL)
+            # whatever changed while nobody was listening went unheard
+            invalidate_all()
+            self._forget_history()
+            while True:
+                if select.select([conn], [], [], 30) == ([], [], []):
+                    conn.poll()  # wakes up periodically to notice a dead connection
+                    continue
+                order_ids, deleted, reload = set(), set(), False
+                deadline = time.monotonic() + COALESCE_SECONDS
+                while True:
+                    conn.poll()
+                    for n in conn.notifies:
+                        msg = json.loads(n.payload)
+                        reload = reload or msg.get("reload", False)
+                        ids = msg.get("order_ids") or []
+                        order_ids.update(ids)
+                        if msg["table"] == "orders" and msg["op"] == "DELETE":
+                            deleted.update(ids)
+                    conn.notifies.clear()
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    select.select([conn], [], [], remaining)
+                if reload:
+                    invalidate_all()
+                for order_id in order_ids:
+                    invalidate_order(order_id)
+                self._broadcast(order_ids, deleted, reload)
+        finally:
+            conn.close()
+
+    def _forget_history(self):
+        with self._lock:
+            self._recent.clear()
+            self._complete_since = time.time()
+
+    def _broadcast(self, order_ids: set, deleted: set, reload: bool):
+        with self._lock:
+            # keep the history going while a browser may be between streams
+            idle = (not self._subscribers and
+                    time.time() - self._last_unsubscribe > STREAM_SECONDS)
+        if idle:
+            self._forget_history()
+            return
+        if reload:
+            self.publish({"reload": True})
+            return
+        if not order_ids:
+            return
+        loaded = load_orders(sorted(order_ids - deleted))
+        found = {d["order"]["order_id"] for d in loaded}
+        self.publish({
+            "orders": [order_event(d) for d in loaded],
+            "deleted": sorted(order_ids - found),
+        })
+
+feed = ChangeFeed()
+
+def parse_event_id(value: str | None) -> float | None:
+    """The time in a Last-Event-ID header, or None if there isn't a valid one."""
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+def event_stream(last_event_id: float | None = None, keepalive: float = 15,
+                 lifetime: float = STREAM_SECONDS):
+    """
+    Server-sent events for one browser: an "orders" event per batch of
+    changes, plus a comment line every `keepalive` seconds so proxies keep
+    the connection open. Ends after `lifetime` seconds; the browser then
+    reconnects `retry` ms later with the last id, picking up from there.
+    """
+    q = feed.subscribe(last_event_id)
+    deadline = time.monotonic() + lifetime
+    try:
+        # an id right away, so a stream with no events still resumes from here
+        yield f"retry: 3000\nid: {time.time():.6f}\n\n"
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                stamp, event = q.get(timeout=min(keepalive, remaining))
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            yield f"id: {stamp:.6f}\nevent: orders\ndata: {json.dumps(event)}\n\n"
+    finally:
+        feed.unsubscribe(q)
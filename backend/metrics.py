@@ -0,0 +1,351 @@
+# this file collects the numbers behind GET /metrics, in the Prometheus
+# text format (no client library needed): request latency and status
+# counts (app.py), SQL statement counts and durations (backend/db.py),
+# connection pool checkouts, PDF and QR rendering, and email sends
+# every process (each gunicorn worker and the background worker) keeps its
+# own numbers and writes them to METRICS_DIR every METRICS_FLUSH_SECONDS;
+# /metrics adds up all the snapshots there, so one scrape covers every
+# process on the host. Only processes that call start() (app.py and
+# backend/worker.py) write snapshots, so one-off commands don't add to them.
+# Counters of processes that have exited stay in the totals, as Prometheus
+# expects; their gauges are dropped. A scrape folds exited processes'
+# snapshots into one archive file and deletes them, so the directory doesn't
+# grow with every restarted worker. Files are named by pid plus a token of
+# the process's own, so a process that reuses a pid never overwrites an
+# exited one's counters. gunicorn.conf.py empties the directory when the
+# server starts.
+import os
+import json
+import time
+import atexit
+import bisect
+import logging
+import secrets
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:     # Windows: exited processes' files are just kept
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+METRICS_DIR = os.getenv("METRICS_DIR") or os.path.join(tempfile.gettempdir(), "opts-metrics")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", 5))
+
+# Seconds; requests and renders, and the much shorter SQL statements
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+_lock = threading.Lock()
+_registry = {}          # name -> metric, in definition order
+_pid = os.getpid()
+_token = secrets.token_hex(4)
+_enabled = False
+_flusher = None
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values = {}    # label values (tuple of str) -> value
+        _registry[name] = self
+
+    def _key(self, labels: dict) -> tuple:
+        _check_process()
+        return tuple(str(labels[name]) for name in self.labels)
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Histogram(_Metric):
+    """Counts observations per bucket (not cumulative until rendered), plus sum and count."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            v = self.values.get(key)
+            if v is None:
+                v = self.values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            v[i] += 1           # the last bucket is +Inf
+            v[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the with-block takes, even if it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+class Gauge(_Metric):
+    """Read when a snapshot is taken: `read()` returns {label values tuple: value}."""
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), read=None):
+        super().__init__(name, help, labels)
+        self.read = read
+
+# ————— The metrics —————
+HTTP_REQUESTS = Counter(
+    "opts_http_requests_total", "HTTP requests by endpoint, method and status code",
+    ("endpoint", "method", "status"))
+HTTP_REQUEST_SECONDS = Histogram(
+    "opts_http_request_duration_seconds", "Time to build each response, by endpoint",
+    ("endpoint", "method"))
+DB_STATEMENT_SECONDS = Histogram(
+    "opts_db_statement_duration_seconds",
+    "SQL statements run through backend.db, by statement (count is the number of calls)",
+    ("statement",), buckets=SQL_BUCKETS)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "opts_db_pool_wait_seconds", "Time to check a connection out of the pool",
+    buckets=SQL_BUCKETS)
+DB_POOL_TIMEOUTS = Counter(
+    "opts_db_pool_timeouts_total", "Checkouts that gave up waiting for a free connection")
+DB_POOL_CONNECTIONS = Gauge(
+    "opts_db_pool_connections", "Open pooled connections by state (in_use, idle)",
+    ("state",))
+RENDER_SECONDS = Histogram(
+    "opts_render_duration_seconds", "PDF and QR code generation time, by what was rendered",
+    ("kind",))
+EMAIL_SEND_SECONDS = Histogram(
+    "opts_email_send_duration_seconds", "Time to hand one email to the SMTP server, by result",
+    ("result",))
+
+# ————— Snapshots shared between processes —————
+def start():
+    """Share this process's metrics through METRICS_DIR from now on."""
+    global _enabled
+    _enabled = True
+
+def _check_process():
+    # a forked child starts from zero and keeps its own snapshot file
+    global _pid, _token, _flusher
+    if _pid != os.getpid():
+        with _lock:
+            _pid = os.getpid()
+            _token = secrets.token_hex(4)
+            _flusher = None
+            for metric in _registry.values():
+                metric.values = {}
+    if _enabled and _flusher is None:
+        with _lock:
+            if _flusher is None:
+                _flusher = threading.Thread(target=_run, name="metrics", daemon=True)
+                _flusher.start()
+
+def _run():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        write_snapshot()
+
+def snapshot() -> dict:
+    """This process's metrics as plain data: {name: [[label values, value], ...]}."""
+    data = {}
+    for metric in _registry.values():
+        if metric.kind == "gauge":
+            try:
+                values = metric.read() if metric.read else {}
+            except Exception:
+                log.exception("Could not read gauge %s", metric.name)
+                values = {}
+        else:
+            with _lock:
+                values = {k: (list(v) if isinstance(v, list) else v) for k, v in metric.values.items()}
+        data[metric.name] = [[list(k), v] for k, v in values.items()]
+    return data
+
+ARCHIVE_FILE = "archived.json"
+
+def _snapshot_name() -> str:
+    return f"{os.getpid()}-{_token}.json"
+
+def _process_start(pid: int) -> int | None:
+    """When `pid` started (clock ticks after boot) where /proc tells; else None."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # the command name in (...) may hold spaces; starttime is field 22
+    return int(stat.rsplit(")", 1)[1].split()[19])
+
+def _write_json(path: str, data: dict):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+def write_snapshot():
+    """Write this process's snapshot to METRICS_DIR (replacing its previous one)."""
+    pid = os.getpid()
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        _write_json(os.path.join(METRICS_DIR, _snapshot_name()),
+                    {"pid": pid, "started": _process_start(pid), "metrics": snapshot()})
+    except OSError:
+        log.exception("Could not write metrics to %s", METRICS_DIR)
+
+@atexit.register
+def _write_last():
+    if _enabled:
+        write_snapshot()
+
+def clear_snapshots():
+    """Forget every process's numbers; for server start (gunicorn.conf.py)."""
+    try:
+        names = os.listdir(METRICS_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if name.endswith(".json") or name.endswith(".tmp"):
+            _unlink(name)
+
+def _unlink(name: str):
+    try:
+        os.unlink(os.path.join(METRICS_DIR, name))
+    except FileNotFoundError:
+        pass
+
+def _alive(pid: int, started: int | None = None) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    # a different process that was given the same pid later
+    return started is None or _process_start(pid) in (None, started)
+
+def _read(name: str) -> dict | None:
+    try:
+        with open(os.path.join(METRICS_DIR, name)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None     # replaced or removed while reading
+
+def _archive(names: list) -> dict:
+    """
+    Add the snapshots `names` (of exited processes) to ARCHIVE_FILE and
+    delete them; returns the archived metrics. The file lists what it took
+    in last, so files left behind by an interrupted scrape aren't added twice.
+    """
+    with open(os.path.join(METRICS_DIR, ".lock"), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive = _read(ARCHIVE_FILE) or {"merged": [], "metrics": {}}
+        for name in archive["merged"]:
+            _unlink(name)
+        totals, merged = {}, []
+        _add(totals, archive["metrics"], alive=False)
+        for name in names:
+            data = None if name in archive["merged"] else _read(name)
+            if data is None:
+                continue    # archived by another scrape meanwhile
+            _add(totals, data["metrics"], alive=False)
+            merged.append(name)
+        if merged or archive["merged"]:
+            archive = {
+                "merged": merged,
+                "metrics": {name: [[list(k), v] for k, v in values.items()]
+                            for name, values in totals.items()},
+            }
+            _write_json(os.path.join(METRICS_DIR, ARCHIVE_FILE), archive)
+            for name in merged:
+                _unlink(name)
+        return archive["metrics"]
+
+def _snapshots():
+    """(snapshot, process is running) for every process, this one read live."""
+    yield snapshot(), True
+    try:
+        names = os.listdir(METRICS_DIR)
+    except FileNotFoundError:
+        return
+    exited = []
+    for name in names:
+        if not name.endswith(".json") or name in (_snapshot_name(), ARCHIVE_FILE):
+            continue
+        data = _read(name)
+        if data is None:
+            continue
+        if _alive(data["pid"], data.get("started")):
+            yield data["metrics"], True
+        elif fcntl is None:
+            yield data["metrics"], False
+        else:
+            exited.append(name)
+    if fcntl is not None:
+        try:
+            yield _archive(exited), False
+        except OSError:
+            log.exception("Could not archive metrics in %s", METRICS_DIR)
+
+def _add(totals: dict, data: dict, alive: bool):
+    """Add one snapshot to `totals` ({name: {label values tuple: value}})."""
+    for name, values in data.items():
+        metric = _registry.get(name)
+        if metric is None or (metric.kind == "gauge" and not alive):
+            continue
+        merged = totals.setdefault(name, {})
+        for key, value in values:
+            key = tuple(key)
+            if metric.kind == "histogram":
+                if len(value) != len(metric.buckets) + 2:
+                    continue    # written with other buckets (older code)
+                prev = merged.get(key)
+                merged[key] = value if prev is None else [a + b for a, b in zip(prev, value)]
+            else:
+                merged[key] = merged.get(key, 0) + value
+
+# ————— Exposition —————
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names: tuple, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _number(v: float) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+def render() -> str:
+    """Every process's metrics added up, in the Prometheus text format."""
+    totals = {}
+    for data, alive in _snapshots():
+        _add(totals, data, alive)
+
+    lines = []
+    for name, metric in _registry.items():
+        lines.append(f"# HELP {name} {metric.help}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        for key, value in sorted(totals.get(name, {}).items()):
+            if metric.kind != "histogram":
+                lines.append(f"{name}{_labels(metric.labels, key)} {_number(value)}")
+                continue
+            cumulative = 0
+            for bound, n in zip(metric.buckets + ("+Inf",), value):
+                cumulative += n
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{_labels(metric.labels, key, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(metric.labels, key)} {_number(value[-1])}")
+            lines.append(f"{name}_count{_labels(metric.labels, key)} {cumulative}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,143 @@
+# this file applies the versioned schema changes in sql/migrations/ to an
+# existing database, in file-name order, recording each one in the
+# schema_migrations table so it only ever runs once
+#   python -m backend.migrate            apply pending migrations
+#   python -m backend.migrate --status   list applied / pending migrations
+# files whose first line is "-- migrate: no-transaction" run statement by
+# statement outside a transaction (needed for CREATE INDEX CONCURRENTLY)
+import sys
+import hashlib
+import logging
+import pathlib
+
+from backend.db import connection
+
+MIGRATIONS_DIR = pathlib.Path(__file__).resolve().parent.parent / "sql" / "migrations"
+NO_TRANSACTION_MARKER = "-- migrate: no-transaction"
+# Arbitrary constant so two deploys never migrate at the same time
+LOCK_ID = 5510_2025
+
+log = logging.getLogger(__name__)
+
+def _migration_files() -> list[pathlib.Path]:
+    return sorted(MIGRATIONS_DIR.glob("*.sql"))
+
+def _checksum(sql: str) -> str:
+    return hashlib.sha256(sql.encode("utf-8")).hexdigest()
+
+def _split_statements(sql: str) -> list[str]:
+    """
+    Split a no-transaction migration on semicolons at line ends. Keep those
+    files to plain statements; function bodies belong in normal migrations.
+    """
+    statements, current = [], []
+    for line in sql.splitlines():
+        if line.strip().startswith("--") and not current:
+            continue
+        current.append(line)
+        if line.rstrip().endswith(";"):
+            statements.append("\n".join(current).strip())
+            current = []
+    if "\n".join(current).strip():
+        statements.append("\n".join(current).strip())
+    return statements
+
+def _ensure_table(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version text PRIMARY KEY,
+            checksum text NOT NULL,
+            applied_at timestamp without time zone DEFAULT now() NOT NULL
+        )
+        """
+    )
+
+def _applied(cur) -> dict:
+    cur.execute("SELECT version, checksum FROM schema_migrations")
+    return {r["version"]: r["checksum"] for r in cur.fetchall()}
+
+def migration_status() -> list[dict]:
+    """Every migration file with whether it has been applied."""
+    with connection() as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                _ensure_table(cur)
+                applied = _applied(cur)
+        finally:
+            conn.autocommit = False
+    status = []
+    for path in _migration_files():
+        sql = path.read_text(encoding="utf-8")
+        version = path.stem
+        status.append({
+            "version": version,
+            "applied": version in applied,
+            "changed": version in applied and applied[version] != _checksum(sql),
+        })
+    return status
+
+def migrate() -> list[str]:
+    """
+    Apply every pending migration. Each one commits on its own, so a
+    failure stops the run with earlier migrations kept and the failing one
+    left pending. Returns the versions applied.
+    """
+    done = []
+    with connection() as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_lock(%s)", (LOCK_ID,))
+                try:
+                    _ensure_table(cur)
+                    applied = _applied(cur)
+                    for path in _migration_files():
+                        version, sql = path.stem, path.read_text(encoding="utf-8")
+                        if version in applied:
+                            if applied[version] != _checksum(sql):
+                                log.warning("Migration %s changed after it was applied", version)
+                            continue
+                        log.info("Applying migration %s", version)
+                        if sql.lstrip().startswith(NO_TRANSACTION_MARKER):
+                            for statement in _split_statements(sql):
+                                cur.execute(statement)
+                            cur.execute(
+                                "INSERT INTO schema_migrations (version, checksum) VALUES (%s, %s)",
+                                (version, _checksum(sql))
+                            )
+                        else:
+                            cur.execute("BEGIN")
+                            try:
+                                cur.execute(sql)
+                                cur.execute(
+                                    "INSERT INTO schema_migrations (version, checksum) VALUES (%s, %s)",
+                                    (version, _checksum(sql))
+                                )
+                                cur.execute("COMMIT")
+                            except Exception:
+                                cur.execute("ROLLBACK")
+                                raise
+                        done.append(version)
+                finally:
+                    cur.execute("SELECT pg_advisory_unlock(%s)", (LOCK_ID,))
+        finally:
+            conn.autocommit = False
+    return done
+
+def main(argv: list[str]) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if "--status" in argv:
+        for m in migration_status():
+            state = "applied" if m["applied"] else "pending"
+            if m["changed"]:
+                state += " (file changed since)"
+            print(f"{m['version']:40} {state}")
+        return 0
+    applied = migrate()
+    log.info("Applied %d migration(s)", len(applied))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,29 +1,25 @@
 # This file pertains to the order creation and processing logic for the OPTS application.
 # It handles the creation of new orders, including customer details, product codes,
 # and order specifications. 
-# It also generates 2 work order PDFs and a QR code for each order.
+# Each order gets 2 work order PDFs, rendered ahead of time by the background
+# worker (backend/worker.py), or on first download if that comes sooner
+# (backend/documents.py).
 # One PDF is for internal use and includes the QR code, and the other is for the client.
 import pathlib
-from datetime import datetime
-from reportlab.lib.pagesizes import LETTER
-from reportlab.lib.units import inch
-from reportlab.pdfgen import canvas
-from reportlab.platypus import Table, TableStyle
-from reportlab.lib import colors
+import secrets
 
 
 
-from backend.db import execute
-from backend.qr_utils import generate_order_qr
+from backend.db import transaction
+from backend.jobs import enqueue_job
+from backend.cache import invalidate_order
+from backend.documents import document_urls
+from backend.email_utils import queue_registration_email
+from backend.pdf_engine import WorkOrderLayout
 
-# Define the base directory and paths for QR codes and work orders
-BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
-QR_DIR = BASE_DIR / "static" / "qr"
-WORK_DIR = BASE_DIR / "static" / "work_orders"
-QR_DIR.mkdir(parents=True, exist_ok=True)
-WORK_DIR.mkdir(parents=True, exist_ok=True)
 
 # Get the order details and generate a PDF
+# (single-copy wrapper; backend/documents.py renders the order's own copies)
 def make_work_order_pdf(  
     path: pathlib.Path,
     order_id: int,
@@ -43,95 +39,14 @@ def make_work_order_pdf(
     finish: dict,
     notes: str,
     initials: str,
-    qr_path: str | None,
+    qr_url: str | None,
 ):
-    # Create a PDF canvas for the work order
-    c = canvas.Canvas(str(path), pagesize=LETTER)
-    w, h = LETTER
-    margin = 0.5 * inch
-    y = h - margin
-
-    # Title and date addition
-    c.setFont("Helvetica-Bold", 16)
-    c.drawString(margin, y, f"Work Order #{order_id}")
-    c.setFont("Helvetica", 10)
-    date_str = datetime.now().strftime("%Y-%m-%d")
-    c.drawRightString(w - margin, y, f"Date: {date_str}")
-    y -= 0.3 * inch
-
-    # Main information table (without product codes)
-    data = [
-        ["Client", client_name, "Invoice #", invoice_no],
-        ["Quantity", str(quantity), "Repair/Glue", repair_req],
-        ["Back Style", upholstery.get("back", ""), "Seat Style", upholstery.get("seat", "")],
-        ["New Back Insert", inserts.get("back", ""), "New Seat Insert", inserts.get("seat", "")],
-        ["Back Insert Type", insert_types.get("back", ""), "Seat Insert Type", insert_types.get("seat", "")],
-        ["Trim Style", trim.get("style", ""), "Placement", trim.get("placement", "")],
-        ["Vendor Color", trim.get("vendor", ""), "Frame Finish", finish.get("type", "")],
-        ["Finish Specs", finish.get("specs", ""), "Topcoat", finish.get("topcoat", "")],
-        ["Fabric Specs", fabric_specs or "", "Initials", initials or ""],
-    ]
-
-    # Main information table
-    table = Table(data, colWidths=[1.5*inch, 2.3*inch, 1.5*inch, 2.3*inch])
-    table.setStyle(TableStyle([
-        ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
-        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-        ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
-        ("FONTNAME", (0, 1), (-1, -1), "Helvetica"),
-        ("FONTSIZE", (0, 0), (-1, -1), 10),
-        ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-        ("ROWBACKGROUNDS", (0, 0), (-1, -1), [colors.white, colors.lightgrey] * 10),
-    ]))
-    tw, th = table.wrap(w - 2*margin, h)
-    table.drawOn(c, margin, y - th)
-    y -= th + 0.2 * inch
-
-    # Separate Product Codes Table
-    if product_codes:
-        product_code_data = [
-            ["Product Codes", ", ".join(product_codes)]
-        ]
-        
-        product_table = Table(product_code_data, colWidths=[1.5*inch, 5*inch])
-        product_table.setStyle(TableStyle([
-            ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
-            ("BACKGROUND", (0, 0), (-1, -1), colors.lightyellow),  
-            ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),      
-            ("FONTNAME", (1, 0), (-1, -1), "Helvetica"),          
-            ("FONTSIZE", (0, 0), (-1, -1), 11),                   
-            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-            ("LEFTPADDING", (0, 0), (-1, -1), 8),
-            ("RIGHTPADDING", (0, 0), (-1, -1), 8),
-        ]))
-        ptw, pth = product_table.wrap(w - 2*margin, h)
-        product_table.drawOn(c, margin, y - pth)
-        y -= pth + 0.2 * inch
-
-    # Notes section
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(margin, y, "Notes:")
-    y -= 0.2 * inch
-    c.setFont("Helvetica", 10)
-    for line in (notes or "").splitlines():
-        c.drawString(margin + 10, y, line)
-        y -= 0.15 * inch
-    y -= 0.2 * inch
-
-    # QR code (if exists)
-    if qr_path:
-        qr_file = QR_DIR / qr_path.split("/")[-1]
-        if qr_file.exists():
-            qr_size = 1.5 * inch
-            c.drawImage(
-                str(qr_file),
-                w - margin - qr_size,
-                margin,
-                width=qr_size, height=qr_size
-            )
-
-    c.showPage()
-    c.save()
+    layout = WorkOrderLayout(
+        order_id, client_name, invoice_no, quantity, product_codes, repair_req,
+        fabric_specs, upholstery, inserts, insert_types, trim, finish, notes,
+        initials,
+    )
+    layout.render(path, qr_url)
 
 # Create a new order with all details from order creation form in app.
 def create_order(
@@ -163,101 +78,88 @@ def create_order(
     topcoat: str | None,
     customer_initials: str | None,
 ) -> dict:
-    
-    # Ensure work orders directory exists and is writable
-    WORK_DIR.mkdir(parents=True, exist_ok=True) 
-    
-    # Lookup or create customer
-    cust_rows = execute(
-        "SELECT customer_id FROM customers WHERE email=%s",
-        (email,)
-    )
-    if cust_rows:
-        customer_id = cust_rows[0]["customer_id"]
-    else:
-        new_cust = execute(
-            "INSERT INTO customers(name,email,phone) VALUES(%s,%s,%s) RETURNING customer_id",
-            (name, email, phone)
-        )
-        customer_id = new_cust["customer_id"]
 
-    # Create order and grab its ID
-    order_res = execute(
-        "INSERT INTO orders(customer_id,invoice_no,due_date,notes) VALUES(%s,%s,%s,%s) RETURNING order_id",
-        (customer_id, invoice_no, due_date, notes)
-    )
-    order_id = order_res["order_id"]
+    token = secrets.token_urlsafe(16)
+    with transaction() as tx:
+        # Find-or-create the customer, give them a fresh one-time
+        # registration token and insert the order, all in one statement
+        order_res = tx.execute(
+            """
+            WITH found AS (
+                UPDATE customers
+                   SET register_token = %(token)s
+                 WHERE customer_id = (
+                        SELECT customer_id FROM customers
+                         WHERE email = %(email)s
+                         ORDER BY customer_id
+                         LIMIT 1
+                       )
+                RETURNING customer_id
+            ), created AS (
+                INSERT INTO customers (name, email, phone, register_token)
+                SELECT %(name)s, %(email)s, %(phone)s, %(token)s
+                 WHERE NOT EXISTS (SELECT 1 FROM found)
+                RETURNING customer_id
+            ), customer AS (
+                SELECT customer_id FROM found
+                UNION ALL
+                SELECT customer_id FROM created
+            )
+            INSERT INTO orders (customer_id, invoice_no, due_date, notes)
+            SELECT customer_id, %(invoice_no)s, %(due_date)s, %(notes)s
+              FROM customer
+            RETURNING order_id, customer_id
+            """,
+            {
+                "name": name, "email": email, "phone": phone,
+                "invoice_no": invoice_no, "due_date": due_date, "notes": notes,
+                "token": token,
+            }
+        )
+        order_id = order_res["order_id"]
+        customer_id = order_res["customer_id"]
 
-    # Insert milestones & items
-    for m in milestone_list:
-        execute(
-            "INSERT INTO order_milestones(order_id,milestone_name) VALUES(%s,%s)",
-            (order_id, m)
+        # Insert milestones & items as multi-row batches
+        tx.execute_values(
+            "INSERT INTO order_milestones (order_id, milestone_name) VALUES %s",
+            [(order_id, m) for m in milestone_list]
         )
-    for code in product_codes:
-        execute(
-            "INSERT INTO order_items(order_id,product_code,status) VALUES(%s,%s,'Pending')",
-            (order_id, code)
+        tx.execute_values(
+            "INSERT INTO order_items (order_id, product_code, status) VALUES %s",
+            [(order_id, code, "Pending") for code in product_codes]
         )
 
-    # Persist the detailed specs
-    execute(
-        """
-        INSERT INTO order_specs (
-            order_id, quantity, repair_glue, replace_springs,
-            back_style, seat_style, new_back_insert, new_seat_insert,
-            back_insert_type, seat_insert_type, trim_style, placement,
-            fabric_specs, vendor_color, frame_finish, specs, topcoat,
-            customer_initials
-        ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        """,
-        (
-            order_id, quantity, repair_glue, replace_springs,
-            back_style, seat_style, new_back_insert, new_seat_insert,
-            back_insert_type, seat_insert_type, trim_style, placement,
-            fabric_specs, vendor_color, frame_finish, specs_text,
-            topcoat, customer_initials,
+        # Persist the detailed specs
+        tx.execute(
+            """
+            INSERT INTO order_specs (
+                order_id, quantity, repair_glue, replace_springs,
+                back_style, seat_style, new_back_insert, new_seat_insert,
+                back_insert_type, seat_insert_type, trim_style, placement,
+                fabric_specs, vendor_color, frame_finish, specs, topcoat,
+                customer_initials
+            ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+            """,
+            (
+                order_id, quantity, repair_glue, replace_springs,
+                back_style, seat_style, new_back_insert, new_seat_insert,
+                back_insert_type, seat_insert_type, trim_style, placement,
+                fabric_specs, vendor_color, frame_finish, specs_text,
+                topcoat, customer_initials,
+            )
         )
-    )
-
-    # Generate QR and PDFs
-    qr_url = generate_order_qr(order_id, base_url, str(QR_DIR))
-
-    upholstery      = {"back": back_style, "seat": seat_style}
-    inserts_dict    = {"back": "Yes" if new_back_insert else "No", "seat": "Yes" if new_seat_insert else "No"}
-    insert_types    = {"back": back_insert_type or "", "seat": seat_insert_type or ""}
-    trim_dict       = {"style": trim_style or "", "placement": placement or "", "vendor": vendor_color or ""}
-    finish_dict     = {"type": frame_finish or "", "specs": specs_text or "", "topcoat": topcoat or ""}
 
-    slug = name.lower().replace(" ", "_")
-    internal_pdf = WORK_DIR / f"lousso_{slug}_order_{order_id}.pdf"
-    make_work_order_pdf(
-        internal_pdf, order_id, name, invoice_no, quantity,
-        product_codes, 
-        [], [], [], "Yes" if repair_glue else "No",
-        fabric_specs or "", upholstery, inserts_dict, insert_types,
-        trim_dict, finish_dict, notes or "", customer_initials or "",
-        qr_path=qr_url
-    )
-    client_pdf = WORK_DIR / f"client_{slug}_order_{order_id}.pdf"
-    make_work_order_pdf(
-        client_pdf, order_id, name, invoice_no, quantity,
-        product_codes, 
-        [], [], [], "Yes" if repair_glue else "No",
-        fabric_specs or "", upholstery, inserts_dict, insert_types,
-        trim_dict, finish_dict, notes or "", customer_initials or "",
-        qr_path=None
-    )
-
-    # Update order record with PDF & QR paths
-    execute(
-        "UPDATE orders SET qr_path=%s, lousso_pdf_path=%s, client_pdf_path=%s WHERE order_id=%s",
-        (
-            qr_url,
-            f"/static/work_orders/{internal_pdf.name}",
-            f"/static/work_orders/{client_pdf.name}",
-            order_id
+        # PDF URLs are fixed up front; the worker renders the files so the
+        # first download doesn't have to
+        paths = document_urls(order_id, name)
+        tx.execute(
+            "UPDATE orders SET lousso_pdf_path=%s, client_pdf_path=%s WHERE order_id=%s",
+            (paths["lousso_pdf_path"], paths["client_pdf_path"], order_id)
         )
-    )
-# Return order details including paths and QR code URL
-    return {"order_id": order_id, "invoice_no": invoice_no, "qr": qr_url, "customer_id": customer_id}
+        enqueue_job(tx, order_id, "documents", {"base_url": base_url})
+        # the "complete your registration" email goes out through the outbox
+        queue_registration_email(tx, email, token, order_id, base_url)
+
+    invalidate_order(order_id)
+# Return order details
+    return {"order_id": order_id, "invoice_no": invoice_no, "customer_id": customer_id}
@@ -0,0 +1,88 @@
+# this file loads everything an order page needs (order, specs, items
+# and milestones) and serves it through the order cache
+# (backend/cache.py); write paths call cache.invalidate_order() afterwards
+from datetime import datetime
+
+from backend.db import execute
+from backend.cache import cached_order
+
+def load_order(order_id: int) -> dict | None:
+    """
+    Read an order straight from the database in one round trip, or None if
+    it doesn't exist. Specs, items and milestones come back nested
+    via json_agg, so there is one query no matter how many rows they have.
+    """
+    found = load_orders([order_id])
+    return found[0] if found else None
+
+def load_orders(order_ids: list[int], archived: bool = False) -> list[dict]:
+    """
+    load_order() for many orders in one query, in the order of `order_ids`
+    (missing ids are skipped). archived=True reads the archive tables
+    instead (see backend/archive.py).
+    """
+    schema = "archive" if archived else "public"
+    rows = execute(
+        f"""
+        SELECT o.*, o.order_id AS id,
+               c.name AS customer_name, c.email, c.phone,
+               (SELECT row_to_json(s)
+                  FROM {schema}.order_specs s
+                 WHERE s.order_id = o.order_id) AS specs_json,
+               (SELECT json_agg(json_build_object(
+                           'item_id', i.item_id,
+                           'product_code', i.product_code,
+                           'barcode', i.barcode,
+                           'status', i.status
+                       ) ORDER BY i.item_id)
+                  FROM {schema}.order_items i
+                 WHERE i.order_id = o.order_id) AS items_json,
+               (SELECT json_agg(json_build_object(
+                           'milestone_id', m.milestone_id,
+                           'milestone_name', m.milestone_name,
+                           'status', m.status,
+                           'is_approved', m.is_approved,
+                           'is_client_action', m.is_client_action,
+                           'timestamp', m."timestamp",
+                           'version', m.version
+                       ) ORDER BY m.milestone_id)
+                  FROM {schema}.order_milestones m
+                 WHERE m.order_id = o.order_id) AS milestones_json
+          FROM {schema}.orders o
+          JOIN customers c ON o.customer_id = c.customer_id
+         WHERE o.order_id = ANY(%s)
+        """,
+        (list(order_ids),)
+    ) or []
+    # callers pick the order (e.g. batch printing sorts by due date)
+    position = {order_id: i for i, order_id in enumerate(order_ids)}
+    rows.sort(key=lambda row: position[row["order_id"]])
+    return [_assemble(row) for row in rows]
+
+def load_archived_order(order_id: int) -> dict | None:
+    """An archived order, read-only and uncached; None if it isn't archived."""
+    found = load_orders([order_id], archived=True)
+    return found[0] if found else None
+
+def _assemble(row) -> dict:
+    # plain dicts so the shared cache backend can pickle them
+    order = dict(row)
+    specs = order.pop("specs_json") or {}
+    items = order.pop("items_json") or []
+    milestones = order.pop("milestones_json") or []
+    for m in milestones:
+        # JSON carries timestamps as ISO strings; templates expect datetimes
+        if m["timestamp"]:
+            m["timestamp"] = datetime.fromisoformat(m["timestamp"])
+
+    return {
+        "order": order,
+        "specs": specs,
+        "product_codes": [i["product_code"] for i in items],
+        "items": items,
+        "milestones": milestones,
+    }
+
+def get_order(order_id: int) -> dict | None:
+    """Cached load_order(); treat the result as read-only."""
+    return cached_order(order_id, load_order)
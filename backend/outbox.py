@@ -0,0 +1,187 @@
+# this file is the transactional email outbox
+# queue_email() writes a row inside the caller's transaction, so the email
+# exists exactly when the order/staff account it belongs to was committed
+# drain_outbox() runs in the background worker and sends pending emails in
+# batches over one reused SMTP connection, with retry, backoff and a dead state
+import os
+import time
+import smtplib
+import logging
+from email.message import EmailMessage
+from email.utils import make_msgid
+
+from backend import metrics
+from backend.db import execute, transaction
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+# How long a claimed batch may take before another worker may retry it
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", 300))
+# Retry backoff: 1 min, 2 min, 4 min, ... capped at six hours
+OUTBOX_RETRY_BASE_SECONDS = int(os.getenv("OUTBOX_RETRY_BASE_SECONDS", 60))
+OUTBOX_RETRY_MAX_SECONDS = 6 * 3600
+
+log = logging.getLogger(__name__)
+
+def queue_email(tx, recipient: str, subject: str, body: str):
+    """Add an email to the outbox as part of the caller's transaction."""
+    tx.execute(
+        "INSERT INTO email_outbox (recipient, subject, body) VALUES (%s, %s, %s)",
+        (recipient, subject, body)
+    )
+
+# Keeps one SMTP session open across batches and reconnects when it drops
+class SMTPSender:
+    """
+    Minimal SMTP client for the outbox. Reads the same EMAIL_* settings as
+    Flask-Mail; point EMAIL_HOST/EMAIL_PORT at a local stand-in such as
+    aiosmtpd (with EMAIL_USE_TLS=false) to test without Gmail.
+    """
+
+    def __init__(self, host=None, port=None, use_tls=None, username=None,
+                 password=None, default_sender=None, timeout=30, idle_close=60):
+        self.host = host if host is not None else os.getenv("EMAIL_HOST")
+        self.port = port if port is not None else int(os.getenv("EMAIL_PORT", 587))
+        if use_tls is None:
+            use_tls = os.getenv("EMAIL_USE_TLS", "false").lower() in ("1", "true", "yes")
+        self.use_tls = use_tls
+        self.username = username if username is not None else os.getenv("EMAIL_USERNAME")
+        self.password = password if password is not None else os.getenv("EMAIL_PASSWORD")
+        self.default_sender = (default_sender if default_sender is not None
+                               else os.getenv("EMAIL_DEFAULT_SENDER") or self.username)
+        self.timeout = timeout
+        self.idle_close = idle_close
+        self._smtp = None
+        self._last_used = 0.0
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.host)
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        return smtp
+
+    def _connection(self):
+        # Servers drop idle sessions; reconnect rather than fail the first send
+        if self._smtp is not None and time.monotonic() - self._last_used > self.idle_close:
+            self.close()
+        if self._smtp is None:
+            self._smtp = self._connect()
+        return self._smtp
+
+    def send(self, recipient: str, subject: str, body: str):
+        msg = EmailMessage()
+        msg["From"] = self.default_sender
+        msg["To"] = recipient
+        msg["Subject"] = subject
+        msg["Message-ID"] = make_msgid()
+        msg.set_content(body)
+        start, result = time.perf_counter(), "error"
+        try:
+            self._connection().send_message(msg)
+            result = "ok"
+        except (smtplib.SMTPServerDisconnected, OSError):
+            self._smtp = None
+            raise
+        finally:
+            self._last_used = time.monotonic()
+            metrics.EMAIL_SEND_SECONDS.observe(time.perf_counter() - start, result=result)
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+def _is_permanent(exc: Exception) -> bool:
+    """5xx replies about the message or recipient will never succeed on retry."""
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(exc, (smtplib.SMTPSenderRefused, smtplib.SMTPDataError)):
+        return exc.smtp_code >= 500
+    return False
+
+def claim_batch(limit: int) -> list:
+    with transaction() as tx:
+        return tx.fetchall(
+            """
+            UPDATE email_outbox
+               SET status          = 'sending',
+                   attempts        = attempts + 1,
+                   next_attempt_at = now() + make_interval(secs => %s)
+             WHERE email_id IN (
+                    SELECT email_id
+                      FROM email_outbox
+                     WHERE status IN ('pending', 'sending')
+                       AND next_attempt_at <= now()
+                     ORDER BY next_attempt_at
+                     LIMIT %s
+                       FOR UPDATE SKIP LOCKED
+                   )
+            RETURNING email_id, recipient, subject, body, attempts, max_attempts
+            """,
+            (OUTBOX_LEASE_SECONDS, limit)
+        )
+
+def _mark_sent(email_ids: list):
+    if email_ids:
+        execute(
+            "UPDATE email_outbox SET status = 'sent', sent_at = now(), last_error = NULL "
+            "WHERE email_id = ANY(%s)",
+            (email_ids,)
+        )
+
+def _mark_failed(row: dict, error: str, permanent: bool):
+    if permanent or row["attempts"] >= row["max_attempts"]:
+        log.error("Email %s to %s moved to dead letters: %s", row["email_id"], row["recipient"], error)
+        execute(
+            "UPDATE email_outbox SET status = 'dead', last_error = %s WHERE email_id = %s",
+            (error, row["email_id"])
+        )
+        return
+    delay = min(OUTBOX_RETRY_BASE_SECONDS * 2 ** (row["attempts"] - 1), OUTBOX_RETRY_MAX_SECONDS)
+    log.warning("Email %s to %s failed, retrying in %ss: %s", row["email_id"], row["recipient"], delay, error)
+    execute(
+        """
+        UPDATE email_outbox
+           SET status          = 'pending',
+               last_error      = %s,
+               next_attempt_at = now() + make_interval(secs => %s)
+         WHERE email_id = %s
+        """,
+        (error, delay, row["email_id"])
+    )
+
+_sender = None
+
+def drain_outbox(sender: SMTPSender | None = None, batch_size: int = OUTBOX_BATCH_SIZE) -> int:
+    """
+    Send one batch of due emails over a single SMTP connection.
+    Returns how many were sent.
+    """
+    global _sender
+    if sender is None:
+        if _sender is None:
+            _sender = SMTPSender()
+        sender = _sender
+    if not sender.configured:
+        return 0
+
+    batch = claim_batch(batch_size)
+    sent = []
+    for row in batch:
+        try:
+            sender.send(row["recipient"], row["subject"], row["body"])
+            sent.append(row["email_id"])
+        except Exception as e:
+            _mark_failed(row, f"{type(e).__name__}: {e}", _is_permanent(e))
+    _mark_sent(sent)
+    if sent:
+        log.info("Sent %d queued email(s)", len(sent))
+    return len(sent)
@@ -0,0 +1,65 @@
+# this file benchmarks work-order PDF rendering (backend/pdf_engine.py)
+# run `python -m backend.pdf_bench [--orders 200] [--codes 5]`
+# it renders the internal + client copies for a sample order, in memory,
+# and reports documents per second and peak Python memory (tracemalloc):
+#   per-copy    - layout rebuilt for every copy (the old make_work_order_pdf path)
+#   shared      - layout built once per order, rendered twice
+# no database needed; record the numbers when changing the PDF code
+import io
+import sys
+import time
+import tracemalloc
+
+from backend.pdf_engine import WorkOrderLayout
+
+def sample_order(codes: int) -> dict:
+    return dict(
+        order_id=1234, client_name="Sample Client", invoice_no="INV-1234",
+        quantity=4, product_codes=[f"CH-{i:03d}" for i in range(codes)],
+        repair_req="Yes", fabric_specs="Linen, natural, 54in",
+        upholstery={"back": "Tight", "seat": "Loose cushion"},
+        inserts={"back": "No", "seat": "Yes"},
+        insert_types={"back": "", "seat": "Foam"},
+        trim={"style": "Welt", "placement": "Seat", "vendor": "Ivory"},
+        finish={"type": "Stain", "specs": "Walnut", "topcoat": "Satin"},
+        notes="Match the existing set.\nDeliver with the dining table.",
+        initials="SC",
+    )
+
+QR_URL = "https://example.com/scan/1234"
+
+def per_copy(order: dict, qr: str):
+    WorkOrderLayout(**order).render(io.BytesIO(), qr)
+    WorkOrderLayout(**order).render(io.BytesIO())
+
+def shared(order: dict, qr: str):
+    layout = WorkOrderLayout(**order)
+    layout.render(io.BytesIO(), qr)
+    layout.render(io.BytesIO())
+
+def measure(fn, orders: int, order: dict, qr: str) -> dict:
+    """Documents per second and peak traced memory (KiB) for `orders` pairs."""
+    fn(order, qr)  # warm up fonts and caches
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(orders):
+        fn(order, qr)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"docs_per_sec": 2 * orders / elapsed, "peak_kib": peak / 1024}
+
+def main(argv: list[str]) -> int:
+    orders, codes = 200, 5
+    if "--orders" in argv:
+        orders = int(argv[argv.index("--orders") + 1])
+    if "--codes" in argv:
+        codes = int(argv[argv.index("--codes") + 1])
+    order, qr = sample_order(codes), QR_URL
+    for name, fn in (("per-copy", per_copy), ("shared", shared)):
+        r = measure(fn, orders, order, qr)
+        print(f"{name:<9} {r['docs_per_sec']:8.1f} docs/sec   peak {r['peak_kib']:8.1f} KiB")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
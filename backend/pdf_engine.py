@@ -0,0 +1,267 @@
+# this file lays out and draws the work-order PDF
+# the layout (tables, styles, text positions) is built once per order and then
+# rendered as many times as needed: the internal copy with the QR code and the
+# client copy without it (see render_order_data and ensure_document in
+# backend/documents.py)
+# python -m backend.pdf_bench measures how fast this runs
+import re
+import pathlib
+from datetime import date, datetime
+from reportlab import rl_config
+from reportlab.lib.pagesizes import LETTER
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+from reportlab.platypus import Table, TableStyle
+from reportlab.lib import colors
+
+from backend import metrics
+from backend.qr_utils import qr_matrix, qr_runs
+
+# Write PDF streams as binary rather than ASCII85 text: ReportLab's pure-Python
+# ASCII85 encoder was the single largest cost per document
+rl_config.useA85 = 0
+
+PAGE_W, PAGE_H = LETTER
+MARGIN = 0.5 * inch
+QR_SIZE = 1.5 * inch
+
+# Bump when the drawing code changes so cached documents (backend/documents.py)
+# are rebuilt
+LAYOUT_VERSION = 2
+
+# Static styles, shared by every document
+MAIN_COL_WIDTHS = [1.5*inch, 2.3*inch, 1.5*inch, 2.3*inch]
+MAIN_STYLE = TableStyle([
+    ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
+    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("FONTNAME", (0, 1), (-1, -1), "Helvetica"),
+    ("FONTSIZE", (0, 0), (-1, -1), 10),
+    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+    ("ROWBACKGROUNDS", (0, 0), (-1, -1), [colors.white, colors.lightgrey] * 10),
+])
+
+PRODUCT_COL_WIDTHS = [1.5*inch, 5*inch]
+PRODUCT_STYLE = TableStyle([
+    ("GRID", (0, 0), (-1, -1), 0.5, colors.black),
+    ("BACKGROUND", (0, 0), (-1, -1), colors.lightyellow),
+    ("FONTNAME", (0, 0), (0, -1), "Helvetica-Bold"),
+    ("FONTNAME", (1, 0), (-1, -1), "Helvetica"),
+    ("FONTSIZE", (0, 0), (-1, -1), 11),
+    ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+    ("LEFTPADDING", (0, 0), (-1, -1), 8),
+    ("RIGHTPADDING", (0, 0), (-1, -1), 8),
+])
+
+
+class WorkOrderLayout:
+    """
+    One order's work-order page, laid out once. Tables are built and wrapped
+    in __init__; render() only draws, so each extra copy costs a canvas and
+    the page write, nothing more.
+    """
+
+    def __init__(self, order_id: int, client_name: str, invoice_no: str,
+                 quantity: int, product_codes: list[str], repair_req: str,
+                 fabric_specs: str, upholstery: dict, inserts: dict,
+                 insert_types: dict, trim: dict, finish: dict, notes: str,
+                 initials: str, printed_on: date | None = None):
+        self.title = f"Work Order #{order_id}"
+        self.date_line = f"Date: {(printed_on or datetime.now()).strftime('%Y-%m-%d')}"
+        avail_w = PAGE_W - 2*MARGIN
+        y = PAGE_H - MARGIN - 0.3 * inch
+
+        # Main information table (without product codes)
+        data = [
+            ["Client", client_name, "Invoice #", invoice_no],
+            ["Quantity", str(quantity), "Repair/Glue", repair_req],
+            ["Back Style", upholstery.get("back", ""), "Seat Style", upholstery.get("seat", "")],
+            ["New Back Insert", inserts.get("back", ""), "New Seat Insert", inserts.get("seat", "")],
+            ["Back Insert Type", insert_types.get("back", ""), "Seat Insert Type", insert_types.get("seat", "")],
+            ["Trim Style", trim.get("style", ""), "Placement", trim.get("placement", "")],
+            ["Vendor Color", trim.get("vendor", ""), "Frame Finish", finish.get("type", "")],
+            ["Finish Specs", finish.get("specs", ""), "Topcoat", finish.get("topcoat", "")],
+            ["Fabric Specs", fabric_specs or "", "Initials", initials or ""],
+        ]
+        main = Table(data, colWidths=MAIN_COL_WIDTHS, style=MAIN_STYLE)
+        _, th = main.wrap(avail_w, PAGE_H)
+        self.tables = [(main, y - th)]
+        y -= th + 0.2 * inch
+
+        # Separate Product Codes Table
+        if product_codes:
+            product = Table([["Product Codes", ", ".join(product_codes)]],
+                            colWidths=PRODUCT_COL_WIDTHS, style=PRODUCT_STYLE)
+            _, pth = product.wrap(avail_w, PAGE_H)
+            self.tables.append((product, y - pth))
+            y -= pth + 0.2 * inch
+
+        # Notes section: (y, line) pairs
+        self.notes_y = y
+        y -= 0.2 * inch
+        self.note_lines = []
+        for line in (notes or "").splitlines():
+            self.note_lines.append((y, line))
+            y -= 0.15 * inch
+
+    @metrics.RENDER_SECONDS.time(kind="work_order_pdf")
+    def render(self, out, qr_url: str | None = None):
+        """
+        Draw the page to `out` (a path or a binary file object), with a QR
+        code for `qr_url` in the bottom-right corner if given.
+        """
+        c = canvas.Canvas(str(out) if isinstance(out, pathlib.Path) else out,
+                          pagesize=LETTER)
+
+        # Title and date
+        c.setFont("Helvetica-Bold", 16)
+        c.drawString(MARGIN, PAGE_H - MARGIN, self.title)
+        c.setFont("Helvetica", 10)
+        c.drawRightString(PAGE_W - MARGIN, PAGE_H - MARGIN, self.date_line)
+
+        for table, top in self.tables:
+            table.drawOn(c, MARGIN, top)
+
+        c.setFont("Helvetica-Bold", 12)
+        c.drawString(MARGIN, self.notes_y, "Notes:")
+        c.setFont("Helvetica", 10)
+        for y, line in self.note_lines:
+            c.drawString(MARGIN + 10, y, line)
+
+        if qr_url:
+            draw_qr(c, qr_url, PAGE_W - MARGIN - QR_SIZE, MARGIN, QR_SIZE)
+
+        c.showPage()
+        c.save()
+
+
+def draw_qr(c: canvas.Canvas, url: str, x: float, y: float, size: float):
+    """Draw the QR code for `url` as vector shapes, bottom-left corner at (x, y)."""
+    module = size / len(qr_matrix(url))
+    top = y + size
+    c.saveState()
+    c.setFillColor(colors.white)
+    c.rect(x, y, size, size, stroke=0, fill=1)
+    c.setFillColor(colors.black)
+    p = c.beginPath()
+    for r, col, n in qr_runs(url):
+        p.rect(x + col * module, top - (r + 1) * module, n * module, module)
+    c.drawPath(p, stroke=0, fill=1)
+    c.restoreState()
+
+
+# ————— Merged multi-page output —————
+_OBJ_RE = re.compile(rb"(\d+) 0 obj\s*")
+_XREF_RE = re.compile(rb"xref\s+0\s+(\d+)\s+")
+_REF_RE = re.compile(rb"/([\w.+-]+)\s+(\d+) 0 R")
+
+def _read_objects(pdf: bytes) -> dict:
+    """Object number -> (dictionary bytes, stream bytes or None), via the xref table."""
+    start = int(re.findall(rb"startxref\s+(\d+)", pdf)[-1])
+    m = _XREF_RE.match(pdf, start)
+    if not m:
+        raise ValueError("expected a classic xref table")
+    objects = {}
+    for i in range(int(m.group(1))):
+        entry = pdf[m.end() + 20*i : m.end() + 20*(i + 1)].split()
+        if entry[2] != b"n":
+            continue
+        body = _OBJ_RE.match(pdf, int(entry[0])).end()
+        end = pdf.index(b"endobj", body)
+        st = pdf.find(b"stream", body, end)
+        if st == -1:
+            objects[i] = (pdf[body:end].strip(), None)
+            continue
+        head = pdf[body:st].strip()
+        data = st + len(b"stream")
+        data += 2 if pdf[data:data + 2] == b"\r\n" else 1
+        length = int(re.search(rb"/Length\s+(\d+)", head).group(1))
+        objects[i] = (head, pdf[data:data + length])
+    return objects
+
+class PageStream:
+    """
+    Joins single-page PDFs from WorkOrderLayout.render() into one document,
+    returning each page's bytes as soon as it is added so the result can be
+    streamed. Only object offsets are kept between pages, so memory stays flat
+    however many pages go through. Handles what the layouts draw: standard
+    fonts and one content stream per page (QR codes are vector shapes).
+
+        out = PageStream()
+        yield out.header()
+        for pdf in pages:
+            yield out.add_page(pdf)
+        yield out.finish()
+    """
+
+    CATALOG, PAGES = 1, 2
+
+    def __init__(self):
+        self._offsets = {}
+        self._pos = 0
+        self._next = 3
+        self._fonts = {}   # font dictionary -> object number
+        self._pages = []   # page object numbers
+
+    def _emit(self, chunk: bytes) -> bytes:
+        self._pos += len(chunk)
+        return chunk
+
+    def _object(self, body: bytes, num: int | None = None) -> bytes:
+        if num is None:
+            num, self._next = self._next, self._next + 1
+        self._offsets[num] = self._pos
+        return self._emit(b"%d 0 obj\n%s\nendobj\n" % (num, body))
+
+    def header(self) -> bytes:
+        return self._emit(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def add_page(self, pdf: bytes) -> bytes:
+        objects = _read_objects(pdf)
+        page = next(h for h, s in objects.values()
+                    if s is None and re.search(rb"/Type\s*/Page(?![s\w])", h))
+        if b"/XObject" in page:
+            raise ValueError("pages with images are not supported")
+        out = []
+
+        # Fonts are shared across pages; each distinct one is written once
+        fonts = re.search(rb"/Font\s+(\d+) 0 R", page)
+        font_refs = _REF_RE.findall(objects[int(fonts.group(1))][0]) if fonts else []
+        names = []
+        for name, ref in font_refs:
+            font = re.sub(rb"/Name\s*/[\w.+-]+", b"", objects[int(ref)][0])
+            if b"/FontDescriptor" in font:
+                raise ValueError("only the standard PDF fonts are supported")
+            if font not in self._fonts:
+                self._fonts[font] = self._next
+                out.append(self._object(font))
+            names.append(b"/%s %d 0 R" % (name, self._fonts[font]))
+
+        head, data = objects[int(re.search(rb"/Contents\s+(\d+) 0 R", page).group(1))]
+        contents = self._next
+        out.append(self._object(head + b"\nstream\n" + data + b"\nendstream"))
+
+        media_box = re.search(rb"/MediaBox\s*\[[^\]]*\]", page).group(0)
+        self._pages.append(self._next)
+        out.append(self._object(
+            b"<< /Type /Page /Parent %d 0 R %s /Contents %d 0 R "
+            b"/Resources << /Font << %s >> /ProcSet [ /PDF /Text ] >> >>"
+            % (self.PAGES, media_box, contents, b" ".join(names))
+        ))
+        return b"".join(out)
+
+    def finish(self) -> bytes:
+        kids = b" ".join(b"%d 0 R" % n for n in self._pages)
+        out = [
+            self._object(b"<< /Type /Pages /Count %d /Kids [ %s ] >>"
+                         % (len(self._pages), kids), self.PAGES),
+            self._object(b"<< /Type /Catalog /Pages %d 0 R >>" % self.PAGES, self.CATALOG),
+        ]
+        xref = self._pos
+        size = self._next
+        lines = [b"xref\n0 %d\n" % size, b"0000000000 65535 f \n"]
+        lines += [b"%010d 00000 n \n" % self._offsets[n] for n in range(1, size)]
+        lines.append(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                     % (size, self.CATALOG, xref))
+        out.append(self._emit(b"".join(lines)))
+        return b"".join(out)
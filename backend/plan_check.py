@@ -0,0 +1,362 @@
+# this file checks the query plans of the SQL in app.py and backend/*.py
+#   python -m backend.plan_check [--rows N]
+# it seeds N synthetic customers (with orders, milestones, items and specs)
+# inside a transaction that is rolled back at the end, so it is safe to
+# point at a dev database, and then
+#   • runs EXPLAIN (GENERIC_PLAN) on every plain SQL string literal, and
+#   • calls the functions that finish their SQL at run time (f-strings,
+#     VALUES %s batches) with sample arguments (samples() below), running
+#     EXPLAIN on every statement they send with its real parameters.
+# the seeded tables are small enough that the planner would happily read
+# them whole, so plans are made with sequential scans priced out
+# (enable_seqscan = off): a Seq Scan left on a hot table means no index can
+# serve the statement, and fails the check. So does a statement that
+# doesn't plan at all, and run-time SQL that no sample call reaches.
+# archive.* tables are cold storage that the archive views scan on purpose.
+# needs PostgreSQL 16+ for GENERIC_PLAN. exits 1 on any failure;
+# tests/test_plan_check.py runs it whenever a database is available.
+#
+# statements that really do need the whole table (e.g. rebuilds) opt out
+# with a /* full scan */ comment in the SQL.
+import ast
+import re
+import sys
+import json
+import pathlib
+import traceback
+from datetime import date
+from functools import lru_cache
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from backend import db
+
+BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
+SOURCES = [
+    BASE_DIR / "app.py",
+    *sorted(p for p in (BASE_DIR / "backend").glob("*.py") if p.name != "plan_check.py"),
+]
+
+# Tables that grow with order history; a seq scan on these (in the public
+# schema) is a regression
+HOT_TABLES = {
+    "customers", "orders", "order_milestones", "order_items", "order_specs",
+    "document_jobs", "email_outbox",
+}
+FULL_SCAN_MARKER = "/* full scan */"
+SQL_START = re.compile(r"^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\s")
+
+SEED_SQL = """
+INSERT INTO customers (name, email, phone, register_token, is_staff)
+SELECT 'Plan Check ' || g, 'plan-check-' || g || '@example.com', '555-0100',
+       md5(g::text), g %% 500 = 0
+  FROM generate_series(1, %(rows)s) g;
+
+INSERT INTO orders (customer_id, invoice_no, due_date, notes)
+SELECT c.customer_id, 'PC-' || c.customer_id || '-' || k,
+       current_date + (c.customer_id + k) %% 90, 'plan check order'
+  FROM customers c, generate_series(1, 3) k
+ WHERE c.email LIKE 'plan-check-%%';
+
+INSERT INTO order_milestones (order_id, milestone_name, status)
+SELECT o.order_id, m.name,
+       (ARRAY['Not Started', 'In Progress', 'Completed'])[1 + (o.order_id + m.n) %% 3]
+  FROM orders o,
+       unnest(ARRAY['Custom Material Preparation', 'In Production',
+                    'Awaiting Quality Check', 'Out for Delivery']) WITH ORDINALITY AS m(name, n)
+ WHERE o.invoice_no LIKE 'PC-%%';
+
+INSERT INTO order_items (order_id, product_code, status)
+SELECT o.order_id, 'CHAIR-' || k, 'Pending'
+  FROM orders o, generate_series(1, 4) k
+ WHERE o.invoice_no LIKE 'PC-%%';
+
+INSERT INTO order_specs (order_id, quantity)
+SELECT o.order_id, 4 FROM orders o WHERE o.invoice_no LIKE 'PC-%%';
+
+INSERT INTO document_jobs (order_id, kind, status)
+SELECT o.order_id, 'documents', 'done' FROM orders o WHERE o.invoice_no LIKE 'PC-%%';
+
+INSERT INTO email_outbox (recipient, subject, body, status)
+SELECT c.email, 'Complete Your Registration', 'plan check', 'sent'
+  FROM customers c
+ WHERE c.email LIKE 'plan-check-%%';
+
+INSERT INTO scan_events (scan_time, order_id, milestone_id, status, previous_status, source)
+SELECT now() - (m.milestone_id %% 1000) * interval '1 minute', m.order_id, m.milestone_id,
+       m.status, 'Not Started', 'plan_check'
+  FROM order_milestones m
+  JOIN orders o ON o.order_id = m.order_id
+ WHERE o.invoice_no LIKE 'PC-%%' AND m.status <> 'Not Started';
+
+-- every fourth order finished years ago and moved to the archive schema
+UPDATE order_milestones m SET status = 'Completed'
+  FROM orders o
+ WHERE o.order_id = m.order_id AND o.invoice_no LIKE 'PC-%%' AND o.order_id %% 4 = 0;
+UPDATE orders SET completed_at = now() - interval '3 years'
+ WHERE invoice_no LIKE 'PC-%%' AND order_id %% 4 = 0;
+SELECT archive_orders((now() - interval '1 year')::timestamp, %(rows)s * 3);
+
+ANALYZE;
+"""
+
+def _literals(node, function=None):
+    """(node, enclosing function, text, dynamic) for each string literal."""
+    for child in ast.iter_child_nodes(node):
+        if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            yield from _literals(child, child.name)
+        elif isinstance(child, ast.JoinedStr):
+            # an f-string is one statement; its pieces are not
+            text = "".join(v.value for v in child.values if isinstance(v, ast.Constant))
+            yield child, function, text, True
+        elif isinstance(child, ast.Constant) and isinstance(child.value, str):
+            yield child, function, child.value, "VALUES %s" in child.value
+        else:
+            yield from _literals(child, function)
+
+def collect_statements() -> list[dict]:
+    """
+    Every SQL string literal in the sources, as {"source", "line",
+    "function", "sql", "dynamic"}. Dynamic ones are completed at run time
+    and can only be checked through a sample call.
+    """
+    found = []
+    for path in SOURCES:
+        source = path.relative_to(BASE_DIR).as_posix()
+        tree = ast.parse(path.read_text(encoding="utf-8"))
+        for node, function, text, dynamic in _literals(tree):
+            if SQL_START.match(text) and " " in text.strip():
+                found.append({"source": source, "line": node.lineno, "function": function,
+                              "sql": text, "dynamic": dynamic})
+    return found
+
+def to_generic(sql: str) -> str:
+    """Turn psycopg2 %s / %(name)s placeholders into $n parameters."""
+    names = {}
+    counter = iter(range(1, 1000))
+
+    def repl(m):
+        if m.group(0) == "%%":
+            return "%"
+        if m.group(1):
+            if m.group(1) not in names:
+                names[m.group(1)] = next(counter)
+            return f"${names[m.group(1)]}"
+        return f"${next(counter)}"
+
+    return re.sub(r"%%|%\((\w+)\)s|%s", repl, sql)
+
+def seq_scans(plan: dict) -> list[str]:
+    tables = []
+    if (plan.get("Node Type") == "Seq Scan" and plan.get("Schema") == "public"
+            and plan.get("Relation Name") in HOT_TABLES):
+        tables.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        tables.extend(seq_scans(child))
+    return tables
+
+# ————— Sample calls for SQL built at run time —————
+# Dashboard filter combinations; each runs on the live and the archive tables
+SAMPLE_FILTERS = [
+    {}, {"q": "Plan Check 7"}, {"status": "In Progress"}, {"customer_id": "{customer_id}"},
+    {"due": "week"}, {"due_date": "{today}"}, {"milestone": "In Production"},
+    {"q": "PC-7", "status": "Completed", "milestone": "In Production"},
+]
+
+SAMPLE_ORDER = {
+    "name": "Plan Check Sample", "email": "plan-check-sample@example.com",
+    "phone": "555-0101", "invoice_no": "PC-SAMPLE", "due_date": "2030-01-31",
+    "notes": "plan check", "product_codes": ["CHAIR-1", "CHAIR-2"],
+    "milestone_list": ["Custom Material Preparation", "In Production"],
+    "quantity": 2, "repair_glue": True, "replace_springs": False,
+    "back_style": "Tight", "seat_style": "Loose", "new_back_insert": False,
+    "new_seat_insert": True, "back_insert_type": None, "seat_insert_type": "Foam",
+    "trim_style": None, "placement": None, "fabric_specs": "Linen",
+    "vendor_color": None, "frame_finish": None, "specs_text": None,
+    "topcoat": None, "customer_initials": "PC",
+}
+
+def _edit_milestone(ids: dict):
+    """POST /order/<id>/edit as a staff user, through the Flask app."""
+    from app import app
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session.update(user_id=ids["staff_id"], customer_id=ids["staff_id"],
+                       is_staff=True, customer_name="Plan Check")
+    suffix = ids["milestone_id"]
+    response = client.post(f"/order/{ids['order_id']}/edit", data={
+        f"milestone_status_{suffix}": "Completed",
+        f"milestone_was_{suffix}": ids["milestone_status"],
+        f"milestone_version_{suffix}": ids["milestone_version"],
+    })
+    if response.status_code != 302:
+        raise RuntimeError(f"edit returned {response.status_code}")
+
+def samples(ids: dict) -> list[tuple[str, object]]:
+    """(name, call) pairs run against the seeded data; `ids` picks seeded rows."""
+    from backend import dashboard, orders, search, scans, order_processing, bulk_import
+
+    calls = []
+    for raw in SAMPLE_FILTERS:
+        for archived in ("", "1"):
+            args = {k: v.format(**ids) for k, v in raw.items()}
+            filters = dashboard.parse_filters({**args, "archived": archived})
+            name = f"dashboard {args}{' archived' if archived else ''}"
+            calls += [
+                (name, lambda f=filters: dashboard.fetch_orders_page(f)),
+                (name, lambda f=filters: dashboard.fetch_orders_page(f, after=ids["order_id"])),
+                (name, lambda f=filters: dashboard.fetch_orders_page(f, before=ids["order_id"])),
+                (name, lambda f=filters: dashboard.fetch_order_ids(f, 500)),
+                (name, lambda f=filters: dashboard.fetch_facets(f)),
+            ]
+    calls += [
+        ("load_orders", lambda: orders.load_orders([ids["order_id"], ids["order_id"] + 1])),
+        ("load_orders archived", lambda: orders.load_orders([ids["order_id"]], archived=True)),
+        ("search_orders", lambda: search.search_orders("Plan Check 7")),
+        ("search_orders invoice", lambda: search.search_orders("PC-7", page=2)),
+        # before apply_scans, which changes the milestone's version
+        ("edit_order", lambda: _edit_milestone(ids)),
+        ("apply_scans", lambda: scans.apply_scans(
+            [{"key": "plan-check-1", "milestone_id": ids["milestone_id"],
+              "order_id": ids["order_id"]}], employee_id=ids["staff_id"])),
+        ("scan_item", lambda: scans.scan_item(ids["barcode"])),
+        ("create_order", lambda: order_processing.create_order(
+            base_url="http://localhost", **SAMPLE_ORDER)),
+        ("import_orders", lambda: bulk_import.import_orders(
+            [dict(SAMPLE_ORDER, invoice_no="PC-IMPORT-1"),
+             dict(SAMPLE_ORDER, invoice_no="PC-IMPORT-2", email=ids["email"])],
+            "http://localhost", notify=True)),
+    ]
+    return calls
+
+SEEDED_IDS_SQL = """
+SELECT c.customer_id, c.email, o.order_id, m.milestone_id, m.status AS milestone_status,
+       m.version AS milestone_version, i.barcode, current_date AS today,
+       (SELECT customer_id FROM customers
+         WHERE is_staff AND email LIKE 'plan-check-%%'
+         ORDER BY customer_id LIMIT 1) AS staff_id
+  FROM customers c
+  JOIN orders o ON o.customer_id = c.customer_id
+  JOIN order_milestones m ON m.order_id = o.order_id AND m.status <> 'Completed'
+  JOIN order_items i ON i.order_id = o.order_id
+ WHERE c.email LIKE 'plan-check-%%' AND NOT c.is_staff
+ ORDER BY c.customer_id, o.order_id, m.milestone_id, i.item_id
+ LIMIT 1
+"""
+
+class _Recorder(RealDictCursor):
+    """Cursor that notes what each statement was and who sent it."""
+    sent = None   # list to append (sql, stack) to while samples run
+
+    def execute(self, query, vars=None):
+        result = super().execute(query, vars)
+        if _Recorder.sent is not None:
+            sql = self.query.decode() if isinstance(self.query, bytes) else self.query
+            if SQL_START.match(sql):
+                _Recorder.sent.append((sql, traceback.extract_stack()[:-1]))
+        return result
+
+@lru_cache(maxsize=None)
+def _source_of(filename: str) -> str | None:
+    path = pathlib.Path(filename).resolve()
+    return path.relative_to(BASE_DIR).as_posix() if path in SOURCES else None
+
+def _run_samples(conn) -> tuple[list[tuple[str, str]], set, list[dict]]:
+    """
+    Run every sample call; returns ([(source, sql)] for each distinct
+    statement sent, {(source, function)} on their call stacks, [failures]).
+    """
+    from backend import events
+
+    with conn.cursor() as cur:
+        cur.execute(SEEDED_IDS_SQL)
+        ids = dict(cur.fetchone())
+    ids["today"] = ids["today"].isoformat()
+
+    failures, sent = [], []
+    conn.cursor_factory, _Recorder.sent = _Recorder, sent
+    try:
+        for name, call in samples(ids):
+            try:
+                call()
+            except Exception as e:
+                failures.append({"source": f"sample {name}", "sql": "",
+                                 "error": f"sample call failed: {e}"})
+        events.buffer.flush()   # the scan events they recorded, before rollback
+    finally:
+        conn.cursor_factory, _Recorder.sent = RealDictCursor, None
+
+    statements, reached = {}, set()
+    for sql, stack in sent:
+        frames = [(_source_of(f.filename), f) for f in stack]
+        frames = [(source, f) for source, f in frames if source]
+        reached.update((source, f.name) for source, f in frames)
+        # credit the statement to the innermost caller outside backend/db.py
+        caller = next((f"{source}:{f.lineno}" for source, f in reversed(frames)
+                       if source != "backend/db.py"), "?")
+        statements.setdefault(sql, caller)
+    return [(caller, sql) for sql, caller in statements.items()], reached, failures
+
+def explain(cur, source: str, sql: str, generic: bool = False) -> dict:
+    """EXPLAIN one statement (generic=True for %s placeholders); returns its result."""
+    result = {"source": source, "sql": " ".join(sql.split())}
+    cur.execute("SAVEPOINT plan_check")
+    try:
+        if generic:
+            cur.execute("EXPLAIN (GENERIC_PLAN, VERBOSE, FORMAT JSON) " + to_generic(sql))
+        else:
+            cur.execute("EXPLAIN (VERBOSE, FORMAT JSON) " + sql)
+        plan = cur.fetchone()["QUERY PLAN"]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        scans = seq_scans(plan[0]["Plan"])
+        if scans and FULL_SCAN_MARKER not in sql:
+            result["error"] = "Seq Scan on " + ", ".join(sorted(set(scans)))
+        cur.execute("RELEASE SAVEPOINT plan_check")
+    except psycopg2.Error as e:
+        cur.execute("ROLLBACK TO SAVEPOINT plan_check")
+        result["error"] = "does not plan: " + str(e).strip().splitlines()[0]
+    return result
+
+def check_plans(rows: int = 2000) -> list[dict]:
+    """EXPLAIN every statement against seeded data; returns one result each."""
+    statements = collect_statements()
+    results = []
+    with db.rolled_back() as conn:
+        with conn.cursor() as cur:
+            cur.execute(SEED_SQL, {"rows": rows})
+        sent, reached, failures = _run_samples(conn)
+        results.extend(failures)
+
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL enable_seqscan = off")
+            for s in statements:
+                if not s["dynamic"]:
+                    results.append(explain(cur, f"{s['source']}:{s['line']}", s["sql"], generic=True))
+            for source, sql in sent:
+                results.append(explain(cur, source, sql))
+
+        for s in statements:
+            if s["dynamic"] and (s["source"], s["function"]) not in reached:
+                results.append({
+                    "source": f"{s['source']}:{s['line']}",
+                    "sql": " ".join(s["sql"].split()),
+                    "error": f"{s['function']}() builds SQL at run time but no sample call reaches it; add one to samples()",
+                })
+    return results
+
+def main(argv: list[str]) -> int:
+    rows = 2000
+    if "--rows" in argv:
+        rows = int(argv[argv.index("--rows") + 1])
+    results = check_plans(rows)
+    failures = [r for r in results if "error" in r]
+    for r in failures:
+        print(f"FAIL  {r['source']}: {r['error']}\n      {r['sql'][:160]}")
+    print(f"{len(results)} statements checked, {len(failures)} failed")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,14 +1,60 @@
-import os, qrcode
+from functools import lru_cache
+
+import qrcode
+
+from backend import metrics
 
 # this is a utility for generating QR codes for orders
-# it creates a PNG file in the static directory of root
 # the QR code links to a URL for scanning the order
-def generate_order_qr(order_id: int, base_url: str, static_qr_dir: str) -> str:
-    """Create QR PNG → return web path like '/static/qr/qr_123.png'"""
-    url = f"{base_url}/scan/{order_id}"
-    os.makedirs(static_qr_dir, exist_ok=True)
-    filename = f"qr_{order_id}.png"
-    filepath = os.path.join(static_qr_dir, filename)
-    img = qrcode.make(url)
-    img.save(filepath)
-    return f"/static/qr/{filename}"
\ No newline at end of file
+# codes are drawn from the module matrix directly: as vector rectangles in the
+# work-order PDF (backend/pdf_engine.py) and as SVG for screens, so no image
+# is ever encoded or written to disk
+
+# Quiet zone around the code, in modules (the QR spec asks for 4)
+BORDER = 4
+
+def order_scan_url(order_id: int, base_url: str) -> str:
+    """The URL an order's QR code points to."""
+    return f"{base_url}/scan/{order_id}"
+
+# Entries are a few KB each; the bound keeps long batch prints from growing
+QR_CACHE_SIZE = 256
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+@metrics.RENDER_SECONDS.time(kind="qr")   # cache misses only
+def qr_matrix(url: str) -> tuple[bytes, ...]:
+    """Module matrix for `url`, one bytes row per line (1 = dark), quiet zone included."""
+    qr = qrcode.QRCode(border=BORDER)
+    qr.add_data(url)
+    qr.make(fit=True)
+    return tuple(bytes(row) for row in qr.get_matrix())
+
+@lru_cache(maxsize=QR_CACHE_SIZE)
+def qr_runs(url: str) -> tuple[tuple[int, int, int], ...]:
+    """
+    Dark modules merged into horizontal runs: (row, first column, length).
+    Far fewer shapes to draw than one square per module.
+    """
+    runs = []
+    for r, row in enumerate(qr_matrix(url)):
+        c, n = 0, len(row)
+        while c < n:
+            if row[c]:
+                start = c
+                while c < n and row[c]:
+                    c += 1
+                runs.append((r, start, c - start))
+            else:
+                c += 1
+    return tuple(runs)
+
+def qr_svg(url: str) -> str:
+    """Scalable SVG of the code; size it with CSS or width/height attributes."""
+    size = len(qr_matrix(url))
+    path = "".join(f"M{c} {r}h{n}v1h-{n}z" for r, c, n in qr_runs(url))
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {size} {size}" '
+        f'shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/>'
+        f'<path d="{path}" fill="#000"/></svg>'
+    )
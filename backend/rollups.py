@@ -0,0 +1,54 @@
+# this file gives access to the milestone rollups maintained by database
+# triggers (sql/migrations/0003_milestone_rollups.sql):
+#   orders.progress_status / milestones_* counters and milestone_summary
+#   order_facet_* (dashboard dropdown counts, 0014_order_facet_rollups.sql)
+# run `python -m backend.rollups` to rebuild them from scratch after drift
+import logging
+
+from backend.db import execute
+
+log = logging.getLogger(__name__)
+
+def milestone_summary() -> dict:
+    """Milestone name → number of orders that include it."""
+    rows = execute(
+        "SELECT milestone_name, total FROM milestone_summary WHERE total > 0"
+    ) or []
+    return {r["milestone_name"]: r["total"] for r in rows}
+
+def find_drift(limit: int = 20) -> list:
+    """Orders whose stored counters disagree with their milestone rows."""
+    return execute(
+        """
+        SELECT o.order_id,
+               o.milestones_total, x.total,
+               o.milestones_not_started, x.not_started,
+               o.milestones_completed, x.completed
+          FROM orders o
+          JOIN LATERAL (
+                SELECT COUNT(*) AS total,
+                       COUNT(*) FILTER (WHERE m.status = 'Not Started') AS not_started,
+                       COUNT(*) FILTER (WHERE m.status = 'Completed') AS completed
+                  FROM order_milestones m
+                 WHERE m.order_id = o.order_id
+               ) x ON TRUE
+         WHERE (o.milestones_total, o.milestones_not_started, o.milestones_completed)
+               <> (x.total, x.not_started, x.completed)
+         ORDER BY o.order_id
+         LIMIT %s
+        """,
+        (limit,)
+    ) or []
+
+def rebuild_rollups():
+    """Recompute every order counter, the milestone summary and the dashboard facets."""
+    execute("SELECT rebuild_milestone_rollups()")
+    execute("SELECT rebuild_order_facets()")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    drift = find_drift()
+    if drift:
+        log.info("Found drift in %d order(s), e.g. %s", len(drift), [d["order_id"] for d in drift])
+    rebuild_rollups()
+    log.info("Milestone rollups rebuilt")
@@ -0,0 +1,149 @@
+# this file applies milestone scans sent from the shop-floor scan page
+# the page queues every scan locally with a key it generated and the time
+# of the scan, then sends whatever is queued in one POST /scan/batch when
+# it is online. All scans in a batch are applied in one transaction, and
+# each key is recorded in scan_receipts, so resending a batch (e.g. after
+# the response was lost) changes nothing.
+# scan_item() handles item barcodes (sql/migrations/0013_item_barcodes.sql),
+# scanned one at a time with a handheld scanner at /scan/item
+from datetime import datetime
+
+from backend.db import execute, transaction
+from backend.cache import invalidate_order
+from backend.events import record as record_event
+
+# Most scans accepted in one request; the page sends larger queues in chunks
+MAX_BATCH = 1000
+KEY_MAX = 64
+
+# An item scan moves the item one step along; a scan can also set "status"
+ITEM_STATUSES = ["Pending", "In Progress", "Completed"]
+
+def _parse(item) -> tuple[tuple | None, str | None]:
+    """One queued scan -> ((key, milestone_id, order_id, scanned_at), None) or (None, error)."""
+    if not isinstance(item, dict):
+        return None, "expected an object"
+    key = item.get("key")
+    if not isinstance(key, str) or not 0 < len(key) <= KEY_MAX:
+        return None, f"key must be a string of 1-{KEY_MAX} characters"
+    try:
+        milestone_id = int(item["milestone_id"])
+        order_id = int(item["order_id"])
+    except (KeyError, TypeError, ValueError):
+        return None, "milestone_id and order_id are required"
+    try:
+        scanned_at = datetime.fromisoformat(item["scanned_at"]) if item.get("scanned_at") else None
+    except (TypeError, ValueError):
+        return None, "scanned_at must be an ISO 8601 timestamp"
+    return (key, milestone_id, order_id, scanned_at), None
+
+def apply_scans(items: list, employee_id: int | None = None) -> dict:
+    """
+    Mark the scanned milestones Completed. Returns the keys that were
+    "applied", those seen before ("duplicate"), and "rejected" ones as
+    {"key": ..., "error": ...}; rejected scans can never succeed, so the
+    page drops them as well. Each completion goes to the scan event log.
+    """
+    result = {"applied": [], "duplicate": [], "rejected": []}
+    scans = []
+    for item in items:
+        scan, error = _parse(item)
+        if error:
+            key = item.get("key") if isinstance(item, dict) else None
+            result["rejected"].append({"key": key, "error": error})
+        else:
+            scans.append(scan)
+    if not scans:
+        return result
+
+    with transaction() as tx:
+        rows = tx.fetchall(
+            "SELECT milestone_id, order_id FROM order_milestones WHERE milestone_id = ANY(%s)",
+            (list({s[1] for s in scans}),)
+        )
+        owner = {r["milestone_id"]: r["order_id"] for r in rows}
+        known = []
+        for s in scans:
+            if owner.get(s[1]) != s[2]:
+                result["rejected"].append({"key": s[0], "error": "milestone not found for this order"})
+            else:
+                known.append(s)
+        if not known:
+            return result
+
+        # Keys already recorded conflict and are skipped, so only new scans
+        # come back; scans without a device time count from now, and clocks
+        # running ahead are capped at the server's time
+        fresh = tx.execute_values(
+            "INSERT INTO scan_receipts (scan_key, milestone_id, order_id, scanned_at) "
+            "VALUES %s ON CONFLICT (scan_key) DO NOTHING "
+            "RETURNING scan_key, milestone_id, scanned_at",
+            known,
+            template="(%s, %s, %s, LEAST(COALESCE(%s::timestamptz, now()), now()))",
+            fetch=True,
+        )
+        new_keys = {r["scan_key"] for r in fresh}
+        result["applied"] = [s[0] for s in known if s[0] in new_keys]
+        result["duplicate"] = [s[0] for s in known if s[0] not in new_keys]
+
+        # The first scan of a milestone completes it; milestones that are
+        # already complete keep their original completion time
+        first = {}
+        for r in fresh:
+            if r["milestone_id"] not in first or r["scanned_at"] < first[r["milestone_id"]]:
+                first[r["milestone_id"]] = r["scanned_at"]
+        changed = tx.execute_values(
+            """
+            UPDATE order_milestones m
+               SET status = 'Completed', is_approved = TRUE, "timestamp" = v.scanned_at
+              FROM (VALUES %s) AS v(milestone_id, scanned_at), order_milestones old
+             WHERE m.milestone_id = v.milestone_id
+               AND old.milestone_id = m.milestone_id
+               AND NOT (m.status = 'Completed' AND m.is_approved)
+            RETURNING m.order_id, m.milestone_id, old.status AS previous_status, v.scanned_at
+            """,
+            list(first.items()),
+            template="(%s, %s::timestamp)",
+            fetch=True,
+        )
+
+    for r in changed:
+        if r["previous_status"] != "Completed":
+            record_event(order_id=r["order_id"], milestone_id=r["milestone_id"],
+                         status="Completed", previous_status=r["previous_status"],
+                         source="batch", employee_id=employee_id, scan_time=r["scanned_at"])
+    for order_id in {r["order_id"] for r in changed}:
+        invalidate_order(order_id)
+    return result
+
+def scan_item(barcode: str, status: str | None = None,
+              employee_id: int | None = None) -> dict | None:
+    """
+    Resolve a scanned barcode to its item and order and update the item's
+    status in one statement: to `status` if given, otherwise the next step
+    in ITEM_STATUSES. Returns the item (with invoice_no and the previous
+    status), or None for an unknown barcode.
+    """
+    row = execute(
+        """
+        UPDATE order_items i
+           SET status = COALESCE(%(status)s,
+                                 CASE old.status WHEN 'Pending' THEN 'In Progress'
+                                                 ELSE 'Completed' END)
+          FROM order_items old
+          JOIN orders o ON o.order_id = old.order_id
+         WHERE old.barcode = %(barcode)s
+           AND i.item_id = old.item_id
+        RETURNING i.item_id, i.order_id, i.barcode, i.product_code, i.status,
+                  old.status AS previous_status, o.invoice_no, now() AS changed_at
+        """,
+        {"barcode": barcode, "status": status}
+    )
+    if not row:
+        return None
+    if row["status"] != row["previous_status"]:
+        record_event(order_id=row["order_id"], milestone_id=None, item_id=row["item_id"],
+                     status=row["status"], previous_status=row["previous_status"],
+                     source="item_scan", employee_id=employee_id, scan_time=row["changed_at"])
+    invalidate_order(row["order_id"])
+    return row
@@ -0,0 +1,112 @@
+# this file searches orders through the order_search index kept by
+# triggers (sql/migrations/0012_order_search.sql): invoice number, customer
+# name/email/phone, product codes, notes and specs
+# every word typed must match the start of an indexed word, so partial
+# input like "jan INV-10" finds orders as you type; where pg_trgm is
+# installed, substrings and near misses ("jhonson") match too
+# results are ranked with invoice and customer matches first, and whole
+# invoice/customer words typed in full ahead of everything else
+import re
+import logging
+
+from backend.db import execute
+
+log = logging.getLogger(__name__)
+
+PAGE_SIZE = 20
+MAX_QUERY_LENGTH = 200
+# Only the newest this-many matches are ranked, so a broad search ("a",
+# "INV-1") costs about the same as a narrow one. Exact invoice/customer hits
+# are collected on their own (up to the same number), however old they are
+MAX_CANDIDATES = 1000
+
+_trigram = None
+
+def has_trigram() -> bool:
+    """Whether pg_trgm is installed; checked once per process."""
+    global _trigram
+    if _trigram is None:
+        row = execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') AS ok")
+        _trigram = bool(row and row[0]["ok"])
+        if not _trigram:
+            log.info("pg_trgm is not installed; order search matches word prefixes only")
+    return _trigram
+
+def _like(q: str) -> str:
+    return "%" + re.sub(r"([%_\\])", r"\\\1", q.lower()) + "%"
+
+def match_sql(q: str, alias: str = "s") -> tuple[str, dict] | None:
+    """
+    WHERE condition on order_search rows (as `alias`) matching `q`, with
+    its parameters, or None when `q` can't match anything.
+    """
+    q = q.strip()[:MAX_QUERY_LENGTH]
+    if not q:
+        return None
+    params = {"search_text": q}
+    clauses = [f"{alias}.document @@ order_search_query(%(search_text)s)"]
+    if has_trigram():
+        clauses.append(f"{alias}.content ILIKE %(search_like)s")
+        clauses.append(f"%(search_text)s <%% {alias}.content")
+        params["search_like"] = _like(q)
+    elif not re.search(r"[^\W_]", q):
+        # no words to look up and no trigram index for the rest
+        return None
+    return "(" + " OR ".join(clauses) + ")", params
+
+def search_orders(q: str, page: int = 1, page_size: int = PAGE_SIZE) -> dict:
+    """
+    One page of orders matching `q`, best match first.
+    Returns {"results", "page", "has_more"}.
+    """
+    page = max(page, 1)
+    match = match_sql(q)
+    if match is None:
+        return {"results": [], "page": page, "has_more": False}
+    where, params = match
+    # ranked after the candidate LIMITs, so only candidates are scored, and
+    # only the page's orders are joined
+    rank = ("hit.exact::int + "
+            "COALESCE(ts_rank_cd(hit.document, order_search_query(%(search_text)s)), 0)")
+    if has_trigram():
+        rank += " + word_similarity(%(search_text)s, hit.content)"
+    params.update(candidates=MAX_CANDIDATES, limit=page_size + 1,
+                  offset=(page - 1) * page_size)
+    rows = execute(
+        f"""
+        SELECT o.order_id, o.invoice_no, o.due_date, o.progress_status,
+               c.name AS customer_name, c.email AS customer_email
+          FROM (SELECT hit.order_id, {rank} AS rank
+                  FROM ((SELECT s.order_id, s.document, s.content, TRUE AS exact
+                           FROM order_search s
+                          WHERE s.document @@ order_search_exact_query(%(search_text)s)
+                          ORDER BY s.order_id DESC
+                          LIMIT %(candidates)s)
+                        UNION ALL
+                        (SELECT s.order_id, s.document, s.content, FALSE AS exact
+                           FROM order_search s
+                          WHERE {where}
+                            AND NOT COALESCE(s.document @@ order_search_exact_query(%(search_text)s), FALSE)
+                          ORDER BY s.order_id DESC
+                          LIMIT %(candidates)s)) hit
+                 ORDER BY rank DESC, hit.order_id DESC
+                 LIMIT %(limit)s OFFSET %(offset)s) page
+          JOIN orders o ON o.order_id = page.order_id
+          JOIN customers c ON c.customer_id = o.customer_id
+         ORDER BY page.rank DESC, page.order_id DESC
+        """,
+        params
+    ) or []
+    return {
+        "results": [
+            {"order_id": r["order_id"],
+             "invoice_no": r["invoice_no"],
+             "customer_name": r["customer_name"],
+             "customer_email": r["customer_email"],
+             "due_date": r["due_date"].isoformat() if r["due_date"] else None,
+             "status": r["progress_status"]}
+            for r in rows[:page_size]
+        ],
+        "page": page,
+        "has_more": len(rows) > page_size,
+    }
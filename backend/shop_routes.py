@@ -2,39 +2,34 @@
 # It includes endpoints for scanning orders and viewing order details.
 
 from flask import (
-    Blueprint, request, render_template, jsonify, abort
+    Blueprint, request, render_template, jsonify, abort, current_app, session
 )
 from backend.db import execute
+from backend.orders import get_order, load_archived_order
+from backend.cache import invalidate_order
+from backend.qr_utils import order_scan_url, qr_svg
+from backend.scans import MAX_BATCH, ITEM_STATUSES, apply_scans, scan_item
+from backend.events import record as record_event, order_timeline
 
 # Create a Blueprint for shop-related routes
 shop_bp = Blueprint("shop", __name__)
 
+# Who to credit in the scan event log (staff only; scans don't require a login)
+def staff_id():
+    return session.get("user_id") if session.get("is_staff") else None
+
 # Endpoint to scan an order using a QR code
 # This endpoint retrieves the invoice number and current milestones for the order.
 @shop_bp.route("/scan/<int:order_id>", methods=["GET"])
 def scan_order(order_id):
-    # 1) Fetch invoice_no
-    rows = execute(
-        "SELECT invoice_no FROM orders WHERE order_id = %s",
-        (order_id,)
-    )
-    if not rows:
+    # Invoice number and milestones, through the order cache: scan_update
+    # invalidates the entry here, and changes made by other processes drop
+    # it via the change feed (backend/live.py) a moment after they commit
+    data = get_order(order_id)
+    if not data:
         abort(404)
-    invoice_no = rows[0]["invoice_no"]
-
-    # 2) Fetch milestones with CURRENT status (not cached)
-    milestones = execute(
-        """
-        SELECT milestone_id,
-               milestone_name,
-               is_approved,
-               status
-          FROM order_milestones
-         WHERE order_id = %s
-         ORDER BY milestone_id
-        """,
-        (order_id,)
-    ) or []
+    invoice_no = data["order"]["invoice_no"]
+    milestones = data["milestones"]
 
     return render_template(
         "scan.html",
@@ -51,52 +46,97 @@ def scan_update(order_id):
     if not milestone_id:
         return jsonify(error="Missing milestone_id"), 400
 
-    execute(
+    # the self-join hands back the status before the update, for the event log;
+    # a milestone of some other order is not found rather than updated
+    row = execute(
         """
-        UPDATE order_milestones
+        UPDATE order_milestones m
            SET is_approved = %s,
                status      = %s
-         WHERE milestone_id = %s
+          FROM order_milestones old
+         WHERE m.milestone_id = %s
+           AND m.order_id = %s
+           AND old.milestone_id = m.milestone_id
+        RETURNING old.status AS previous_status, now() AS changed_at
         """,
-        (True, "Completed", milestone_id)
+        (True, "Completed", milestone_id, order_id)
     )
+    if not row:
+        return jsonify(error=f"Order {order_id} has no milestone {milestone_id}"), 404
+    if row["previous_status"] != "Completed":
+        record_event(order_id=order_id, milestone_id=int(milestone_id), status="Completed",
+                     previous_status=row["previous_status"], source="scan",
+                     employee_id=staff_id(), scan_time=row["changed_at"])
+    invalidate_order(order_id)
     return jsonify(message="OK"), 201
 
+# Scans queued by the scan page (possibly while offline), applied together
+# Each scan carries a client-generated key, so sending a batch twice is harmless
+@shop_bp.route("/scan/batch", methods=["POST"])
+def scan_batch():
+    data = request.get_json(silent=True) or {}
+    scans = data.get("scans")
+    if not isinstance(scans, list):
+        return jsonify(error="Expected {\"scans\": [...]}"), 400
+    if len(scans) > MAX_BATCH:
+        return jsonify(error=f"At most {MAX_BATCH} scans per request"), 413
+    return jsonify(apply_scans(scans, employee_id=staff_id())), 200
+
+# Item barcode scanning (labels from /print/labels.pdf). The page keeps a
+# text box focused, so a handheld scanner's "type and Enter" posts each code
+@shop_bp.route("/scan/item", methods=["GET"])
+def item_scan_page():
+    return render_template("item_scan.html", statuses=ITEM_STATUSES[1:])
+
+@shop_bp.route("/scan/item", methods=["POST"])
+def item_scan():
+    data = request.get_json(silent=True) or {}
+    barcode = data.get("barcode")
+    status = data.get("status") or None
+    if not isinstance(barcode, str) or not barcode.strip():
+        return jsonify(error="Missing barcode"), 400
+    if status is not None and status not in ITEM_STATUSES[1:]:
+        return jsonify(error=f"status must be one of {', '.join(ITEM_STATUSES[1:])}"), 400
+    item = scan_item(barcode.strip(), status, employee_id=staff_id())
+    if item is None:
+        return jsonify(error=f"Unknown barcode {barcode}"), 404
+    return jsonify(item_id=item["item_id"], order_id=item["order_id"],
+                   invoice_no=item["invoice_no"], product_code=item["product_code"],
+                   barcode=item["barcode"], status=item["status"],
+                   previous_status=item["previous_status"]), 200
+
 @shop_bp.route("/order/<int:order_id>")
 def view_order(order_id):
-    # fetch the order row, join to customers to get customer_name
-    rows = execute(
-        """
-        SELECT
-          o.order_id      AS id,
-          o.invoice_no,
-          o.created_at,
-          o.due_date,
-          o.notes,
-          o.status,
-          c.name          AS customer_name
-        FROM orders o
-        JOIN customers c
-          ON o.customer_id = c.customer_id
-        WHERE o.order_id = %s
-        """,
-        (order_id,)
-    )
-    if not rows:
+    # order row (with customer_name) and milestones, through the order cache;
+    # archived orders are shown read-only
+    data = get_order(order_id)
+    archived = False
+    if not data and session.get("is_staff"):
+        data = load_archived_order(order_id)
+        archived = True
+    if not data:
         abort(404)
-    order = rows[0]
-
-    # fetch its milestones for scan view
-    milestones = execute(
-        """
-        SELECT milestone_id, milestone_name, status, is_approved
-          FROM order_milestones
-         WHERE order_id = %s
-         ORDER BY milestone_id
-        """,
-        (order_id,)
-    ) or []
+    # status history for staff, read from the log rather than the order cache
+    timeline = order_timeline(order_id) if session.get("is_staff") else []
+    return render_order_page(data, timeline, archived=archived)
 
+def render_order_page(data: dict, timeline: list, archived: bool = False,
+                      conflicts: list | None = None) -> str:
+    """order_detail.html for one order as get_order()/load_order() return it."""
     return render_template("order_detail.html",
-                           order=order,
-                           milestones=milestones)
+                           order=data["order"],
+                           milestones=data["milestones"],
+                           items=data["items"],
+                           timeline=timeline,
+                           archived=archived,
+                           conflicts=conflicts)
+
+# Order QR code as SVG, for showing on screen; drawn from the memoized matrix
+@shop_bp.route("/qr/<int:order_id>.svg")
+def order_qr_svg(order_id):
+    if not get_order(order_id):
+        abort(404)
+    svg = qr_svg(order_scan_url(order_id, current_app.config["BASE_URL"]))
+    resp = current_app.response_class(svg, mimetype="image/svg+xml")
+    resp.cache_control.max_age = 86400
+    return resp
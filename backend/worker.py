@@ -0,0 +1,74 @@
+# this file runs the OPTS background worker as its own process:
+#   python -m backend.worker
+# it claims queued jobs from backend.jobs and runs the matching handler,
+# and drains the email outbox (backend/outbox.py), so slow work
+# (SMTP, pre-rendering PDFs) stays out of web requests; once a day it also
+# archives long-completed orders when ARCHIVE_AFTER_MONTHS is set
+import os
+import time
+import logging
+
+from backend.jobs import claim_job, complete_job, fail_job
+from backend.outbox import drain_outbox
+from backend.documents import prewarm_documents
+from backend.archive import ARCHIVE_AFTER_MONTHS, archive_completed
+from backend import metrics
+
+# Seconds to sleep when the queue is empty
+POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 1))
+# Seconds between archive runs
+ARCHIVE_INTERVAL = 24 * 3600
+
+log = logging.getLogger("backend.worker")
+
+# Map job kinds to the functions that do the work
+HANDLERS = {
+    # queued by create_order and bulk import; a download that comes first
+    # renders the PDF itself (backend/documents.py)
+    "documents": lambda job: prewarm_documents(job["order_id"], job["payload"]["base_url"]),
+}
+
+def run_job(job: dict):
+    handler = HANDLERS.get(job["kind"])
+    try:
+        if handler is None:
+            raise ValueError(f"no handler for job kind {job['kind']!r}")
+        handler(job)
+    except Exception as e:
+        log.exception("Job %s failed", job["job_id"])
+        fail_job(job, f"{type(e).__name__}: {e}")
+    else:
+        complete_job(job["job_id"])
+        log.info("Job %s (%s, order %s) done", job["job_id"], job["kind"], job["order_id"])
+
+def run_pending() -> int:
+    """Run jobs until the queue is empty; returns how many ran."""
+    ran = 0
+    while True:
+        job = claim_job()
+        if not job:
+            return ran
+        run_job(job)
+        ran += 1
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    metrics.start()   # its render and email timings show up in the web app's /metrics
+    log.info("Worker started (poll every %ss)", POLL_INTERVAL)
+    next_archive = time.monotonic()
+    while True:
+        try:
+            if ARCHIVE_AFTER_MONTHS and time.monotonic() >= next_archive:
+                next_archive = time.monotonic() + ARCHIVE_INTERVAL
+                archive_completed()
+            ran = run_pending()
+            sent = drain_outbox()
+            if not ran and not sent:
+                time.sleep(POLL_INTERVAL)
+        except Exception:
+            # e.g. the database went away; back off and keep the worker alive
+            log.exception("Worker loop error")
+            time.sleep(max(POLL_INTERVAL, 5))
+
+if __name__ == "__main__":
+    main()
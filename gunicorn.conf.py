@@ -0,0 +1,19 @@
+# gunicorn reads this file from the working directory on start (the Procfile
+# and the Render start command just run `gunicorn app:app`)
+import os
+
+from backend import metrics
+
+# Threads, not processes, so many browsers can hold a live /events stream.
+# Each open stream (dashboard or order page) occupies one thread for up to
+# SSE_STREAM_SECONDS without using a database connection; only requests that
+# query need one of the DB_MAX_CONN pool slots, and wait for it if all are
+# busy. So size threads for open live pages plus ordinary requests, not for
+# the pool: roughly DB_MAX_CONN + the live pages one worker should carry.
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", 16))
+
+def on_starting(server):
+    # /metrics adds up snapshot files (backend/metrics.py); start from zero
+    # rather than counting on from the previous run
+    metrics.clear_snapshots()
@@ -0,0 +1,31 @@
+--
+-- Background document-generation jobs (QR codes and work-order PDFs).
+-- create_order enqueues one row per order; `python -m backend.worker`
+-- claims rows with FOR UPDATE SKIP LOCKED and renders the files.
+--
+-- While a job is running, run_after holds the lease expiry, so a job whose
+-- worker died is picked up again once the lease runs out.
+--
+
+CREATE TABLE IF NOT EXISTS public.document_jobs (
+    job_id serial PRIMARY KEY,
+    order_id integer NOT NULL REFERENCES public.orders(order_id) ON DELETE CASCADE,
+    kind character varying(32) NOT NULL,
+    payload jsonb DEFAULT '{}'::jsonb NOT NULL,
+    status character varying(16) DEFAULT 'pending'::character varying NOT NULL,
+    attempts integer DEFAULT 0 NOT NULL,
+    max_attempts integer DEFAULT 5 NOT NULL,
+    run_after timestamp without time zone DEFAULT now() NOT NULL,
+    last_error text,
+    created_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
+    updated_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT document_jobs_order_kind_key UNIQUE (order_id, kind),
+    CONSTRAINT document_jobs_status_check CHECK (((status)::text = ANY ((ARRAY['pending'::character varying, 'running'::character varying, 'done'::character varying, 'failed'::character varying])::text[])))
+);
+
+CREATE INDEX IF NOT EXISTS document_jobs_runnable_idx
+    ON public.document_jobs (run_after)
+    WHERE status IN ('pending', 'running');
+
+DROP TRIGGER IF EXISTS trg_document_jobs_updated_at ON public.document_jobs;
+CREATE TRIGGER trg_document_jobs_updated_at BEFORE UPDATE ON public.document_jobs FOR EACH ROW EXECUTE FUNCTION public.update_updated_at_column();
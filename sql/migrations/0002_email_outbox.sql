@@ -0,0 +1,28 @@
+--
+-- Transactional email outbox. Emails are inserted in the same transaction
+-- as the change that triggers them and sent later by the background
+-- worker (backend/outbox.py) over one reused SMTP connection.
+--
+-- While a batch is being sent, next_attempt_at holds the lease expiry so a
+-- crashed worker's emails are retried. Emails that keep failing end up
+-- with status 'dead' for manual inspection.
+--
+
+CREATE TABLE IF NOT EXISTS public.email_outbox (
+    email_id serial PRIMARY KEY,
+    recipient character varying(255) NOT NULL,
+    subject text NOT NULL,
+    body text NOT NULL,
+    status character varying(16) DEFAULT 'pending'::character varying NOT NULL,
+    attempts integer DEFAULT 0 NOT NULL,
+    max_attempts integer DEFAULT 8 NOT NULL,
+    next_attempt_at timestamp without time zone DEFAULT now() NOT NULL,
+    last_error text,
+    created_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
+    sent_at timestamp without time zone,
+    CONSTRAINT email_outbox_status_check CHECK (((status)::text = ANY ((ARRAY['pending'::character varying, 'sending'::character varying, 'sent'::character varying, 'dead'::character varying])::text[])))
+);
+
+CREATE INDEX IF NOT EXISTS email_outbox_due_idx
+    ON public.email_outbox (next_attempt_at)
+    WHERE status IN ('pending', 'sending');
@@ -0,0 +1,141 @@
+--
+-- Milestone rollups, kept current by triggers on order_milestones:
+--   * counter columns on orders plus a stored progress_status, so
+--     dashboards read an order's overall status without scanning milestones
+--   * milestone_summary, one row per milestone name with order counts
+--
+-- The triggers are statement-level with transition tables, so a batched
+-- insert of many milestones updates each affected order once.
+-- SELECT public.rebuild_milestone_rollups() (or `python -m backend.rollups`)
+-- recomputes everything from scratch if the counters ever drift.
+--
+
+ALTER TABLE public.orders
+    ADD COLUMN IF NOT EXISTS milestones_total integer DEFAULT 0 NOT NULL,
+    ADD COLUMN IF NOT EXISTS milestones_not_started integer DEFAULT 0 NOT NULL,
+    ADD COLUMN IF NOT EXISTS milestones_completed integer DEFAULT 0 NOT NULL;
+
+-- Same rules the dashboards used to apply in Python: no milestones or all
+-- "Not Started" -> Not Started, all "Completed" -> Completed, else In Progress
+ALTER TABLE public.orders
+    ADD COLUMN IF NOT EXISTS progress_status character varying(16)
+    GENERATED ALWAYS AS (
+        CASE
+            WHEN milestones_total = milestones_not_started THEN 'Not Started'
+            WHEN milestones_total = milestones_completed THEN 'Completed'
+            ELSE 'In Progress'
+        END
+    ) STORED;
+
+CREATE TABLE IF NOT EXISTS public.milestone_summary (
+    milestone_name text PRIMARY KEY,
+    total integer DEFAULT 0 NOT NULL,
+    not_started integer DEFAULT 0 NOT NULL,
+    completed integer DEFAULT 0 NOT NULL
+);
+
+-- Applies +1 for every new milestone row and -1 for every old one
+CREATE OR REPLACE FUNCTION public.apply_milestone_rollups() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+  delta text;
+BEGIN
+  delta := CASE TG_OP
+    WHEN 'INSERT' THEN
+      'SELECT order_id, milestone_name, status, 1 AS d FROM new_rows'
+    WHEN 'DELETE' THEN
+      'SELECT order_id, milestone_name, status, -1 AS d FROM old_rows'
+    ELSE
+      'SELECT order_id, milestone_name, status, 1 AS d FROM new_rows
+       UNION ALL
+       SELECT order_id, milestone_name, status, -1 AS d FROM old_rows'
+  END;
+
+  EXECUTE format($f$
+    UPDATE public.orders o
+       SET milestones_total       = o.milestones_total + x.total,
+           milestones_not_started = o.milestones_not_started + x.not_started,
+           milestones_completed   = o.milestones_completed + x.completed
+      FROM (
+        SELECT order_id,
+               SUM(d) AS total,
+               COALESCE(SUM(d) FILTER (WHERE status = 'Not Started'), 0) AS not_started,
+               COALESCE(SUM(d) FILTER (WHERE status = 'Completed'), 0) AS completed
+          FROM (%s) delta
+         WHERE order_id IS NOT NULL
+         GROUP BY order_id
+      ) x
+     WHERE o.order_id = x.order_id
+       AND (x.total, x.not_started, x.completed) <> (0, 0, 0)
+  $f$, delta);
+
+  EXECUTE format($f$
+    INSERT INTO public.milestone_summary AS s (milestone_name, total, not_started, completed)
+    SELECT milestone_name,
+           SUM(d),
+           COALESCE(SUM(d) FILTER (WHERE status = 'Not Started'), 0),
+           COALESCE(SUM(d) FILTER (WHERE status = 'Completed'), 0)
+      FROM (%s) delta
+     GROUP BY milestone_name
+    ON CONFLICT (milestone_name) DO UPDATE
+       SET total       = s.total + EXCLUDED.total,
+           not_started = s.not_started + EXCLUDED.not_started,
+           completed   = s.completed + EXCLUDED.completed
+     WHERE (EXCLUDED.total, EXCLUDED.not_started, EXCLUDED.completed) <> (0, 0, 0)
+  $f$, delta);
+
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_order_milestones_rollup_ins ON public.order_milestones;
+DROP TRIGGER IF EXISTS trg_order_milestones_rollup_upd ON public.order_milestones;
+DROP TRIGGER IF EXISTS trg_order_milestones_rollup_del ON public.order_milestones;
+CREATE TRIGGER trg_order_milestones_rollup_ins AFTER INSERT ON public.order_milestones
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_milestone_rollups();
+CREATE TRIGGER trg_order_milestones_rollup_upd AFTER UPDATE ON public.order_milestones
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_milestone_rollups();
+CREATE TRIGGER trg_order_milestones_rollup_del AFTER DELETE ON public.order_milestones
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_milestone_rollups();
+
+-- Recompute every rollup from order_milestones. Blocks milestone writes
+-- (not reads) while it runs so nothing changes underneath it.
+CREATE OR REPLACE FUNCTION public.rebuild_milestone_rollups() RETURNS void
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+  LOCK TABLE public.order_milestones IN SHARE MODE;
+
+  UPDATE public.orders o
+     SET milestones_total       = x.total,
+         milestones_not_started = x.not_started,
+         milestones_completed   = x.completed
+    FROM (
+      SELECT o.order_id,
+             COUNT(m.milestone_id) AS total,
+             COUNT(*) FILTER (WHERE m.status = 'Not Started') AS not_started,
+             COUNT(*) FILTER (WHERE m.status = 'Completed') AS completed
+        FROM public.orders o
+        LEFT JOIN public.order_milestones m ON m.order_id = o.order_id
+       GROUP BY o.order_id
+    ) x
+   WHERE o.order_id = x.order_id
+     AND (o.milestones_total, o.milestones_not_started, o.milestones_completed)
+         IS DISTINCT FROM (x.total, x.not_started, x.completed);
+
+  DELETE FROM public.milestone_summary;
+  INSERT INTO public.milestone_summary (milestone_name, total, not_started, completed)
+  SELECT milestone_name,
+         COUNT(*),
+         COUNT(*) FILTER (WHERE status = 'Not Started'),
+         COUNT(*) FILTER (WHERE status = 'Completed')
+    FROM public.order_milestones
+   GROUP BY milestone_name;
+END;
+$$;
+
+SELECT public.rebuild_milestone_rollups();
@@ -0,0 +1,34 @@
+-- migrate: no-transaction
+--
+-- Secondary indexes for the columns nearly every request filters on.
+-- Built CONCURRENTLY so applying them to a live database does not block
+-- writes; if a build is interrupted, drop the INVALID index and re-run.
+--
+
+-- Milestones, items and specs are always fetched per order
+CREATE INDEX CONCURRENTLY IF NOT EXISTS order_milestones_order_id_idx
+    ON public.order_milestones (order_id, milestone_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS order_items_order_id_idx
+    ON public.order_items (order_id);
+
+-- Client dashboard lists a customer's orders; portal filters by customer
+CREATE INDEX CONCURRENTLY IF NOT EXISTS orders_customer_id_idx
+    ON public.orders (customer_id, order_id);
+
+-- Portal status and due-date filters page through order_id
+CREATE INDEX CONCURRENTLY IF NOT EXISTS orders_progress_status_idx
+    ON public.orders (progress_status, order_id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS orders_due_date_idx
+    ON public.orders (due_date, order_id);
+
+-- Login and create_order look customers up by email; /register by token
+CREATE INDEX CONCURRENTLY IF NOT EXISTS customers_email_idx
+    ON public.customers (email);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS customers_register_token_idx
+    ON public.customers (register_token)
+    WHERE register_token IS NOT NULL;
+
+-- admin_setup counts staff accounts
+CREATE INDEX CONCURRENTLY IF NOT EXISTS customers_is_staff_idx
+    ON public.customers (customer_id)
+    WHERE is_staff;
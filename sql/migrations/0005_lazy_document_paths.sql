@@ -0,0 +1,16 @@
+--
+-- Work-order PDFs are now built on first download by /work_orders/<file>
+-- (backend/documents.py) instead of being written to static/work_orders by
+-- the worker. Point existing orders at the new URLs, including orders whose
+-- documents were never rendered. Old PNG QR files are no longer used.
+--
+
+UPDATE public.orders o
+   SET lousso_pdf_path = '/work_orders/lousso_' || replace(lower(c.name), ' ', '_')
+                         || '_order_' || o.order_id || '.pdf',
+       client_pdf_path = '/work_orders/client_' || replace(lower(c.name), ' ', '_')
+                         || '_order_' || o.order_id || '.pdf',
+       qr_path = NULL
+  FROM public.customers c
+ WHERE c.customer_id = o.customer_id
+   AND (o.lousso_pdf_path IS NULL OR o.lousso_pdf_path NOT LIKE '/work_orders/%');
@@ -0,0 +1,64 @@
+--
+-- Publish order and milestone changes on the "opts_changes" channel so the
+-- web app can push them to open dashboards (backend/live.py) instead of
+-- browsers polling. One notification per statement, listing the affected
+-- order ids; statements touching more than 500 orders send "reload" instead
+-- to stay well under the 8000-byte NOTIFY payload limit. Notifications are
+-- delivered on commit, and identical ones in a transaction are merged.
+--
+
+CREATE OR REPLACE FUNCTION public.notify_order_changes() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+  src text;
+  ids integer[];
+BEGIN
+  src := CASE TG_OP
+    WHEN 'INSERT' THEN 'SELECT order_id FROM new_rows'
+    WHEN 'DELETE' THEN 'SELECT order_id FROM old_rows'
+    ELSE 'SELECT order_id FROM new_rows UNION SELECT order_id FROM old_rows'
+  END;
+  EXECUTE format(
+    'SELECT array_agg(DISTINCT order_id) FROM (%s) x WHERE order_id IS NOT NULL', src
+  ) INTO ids;
+
+  IF ids IS NULL THEN
+    RETURN NULL;
+  END IF;
+  IF array_length(ids, 1) > 500 THEN
+    PERFORM pg_notify('opts_changes', json_build_object(
+      'table', TG_TABLE_NAME, 'op', TG_OP, 'reload', true)::text);
+  ELSE
+    PERFORM pg_notify('opts_changes', json_build_object(
+      'table', TG_TABLE_NAME, 'op', TG_OP, 'order_ids', ids)::text);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_order_milestones_notify_ins ON public.order_milestones;
+DROP TRIGGER IF EXISTS trg_order_milestones_notify_upd ON public.order_milestones;
+DROP TRIGGER IF EXISTS trg_order_milestones_notify_del ON public.order_milestones;
+CREATE TRIGGER trg_order_milestones_notify_ins AFTER INSERT ON public.order_milestones
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_order_changes();
+CREATE TRIGGER trg_order_milestones_notify_upd AFTER UPDATE ON public.order_milestones
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_order_changes();
+CREATE TRIGGER trg_order_milestones_notify_del AFTER DELETE ON public.order_milestones
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_order_changes();
+
+DROP TRIGGER IF EXISTS trg_orders_notify_ins ON public.orders;
+DROP TRIGGER IF EXISTS trg_orders_notify_upd ON public.orders;
+DROP TRIGGER IF EXISTS trg_orders_notify_del ON public.orders;
+CREATE TRIGGER trg_orders_notify_ins AFTER INSERT ON public.orders
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_order_changes();
+CREATE TRIGGER trg_orders_notify_upd AFTER UPDATE ON public.orders
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_order_changes();
+CREATE TRIGGER trg_orders_notify_del AFTER DELETE ON public.orders
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_order_changes();
@@ -0,0 +1,22 @@
+--
+-- One row per milestone scan accepted from the shop floor, keyed by the
+-- idempotency key the scanner generated when the scan was made. The scan
+-- page queues scans while offline and replays them later (POST /scan/batch);
+-- a key that is already here was applied before, so the replay is a no-op.
+--
+-- scanned_at is when the scan happened on the device, received_at when it
+-- reached the server.
+--
+
+CREATE TABLE IF NOT EXISTS public.scan_receipts (
+    scan_key character varying(64) PRIMARY KEY,
+    milestone_id integer NOT NULL
+        REFERENCES public.order_milestones (milestone_id) ON DELETE CASCADE,
+    order_id integer NOT NULL,
+    scanned_at timestamp without time zone NOT NULL,
+    received_at timestamp without time zone DEFAULT now() NOT NULL
+);
+
+-- Cascade deletes from order_milestones look receipts up by milestone
+CREATE INDEX IF NOT EXISTS scan_receipts_milestone_id_idx
+    ON public.scan_receipts (milestone_id);
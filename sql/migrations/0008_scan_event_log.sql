@@ -0,0 +1,36 @@
+--
+-- Turns scan_events into an append-only log of milestone status changes:
+-- every scan, batch scan and staff edit adds one row (backend/events.py
+-- buffers them and writes them in batches), so an order's history survives
+-- later changes to order_milestones.status.
+--
+-- The log outlives the rows it describes, so the foreign keys to
+-- order_milestones and order_items are dropped: deleting an order must not
+-- fail because it has history, and a buffered batch must not be rejected
+-- because one milestone was deleted before it was flushed.
+--
+
+ALTER TABLE public.scan_events
+    ADD COLUMN IF NOT EXISTS order_id integer,
+    ADD COLUMN IF NOT EXISTS previous_status character varying(32),
+    ADD COLUMN IF NOT EXISTS source character varying(16);
+
+ALTER TABLE public.scan_events
+    DROP CONSTRAINT IF EXISTS scan_events_milestone_id_fkey,
+    DROP CONSTRAINT IF EXISTS scan_events_item_id_fkey;
+
+-- Milestone statuses, plus the original 'Started' for item scans
+ALTER TABLE public.scan_events DROP CONSTRAINT IF EXISTS scan_events_status_check;
+ALTER TABLE public.scan_events
+    ADD CONSTRAINT scan_events_status_check CHECK (((status)::text = ANY ((ARRAY['Not Started'::character varying, 'Started'::character varying, 'In Progress'::character varying, 'Completed'::character varying])::text[])));
+
+-- Timelines: one order's or one employee's events in time order. Nothing
+-- wrote to scan_events before this migration, so these build instantly.
+CREATE INDEX IF NOT EXISTS scan_events_order_time_idx
+    ON public.scan_events (order_id, scan_time, scan_id);
+CREATE INDEX IF NOT EXISTS scan_events_employee_time_idx
+    ON public.scan_events (employee_id, scan_time, scan_id);
+-- Rows arrive in time order, so a BRIN index covers date-range reports
+-- across all events at a tiny fraction of a btree's size
+CREATE INDEX IF NOT EXISTS scan_events_scan_time_brin
+    ON public.scan_events USING brin (scan_time);
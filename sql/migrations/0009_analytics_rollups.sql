@@ -0,0 +1,125 @@
+--
+-- Cycle-time and throughput rollups for the staff analytics page, kept
+-- current by a trigger on scan_events (the status log, see 0008):
+--   * analytics_milestone_daily / _weekly: per milestone name and day or
+--     week, how many milestones were completed, how many of those finished
+--     their order (throughput), and the summed time each spent in its stage
+--
+-- A milestone's stage time runs from the order's previous completion (or
+-- the order date, for the first) to its own completion, so long stages
+-- show where orders queue up. The trigger is statement-level, so a batch
+-- of buffered events updates each rollup row once.
+--
+-- Scans that arrive late (offline queues) are counted when they arrive;
+-- SELECT public.rebuild_analytics() (or `python -m backend.analytics`)
+-- recomputes everything from scan_events.
+--
+
+CREATE TABLE IF NOT EXISTS public.analytics_milestone_daily (
+    day date NOT NULL,
+    milestone_name text NOT NULL,
+    completions integer DEFAULT 0 NOT NULL,
+    orders_finished integer DEFAULT 0 NOT NULL,
+    timed integer DEFAULT 0 NOT NULL,
+    stage_seconds double precision DEFAULT 0 NOT NULL,
+    PRIMARY KEY (day, milestone_name)
+);
+
+CREATE TABLE IF NOT EXISTS public.analytics_milestone_weekly (
+    week date NOT NULL,
+    milestone_name text NOT NULL,
+    completions integer DEFAULT 0 NOT NULL,
+    orders_finished integer DEFAULT 0 NOT NULL,
+    timed integer DEFAULT 0 NOT NULL,
+    stage_seconds double precision DEFAULT 0 NOT NULL,
+    PRIMARY KEY (week, milestone_name)
+);
+
+-- One row per 'Completed' event in `events` (a table name, or the trigger's
+-- transition table): when, which milestone, its stage time and whether it
+-- was the order's last milestone. Shared by the trigger and the rebuild.
+CREATE OR REPLACE FUNCTION public.analytics_completions_sql(events text) RETURNS text
+    LANGUAGE sql IMMUTABLE
+    AS $$
+  SELECT format($f$
+    SELECT n.scan_time,
+           m.milestone_name,
+           EXTRACT(epoch FROM n.scan_time - COALESCE(prev.at, o.order_date::timestamp)) AS stage_seconds,
+           NOT EXISTS (SELECT 1 FROM public.order_milestones later
+                        WHERE later.order_id = n.order_id
+                          AND later.milestone_id > n.milestone_id) AS finished
+      FROM %s n
+      JOIN public.order_milestones m ON m.milestone_id = n.milestone_id
+      LEFT JOIN public.orders o ON o.order_id = n.order_id
+      LEFT JOIN LATERAL (
+            SELECT max(e.scan_time) AS at
+              FROM public.scan_events e
+             WHERE e.order_id = n.order_id
+               AND e.status = 'Completed'
+               AND e.scan_time < n.scan_time
+           ) prev ON TRUE
+     WHERE n.status = 'Completed'
+  $f$, events)
+$$;
+
+-- The two statements that add the completions in `events` to the daily
+-- and weekly rollups. The caller EXECUTEs them, so a trigger can pass its
+-- transition table, which only the trigger function itself can see.
+CREATE OR REPLACE FUNCTION public.analytics_rollup_sql(events text) RETURNS SETOF text
+    LANGUAGE sql IMMUTABLE
+    AS $$
+  SELECT format($f$
+    INSERT INTO public.analytics_milestone_%1$s AS a
+           (%2$I, milestone_name, completions, orders_finished, timed, stage_seconds)
+    SELECT date_trunc(%3$L, scan_time)::date, milestone_name,
+           COUNT(*),
+           COUNT(*) FILTER (WHERE finished),
+           COUNT(stage_seconds),
+           COALESCE(SUM(GREATEST(stage_seconds, 0)), 0)
+      FROM (%4$s) c
+     GROUP BY 1, 2
+    ON CONFLICT (%2$I, milestone_name) DO UPDATE
+       SET completions     = a.completions + EXCLUDED.completions,
+           orders_finished = a.orders_finished + EXCLUDED.orders_finished,
+           timed           = a.timed + EXCLUDED.timed,
+           stage_seconds   = a.stage_seconds + EXCLUDED.stage_seconds
+  $f$, g.tbl, g.col, g.unit, public.analytics_completions_sql(events))
+    FROM (VALUES ('daily', 'day', 'day'), ('weekly', 'week', 'week')) g(tbl, col, unit)
+$$;
+
+CREATE OR REPLACE FUNCTION public.apply_analytics() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+  stmt text;
+BEGIN
+  FOR stmt IN SELECT public.analytics_rollup_sql('new_rows') LOOP
+    EXECUTE stmt;
+  END LOOP;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_scan_events_analytics_ins ON public.scan_events;
+CREATE TRIGGER trg_scan_events_analytics_ins AFTER INSERT ON public.scan_events
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_analytics();
+
+-- Recompute both rollups from scan_events. Blocks event writes (not reads)
+-- while it runs; buffered events wait and are written once it finishes.
+CREATE OR REPLACE FUNCTION public.rebuild_analytics() RETURNS void
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+  stmt text;
+BEGIN
+  LOCK TABLE public.scan_events IN SHARE MODE;
+  DELETE FROM public.analytics_milestone_daily;
+  DELETE FROM public.analytics_milestone_weekly;
+  FOR stmt IN SELECT public.analytics_rollup_sql('public.scan_events') LOOP
+    EXECUTE stmt;
+  END LOOP;
+END;
+$$;
+
+SELECT public.rebuild_analytics();
@@ -0,0 +1,27 @@
+--
+-- Row versions for optimistic concurrency on milestone edits. The order
+-- page submits the version each milestone had when it was rendered, and
+-- edit_order only applies changes whose version still matches, so two
+-- staff editing the same order can't silently overwrite each other.
+--
+-- The version is bumped by a trigger rather than by each UPDATE, so scans,
+-- batch scans and edits all count as changes without having to remember to.
+--
+
+ALTER TABLE public.order_milestones
+    ADD COLUMN IF NOT EXISTS version integer DEFAULT 1 NOT NULL;
+
+CREATE OR REPLACE FUNCTION public.bump_milestone_version() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+  NEW.version := OLD.version + 1;
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_order_milestones_version ON public.order_milestones;
+CREATE TRIGGER trg_order_milestones_version BEFORE UPDATE ON public.order_milestones
+    FOR EACH ROW
+    WHEN (OLD.* IS DISTINCT FROM NEW.*)
+    EXECUTE FUNCTION public.bump_milestone_version();
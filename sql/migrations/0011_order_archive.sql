@@ -0,0 +1,175 @@
+--
+-- Order deletion and the archive tier.
+--
+-- Child rows now cascade from orders, so deleting an order is one DELETE
+-- (delete_order in app.py) that either removes everything or nothing.
+--
+-- orders.completed_at records when an order's last milestone was completed
+-- (cleared again if one is reopened). Orders completed long enough ago are
+-- moved, in batches, into the same-named tables in the "archive" schema by
+-- public.archive_orders() (`python -m backend.archive`, or the worker when
+-- ARCHIVE_AFTER_MONTHS is set), which keeps the hot tables and their
+-- indexes small. Archived orders stay readable: the dashboard's "Archived"
+-- filter searches them and their order pages and PDFs still open.
+--
+-- The archive tables copy the hot tables' columns in order and the move
+-- uses SELECT *, so a migration that adds a column to orders,
+-- order_specs, order_items or order_milestones must add it here too (the
+-- next archive run fails loudly until it does).
+--
+
+-- ---------- cascades ----------
+
+ALTER TABLE public.order_items DROP CONSTRAINT IF EXISTS order_items_order_id_fkey;
+ALTER TABLE public.order_items
+    ADD CONSTRAINT order_items_order_id_fkey FOREIGN KEY (order_id)
+    REFERENCES public.orders(order_id) ON DELETE CASCADE;
+
+ALTER TABLE public.order_specs DROP CONSTRAINT IF EXISTS order_specs_order_id_fkey;
+ALTER TABLE public.order_specs
+    ADD CONSTRAINT order_specs_order_id_fkey FOREIGN KEY (order_id)
+    REFERENCES public.orders(order_id) ON DELETE CASCADE;
+
+ALTER TABLE public.item_workflow DROP CONSTRAINT IF EXISTS item_workflow_item_id_fkey;
+ALTER TABLE public.item_workflow
+    ADD CONSTRAINT item_workflow_item_id_fkey FOREIGN KEY (item_id)
+    REFERENCES public.order_items(item_id) ON DELETE CASCADE;
+
+-- Cascaded deletes look children up by order_id (milestones and items are
+-- indexed in 0004; specs are keyed by it)
+CREATE INDEX IF NOT EXISTS item_workflow_item_id_idx
+    ON public.item_workflow (item_id);
+
+-- ---------- completion time ----------
+
+ALTER TABLE public.orders
+    ADD COLUMN IF NOT EXISTS completed_at timestamp without time zone;
+
+-- Fires when the milestone rollup triggers (0003) change the counters
+CREATE OR REPLACE FUNCTION public.set_order_completed_at() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+  IF NEW.milestones_total > 0 AND NEW.milestones_completed = NEW.milestones_total THEN
+    NEW.completed_at := COALESCE(OLD.completed_at, now());
+  ELSE
+    NEW.completed_at := NULL;
+  END IF;
+  RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_orders_completed_at ON public.orders;
+CREATE TRIGGER trg_orders_completed_at
+    BEFORE UPDATE OF milestones_total, milestones_completed ON public.orders
+    FOR EACH ROW EXECUTE FUNCTION public.set_order_completed_at();
+
+-- Orders completed before this migration: last recorded completion, else
+-- the latest milestone timestamp, else the order date
+UPDATE public.orders o
+   SET completed_at = COALESCE(
+         (SELECT max(e.scan_time) FROM public.scan_events e
+           WHERE e.order_id = o.order_id AND e.status = 'Completed'),
+         (SELECT max(m."timestamp") FROM public.order_milestones m
+           WHERE m.order_id = o.order_id),
+         o.order_date::timestamp)
+ WHERE o.progress_status = 'Completed'
+   AND o.completed_at IS NULL;
+
+CREATE INDEX IF NOT EXISTS orders_completed_at_idx
+    ON public.orders (completed_at)
+    WHERE completed_at IS NOT NULL;
+
+-- ---------- archive tables ----------
+
+CREATE SCHEMA IF NOT EXISTS archive;
+
+-- LIKE without INCLUDING GENERATED turns progress_status into a plain
+-- column, so archived orders keep the status they had when moved
+CREATE TABLE IF NOT EXISTS archive.orders (LIKE public.orders INCLUDING DEFAULTS);
+CREATE TABLE IF NOT EXISTS archive.order_specs (LIKE public.order_specs INCLUDING DEFAULTS);
+CREATE TABLE IF NOT EXISTS archive.order_items (LIKE public.order_items INCLUDING DEFAULTS);
+CREATE TABLE IF NOT EXISTS archive.order_milestones (LIKE public.order_milestones INCLUDING DEFAULTS);
+
+ALTER TABLE archive.orders DROP CONSTRAINT IF EXISTS archive_orders_pkey;
+ALTER TABLE archive.orders ADD CONSTRAINT archive_orders_pkey PRIMARY KEY (order_id);
+CREATE INDEX IF NOT EXISTS archive_orders_customer_id_idx
+    ON archive.orders (customer_id, order_id);
+CREATE INDEX IF NOT EXISTS archive_order_specs_order_id_idx
+    ON archive.order_specs (order_id);
+CREATE INDEX IF NOT EXISTS archive_order_items_order_id_idx
+    ON archive.order_items (order_id);
+CREATE INDEX IF NOT EXISTS archive_order_milestones_order_id_idx
+    ON archive.order_milestones (order_id, milestone_id);
+
+-- Move up to batch_size orders completed before `cutoff` into the archive;
+-- returns the ids moved (none once everything old enough is archived).
+-- Rows other sessions have locked are skipped and picked up next time.
+CREATE OR REPLACE FUNCTION public.archive_orders(cutoff timestamp, batch_size integer)
+    RETURNS integer[]
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+  ids integer[];
+BEGIN
+  SELECT array_agg(order_id) INTO ids
+    FROM (SELECT order_id FROM public.orders
+           WHERE completed_at < cutoff
+           ORDER BY completed_at
+           LIMIT batch_size
+             FOR UPDATE SKIP LOCKED) batch;
+  IF ids IS NULL THEN
+    RETURN '{}';
+  END IF;
+
+  -- copy the order first: deleting its milestones resets the counters
+  INSERT INTO archive.orders SELECT * FROM public.orders WHERE order_id = ANY(ids);
+  INSERT INTO archive.order_specs SELECT * FROM public.order_specs WHERE order_id = ANY(ids);
+  INSERT INTO archive.order_items SELECT * FROM public.order_items WHERE order_id = ANY(ids);
+  INSERT INTO archive.order_milestones SELECT * FROM public.order_milestones WHERE order_id = ANY(ids);
+  DELETE FROM public.orders WHERE order_id = ANY(ids);
+  RETURN ids;
+END;
+$$;
+
+-- ---------- analytics over archived orders ----------
+
+-- Milestone ids are unique across both tiers (they share a sequence)
+CREATE UNIQUE INDEX IF NOT EXISTS archive_order_milestones_milestone_id_idx
+    ON archive.order_milestones (milestone_id);
+
+-- Same as in 0009, but completions of archived orders keep their milestone
+-- names and order dates, so rebuild_analytics() doesn't lose history
+CREATE OR REPLACE FUNCTION public.analytics_completions_sql(events text) RETURNS text
+    LANGUAGE sql IMMUTABLE
+    AS $$
+  SELECT format($f$
+    SELECT n.scan_time,
+           m.milestone_name,
+           EXTRACT(epoch FROM n.scan_time - COALESCE(prev.at, o.order_date::timestamp)) AS stage_seconds,
+           NOT EXISTS (SELECT 1 FROM public.order_milestones later
+                        WHERE later.order_id = n.order_id
+                          AND later.milestone_id > n.milestone_id
+                       UNION ALL
+                       SELECT 1 FROM archive.order_milestones later
+                        WHERE later.order_id = n.order_id
+                          AND later.milestone_id > n.milestone_id) AS finished
+      FROM %s n
+      JOIN (SELECT milestone_id, milestone_name FROM public.order_milestones
+            UNION ALL
+            SELECT milestone_id, milestone_name FROM archive.order_milestones) m
+        ON m.milestone_id = n.milestone_id
+      LEFT JOIN (SELECT order_id, order_date FROM public.orders
+                 UNION ALL
+                 SELECT order_id, order_date FROM archive.orders) o
+        ON o.order_id = n.order_id
+      LEFT JOIN LATERAL (
+            SELECT max(e.scan_time) AS at
+              FROM public.scan_events e
+             WHERE e.order_id = n.order_id
+               AND e.status = 'Completed'
+               AND e.scan_time < n.scan_time
+           ) prev ON TRUE
+     WHERE n.status = 'Completed'
+  $f$, events)
+$$;
@@ -0,0 +1,180 @@
+--
+-- Search index for orders, one row per order in order_search:
+--   document - tsvector over invoice number, customer name/email/phone
+--              (weight A), product codes (B), notes and specs (C)
+--   content  - the same text lower-cased, for substring and typo-tolerant
+--              matching through a pg_trgm index
+-- Rows are refreshed by statement-level triggers on orders, customers,
+-- order_items and order_specs, so searches never join or scan the source
+-- tables. order_search_query() turns typed text into a prefix tsquery;
+-- backend/search.py builds the searches behind /search and the master
+-- dashboard's search box.
+--
+-- pg_trgm is created when the server provides it. Without it the trigram
+-- index is skipped and search matches whole words and word prefixes only.
+--
+
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+  ELSE
+    RAISE NOTICE 'pg_trgm is not available; order search will match word prefixes only';
+  END IF;
+END;
+$$;
+
+CREATE TABLE IF NOT EXISTS public.order_search (
+    order_id integer PRIMARY KEY REFERENCES public.orders(order_id) ON DELETE CASCADE,
+    document tsvector NOT NULL,
+    content text NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS order_search_document_idx
+    ON public.order_search USING gin (document);
+
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+    CREATE INDEX IF NOT EXISTS order_search_content_trgm_idx
+        ON public.order_search USING gin (content gin_trgm_ops);
+  END IF;
+END;
+$$;
+
+-- Rebuild the search rows of the given orders (ids of deleted orders are
+-- ignored; their rows go with the order through the foreign key)
+CREATE OR REPLACE FUNCTION public.refresh_order_search(ids integer[]) RETURNS void
+    LANGUAGE sql
+    AS $$
+  INSERT INTO public.order_search AS s (order_id, document, content)
+  SELECT o.order_id,
+         setweight(to_tsvector('simple', concat_ws(' ', o.invoice_no, c.name, c.email, c.phone)), 'A')
+         || setweight(to_tsvector('simple', coalesce(i.codes, '')), 'B')
+         || setweight(to_tsvector('simple', coalesce(t.specs, '')), 'C'),
+         lower(concat_ws(' ', o.invoice_no, c.name, c.email, c.phone, i.codes, t.specs))
+    FROM public.orders o
+    JOIN public.customers c ON c.customer_id = o.customer_id
+    LEFT JOIN LATERAL (
+          SELECT string_agg(product_code, ' ' ORDER BY item_id) AS codes
+            FROM public.order_items
+           WHERE order_id = o.order_id
+         ) i ON TRUE
+    LEFT JOIN LATERAL (
+          SELECT concat_ws(' ', o.notes, sp.fabric_specs, sp.vendor_color, sp.frame_finish,
+                           sp.specs, sp.topcoat, sp.trim_style, sp.placement, sp.back_style,
+                           sp.seat_style, sp.back_insert_type, sp.seat_insert_type) AS specs
+            FROM (SELECT 1) one
+            LEFT JOIN public.order_specs sp ON sp.order_id = o.order_id
+         ) t ON TRUE
+   WHERE o.order_id = ANY(ids)
+  ON CONFLICT (order_id) DO UPDATE
+     SET document = EXCLUDED.document,
+         content  = EXCLUDED.content
+   WHERE (s.document, s.content) IS DISTINCT FROM (EXCLUDED.document, EXCLUDED.content);
+$$;
+
+-- Search text -> tsquery matching every word as a prefix, split by the same
+-- parser as the index ("INV-10" -> 'inv':* & '-10':*); NULL if nothing is
+-- searchable. Parts are ANDed rather than phrase-matched: phrase checks
+-- need every candidate row's positions and make broad prefixes slow.
+CREATE OR REPLACE FUNCTION public.order_search_query(q text) RETURNS tsquery
+    LANGUAGE sql IMMUTABLE STRICT
+    AS $$
+  SELECT string_agg(quote_literal(lexeme) || ':*', ' & ')::tsquery
+    FROM unnest(to_tsvector('simple', q));
+$$;
+
+-- New orders, and updates that change searchable columns. Milestone
+-- rollups (0003) update orders constantly; those don't touch the index.
+CREATE OR REPLACE FUNCTION public.order_search_orders() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM public.refresh_order_search(ARRAY(SELECT order_id FROM new_rows));
+  ELSE
+    PERFORM public.refresh_order_search(ARRAY(
+      SELECT n.order_id
+        FROM new_rows n
+        JOIN old_rows p ON p.order_id = n.order_id
+       WHERE (n.invoice_no, n.notes, n.customer_id)
+             IS DISTINCT FROM (p.invoice_no, p.notes, p.customer_id)));
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+-- Product codes and specs belong to one order each
+CREATE OR REPLACE FUNCTION public.order_search_children() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM public.refresh_order_search(ARRAY(SELECT DISTINCT order_id FROM new_rows));
+  ELSIF TG_OP = 'UPDATE' THEN
+    PERFORM public.refresh_order_search(ARRAY(
+      SELECT order_id FROM new_rows UNION SELECT order_id FROM old_rows));
+  ELSE
+    PERFORM public.refresh_order_search(ARRAY(SELECT DISTINCT order_id FROM old_rows));
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+-- A customer's name, email or phone is indexed on each of their orders
+CREATE OR REPLACE FUNCTION public.order_search_customers() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+  PERFORM public.refresh_order_search(ARRAY(
+    SELECT o.order_id
+      FROM new_rows n
+      JOIN old_rows p ON p.customer_id = n.customer_id
+      JOIN public.orders o ON o.customer_id = n.customer_id
+     WHERE (n.name, n.email, n.phone) IS DISTINCT FROM (p.name, p.email, p.phone)));
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_orders_search_ins ON public.orders;
+DROP TRIGGER IF EXISTS trg_orders_search_upd ON public.orders;
+CREATE TRIGGER trg_orders_search_ins AFTER INSERT ON public.orders
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.order_search_orders();
+CREATE TRIGGER trg_orders_search_upd AFTER UPDATE ON public.orders
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.order_search_orders();
+
+DROP TRIGGER IF EXISTS trg_order_items_search_ins ON public.order_items;
+DROP TRIGGER IF EXISTS trg_order_items_search_upd ON public.order_items;
+DROP TRIGGER IF EXISTS trg_order_items_search_del ON public.order_items;
+CREATE TRIGGER trg_order_items_search_ins AFTER INSERT ON public.order_items
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.order_search_children();
+CREATE TRIGGER trg_order_items_search_upd AFTER UPDATE ON public.order_items
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.order_search_children();
+CREATE TRIGGER trg_order_items_search_del AFTER DELETE ON public.order_items
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.order_search_children();
+
+DROP TRIGGER IF EXISTS trg_order_specs_search_ins ON public.order_specs;
+DROP TRIGGER IF EXISTS trg_order_specs_search_upd ON public.order_specs;
+DROP TRIGGER IF EXISTS trg_order_specs_search_del ON public.order_specs;
+CREATE TRIGGER trg_order_specs_search_ins AFTER INSERT ON public.order_specs
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.order_search_children();
+CREATE TRIGGER trg_order_specs_search_upd AFTER UPDATE ON public.order_specs
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.order_search_children();
+CREATE TRIGGER trg_order_specs_search_del AFTER DELETE ON public.order_specs
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.order_search_children();
+
+DROP TRIGGER IF EXISTS trg_customers_search_upd ON public.customers;
+CREATE TRIGGER trg_customers_search_upd AFTER UPDATE ON public.customers
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.order_search_customers();
+
+SELECT public.refresh_order_search(ARRAY(SELECT order_id FROM public.orders));
@@ -0,0 +1,31 @@
+--
+-- Barcodes for individual order items (chairs, cushions, ...).
+--
+-- Every item gets a barcode when it is inserted, from its own sequence
+-- ("IT00000042"), and existing items are given one here. The barcodes are
+-- printed as Code 128 labels (backend/labels.py), and POST /scan/item
+-- resolves a scanned barcode to its item and order through the unique
+-- index on order_items.barcode, updating the item's status in the same
+-- statement (scan_item in backend/scans.py).
+--
+-- order_items has had a BEFORE UPDATE trigger setting updated_at since the
+-- original schema, but never the column, so no item could be updated; the
+-- column is added here (and to the archive copy, see 0011).
+--
+
+ALTER TABLE public.order_items
+    ADD COLUMN IF NOT EXISTS updated_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE archive.order_items
+    ADD COLUMN IF NOT EXISTS updated_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP;
+
+CREATE SEQUENCE IF NOT EXISTS public.order_item_barcode_seq;
+
+ALTER TABLE public.order_items
+    ALTER COLUMN barcode SET DEFAULT 'IT' || lpad(nextval('public.order_item_barcode_seq')::text, 8, '0');
+
+UPDATE public.order_items
+   SET barcode = DEFAULT
+ WHERE barcode IS NULL;
+UPDATE archive.order_items
+   SET barcode = 'IT' || lpad(nextval('public.order_item_barcode_seq')::text, 8, '0')
+ WHERE barcode IS NULL;
@@ -0,0 +1,131 @@
+--
+-- Order counts behind the master dashboard's filter dropdowns (customer,
+-- status, due date), kept current by triggers on orders so an unfiltered
+-- dashboard reads a few small tables instead of grouping every order
+-- (fetch_facets in backend/dashboard.py). Only searches, which narrow the
+-- counts to the matching orders, still count live.
+--
+-- Like the milestone rollups (0003) the trigger is statement-level with
+-- transition tables; an UPDATE that changes no order's customer, status or
+-- due date (most of them) returns after one look at its rows. Orders moved
+-- to the archive schema leave the counts with their DELETE.
+-- SELECT public.rebuild_order_facets() (also run by `python -m backend.rollups`)
+-- recomputes them from scratch.
+--
+
+CREATE TABLE IF NOT EXISTS public.order_facet_customers (
+    customer_id integer PRIMARY KEY,
+    total integer DEFAULT 0 NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS public.order_facet_statuses (
+    progress_status character varying(16) PRIMARY KEY,
+    total integer DEFAULT 0 NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS public.order_facet_due_dates (
+    due_date date PRIMARY KEY,
+    total integer DEFAULT 0 NOT NULL
+);
+
+-- Applies +1 for every new order row and -1 for every old one
+CREATE OR REPLACE FUNCTION public.apply_order_facets() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+  delta text;
+BEGIN
+  IF TG_OP = 'UPDATE' THEN
+    PERFORM 1
+       FROM new_rows n
+       JOIN old_rows o ON o.order_id = n.order_id
+      WHERE (n.customer_id, n.progress_status, n.due_date)
+            IS DISTINCT FROM (o.customer_id, o.progress_status, o.due_date)
+      LIMIT 1;
+    IF NOT FOUND THEN
+      RETURN NULL;
+    END IF;
+  END IF;
+
+  delta := CASE TG_OP
+    WHEN 'INSERT' THEN
+      'SELECT customer_id, progress_status, due_date, 1 AS d FROM new_rows'
+    WHEN 'DELETE' THEN
+      'SELECT customer_id, progress_status, due_date, -1 AS d FROM old_rows'
+    ELSE
+      'SELECT customer_id, progress_status, due_date, 1 AS d FROM new_rows
+       UNION ALL
+       SELECT customer_id, progress_status, due_date, -1 AS d FROM old_rows'
+  END;
+
+  EXECUTE format($f$
+    INSERT INTO public.order_facet_customers AS f (customer_id, total)
+    SELECT customer_id, SUM(d) FROM (%s) delta
+     WHERE customer_id IS NOT NULL
+     GROUP BY customer_id
+    HAVING SUM(d) <> 0
+    ON CONFLICT (customer_id) DO UPDATE SET total = f.total + EXCLUDED.total
+  $f$, delta);
+
+  EXECUTE format($f$
+    INSERT INTO public.order_facet_statuses AS f (progress_status, total)
+    SELECT progress_status, SUM(d) FROM (%s) delta
+     GROUP BY progress_status
+    HAVING SUM(d) <> 0
+    ON CONFLICT (progress_status) DO UPDATE SET total = f.total + EXCLUDED.total
+  $f$, delta);
+
+  EXECUTE format($f$
+    INSERT INTO public.order_facet_due_dates AS f (due_date, total)
+    SELECT due_date, SUM(d) FROM (%s) delta
+     WHERE due_date IS NOT NULL
+     GROUP BY due_date
+    HAVING SUM(d) <> 0
+    ON CONFLICT (due_date) DO UPDATE SET total = f.total + EXCLUDED.total
+  $f$, delta);
+
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_orders_facets_ins ON public.orders;
+DROP TRIGGER IF EXISTS trg_orders_facets_upd ON public.orders;
+DROP TRIGGER IF EXISTS trg_orders_facets_del ON public.orders;
+CREATE TRIGGER trg_orders_facets_ins AFTER INSERT ON public.orders
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_order_facets();
+CREATE TRIGGER trg_orders_facets_upd AFTER UPDATE ON public.orders
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_order_facets();
+CREATE TRIGGER trg_orders_facets_del AFTER DELETE ON public.orders
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.apply_order_facets();
+
+-- Recompute the counts from orders. Blocks order writes (not reads) while
+-- it runs so nothing changes underneath it.
+CREATE OR REPLACE FUNCTION public.rebuild_order_facets() RETURNS void
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+  LOCK TABLE public.orders IN SHARE MODE;
+
+  DELETE FROM public.order_facet_customers;
+  INSERT INTO public.order_facet_customers (customer_id, total)
+  SELECT customer_id, COUNT(*) FROM public.orders
+   WHERE customer_id IS NOT NULL
+   GROUP BY customer_id;
+
+  DELETE FROM public.order_facet_statuses;
+  INSERT INTO public.order_facet_statuses (progress_status, total)
+  SELECT progress_status, COUNT(*) FROM public.orders
+   GROUP BY progress_status;
+
+  DELETE FROM public.order_facet_due_dates;
+  INSERT INTO public.order_facet_due_dates (due_date, total)
+  SELECT due_date, COUNT(*) FROM public.orders
+   WHERE due_date IS NOT NULL
+   GROUP BY due_date;
+END;
+$$;
+
+SELECT public.rebuild_order_facets();
@@ -0,0 +1,68 @@
+--
+-- Order pages also show an order's items, specs and customer details, and
+-- each process caches them (backend/cache.py). Publish changes to those on
+-- "opts_changes" as well, so every process drops its cached copy
+-- (backend/live.py): an item scanned through one gunicorn worker shows up
+-- on the order page served by another.
+--
+-- Items and specs reuse notify_order_changes() from 0006. A customer's
+-- name, email and phone appear on each of their orders; only updates that
+-- change one of those notify (not e.g. a new registration token).
+--
+
+DROP TRIGGER IF EXISTS trg_order_items_notify_ins ON public.order_items;
+DROP TRIGGER IF EXISTS trg_order_items_notify_upd ON public.order_items;
+DROP TRIGGER IF EXISTS trg_order_items_notify_del ON public.order_items;
+CREATE TRIGGER trg_order_items_notify_ins AFTER INSERT ON public.order_items
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_order_changes();
+CREATE TRIGGER trg_order_items_notify_upd AFTER UPDATE ON public.order_items
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_order_changes();
+CREATE TRIGGER trg_order_items_notify_del AFTER DELETE ON public.order_items
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_order_changes();
+
+DROP TRIGGER IF EXISTS trg_order_specs_notify_ins ON public.order_specs;
+DROP TRIGGER IF EXISTS trg_order_specs_notify_upd ON public.order_specs;
+DROP TRIGGER IF EXISTS trg_order_specs_notify_del ON public.order_specs;
+CREATE TRIGGER trg_order_specs_notify_ins AFTER INSERT ON public.order_specs
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_order_changes();
+CREATE TRIGGER trg_order_specs_notify_upd AFTER UPDATE ON public.order_specs
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_order_changes();
+CREATE TRIGGER trg_order_specs_notify_del AFTER DELETE ON public.order_specs
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_order_changes();
+
+CREATE OR REPLACE FUNCTION public.notify_customer_changes() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+  ids integer[];
+BEGIN
+  SELECT array_agg(o.order_id) INTO ids
+    FROM new_rows n
+    JOIN old_rows p ON p.customer_id = n.customer_id
+    JOIN public.orders o ON o.customer_id = n.customer_id
+   WHERE (n.name, n.email, n.phone) IS DISTINCT FROM (p.name, p.email, p.phone);
+
+  IF ids IS NULL THEN
+    RETURN NULL;
+  END IF;
+  IF array_length(ids, 1) > 500 THEN
+    PERFORM pg_notify('opts_changes', json_build_object(
+      'table', TG_TABLE_NAME, 'op', TG_OP, 'reload', true)::text);
+  ELSE
+    PERFORM pg_notify('opts_changes', json_build_object(
+      'table', TG_TABLE_NAME, 'op', TG_OP, 'order_ids', ids)::text);
+  END IF;
+  RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_customers_notify_upd ON public.customers;
+CREATE TRIGGER trg_customers_notify_upd AFTER UPDATE ON public.customers
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.notify_customer_changes();
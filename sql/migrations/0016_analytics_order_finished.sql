@@ -0,0 +1,68 @@
+--
+-- Counts an order as finished (analytics orders_finished, see 0009) at the
+-- completion that leaves every one of its milestones Completed, rather than
+-- at the completion of its highest-numbered milestone: milestones can be
+-- completed in any order, and completing the last one says nothing about
+-- the others.
+--
+-- A milestone's status at an event is the newest logged status up to that
+-- event; before its first event, the status that event replaced; and for a
+-- milestone with no events, its current status. The trigger and the rebuild
+-- share analytics_completions_sql, so both use the same rule.
+--
+
+-- Same as in 0011, apart from `finished`
+CREATE OR REPLACE FUNCTION public.analytics_completions_sql(events text) RETURNS text
+    LANGUAGE sql IMMUTABLE
+    AS $$
+  SELECT format($f$
+    SELECT n.scan_time,
+           m.milestone_name,
+           EXTRACT(epoch FROM n.scan_time - COALESCE(prev.at, o.order_date::timestamp)) AS stage_seconds,
+           NOT EXISTS (
+             SELECT 1
+               FROM (SELECT milestone_id, status FROM public.order_milestones
+                      WHERE order_id = n.order_id
+                     UNION ALL
+                     SELECT milestone_id, status FROM archive.order_milestones
+                      WHERE order_id = n.order_id) om
+               LEFT JOIN LATERAL (
+                     SELECT e.status
+                       FROM public.scan_events e
+                      WHERE e.order_id = n.order_id
+                        AND e.milestone_id = om.milestone_id
+                        AND (e.scan_time, e.scan_id) <= (n.scan_time, n.scan_id)
+                      ORDER BY e.scan_time DESC, e.scan_id DESC
+                      LIMIT 1
+                   ) upto ON TRUE
+               LEFT JOIN LATERAL (
+                     SELECT e.previous_status
+                       FROM public.scan_events e
+                      WHERE e.order_id = n.order_id
+                        AND e.milestone_id = om.milestone_id
+                      ORDER BY e.scan_time, e.scan_id
+                      LIMIT 1
+                   ) first ON upto.status IS NULL
+              WHERE COALESCE(upto.status, first.previous_status, om.status) <> 'Completed'
+           ) AS finished
+      FROM %s n
+      JOIN (SELECT milestone_id, milestone_name FROM public.order_milestones
+            UNION ALL
+            SELECT milestone_id, milestone_name FROM archive.order_milestones) m
+        ON m.milestone_id = n.milestone_id
+      LEFT JOIN (SELECT order_id, order_date FROM public.orders
+                 UNION ALL
+                 SELECT order_id, order_date FROM archive.orders) o
+        ON o.order_id = n.order_id
+      LEFT JOIN LATERAL (
+            SELECT max(e.scan_time) AS at
+              FROM public.scan_events e
+             WHERE e.order_id = n.order_id
+               AND e.status = 'Completed'
+               AND e.scan_time < n.scan_time
+           ) prev ON TRUE
+     WHERE n.status = 'Completed'
+  $f$, events)
+$$;
+
+SELECT public.rebuild_analytics();
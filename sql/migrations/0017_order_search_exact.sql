@@ -0,0 +1,14 @@
+--
+-- order_search_exact_query(): like order_search_query() (0012), but every
+-- word must be a whole invoice/customer word (weight A) rather than a prefix
+-- of any indexed word. backend/search.py ranks only a capped number of the
+-- newest prefix matches; exact hits are collected separately so an older
+-- order whose invoice number or customer was typed in full is never cut off.
+--
+
+CREATE OR REPLACE FUNCTION public.order_search_exact_query(q text) RETURNS tsquery
+    LANGUAGE sql IMMUTABLE STRICT
+    AS $$
+  SELECT string_agg(quote_literal(lexeme) || ':A', ' & ')::tsquery
+    FROM unnest(to_tsvector('simple', q));
+$$;
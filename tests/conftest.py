@@ -0,0 +1,106 @@
+# shared fixtures; run the suite with `python -m pytest` from the repo root
+# tests that need PostgreSQL take the `database` fixture: it uses the same
+# DB_* / DATABASE_URL settings as the app, skips when no server answers, and
+# rolls back everything the test wrote (backend.db.rolled_back);
+# `database_server` only does the skipping
+# tests that count statements take `fake_db` instead: no server needed, each
+# statement is answered with the rows registered for it
+import os
+
+# importing backend.db must not need a server
+os.environ.setdefault("DB_MIN_CONN", "0")
+# every page load reads the database, so statement counts don't depend on
+# what an earlier test left in the order cache
+os.environ.setdefault("ORDER_CACHE_TTL", "0")
+
+import psycopg2
+import pytest
+
+from backend import db
+
+@pytest.fixture
+def database_server() -> int:
+    """Skips the test when no server answers; returns its server_version_num."""
+    try:
+        conn = db.direct_connection()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"no database: {str(e).strip().splitlines()[0]}")
+    try:
+        return conn.server_version
+    finally:
+        conn.close()
+
+@pytest.fixture
+def database(database_server):
+    with db.rolled_back() as conn:
+        yield conn
+
+class FakeCursor:
+    def __init__(self, answers: list):
+        self._answers = answers
+        self._rows = []
+        self.description = None
+        self.rowcount = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        self._rows, self.description = [], None
+        for needle, rows in self._answers:
+            if needle in sql:
+                self._rows, self.description = list(rows), [("fake",)]
+                break
+        self.rowcount = len(self._rows)
+
+    def fetchall(self) -> list:
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+class FakeConnection:
+    closed = False
+
+    def __init__(self, answers: list):
+        self._answers = answers
+
+    def cursor(self):
+        return FakeCursor(self._answers)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+class FakeDatabase:
+    """
+    Stands in for the connection pool. answer(needle, rows) makes every
+    statement containing `needle` return `rows` (first match wins); other
+    statements return nothing.
+    """
+
+    def __init__(self):
+        self.answers = []
+
+    def answer(self, needle: str, rows: list):
+        self.answers.append((needle, rows))
+
+    def getconn(self, timeout: float | None = None):
+        return FakeConnection(self.answers)
+
+    def putconn(self, conn, close: bool = False):
+        pass
+
+    def stats(self) -> dict:
+        return {"fake": True}
+
+@pytest.fixture
+def fake_db(monkeypatch) -> FakeDatabase:
+    fake = FakeDatabase()
+    monkeypatch.setattr(db, "_pool", fake)
+    return fake
@@ -0,0 +1,48 @@
+# an order counts as finished (analytics orders_finished) at the completion
+# that leaves all of its milestones Completed, in whatever order they were done
+from backend.db import execute
+
+def finished_by_milestone() -> dict:
+    rows = execute(
+        "SELECT milestone_name, SUM(orders_finished) AS finished "
+        "FROM analytics_milestone_daily WHERE milestone_name LIKE 'Finish Test %%' "
+        "GROUP BY milestone_name"
+    )
+    return {r["milestone_name"]: r["finished"] for r in rows}
+
+def complete(order_id: int, milestone_id: int):
+    execute("UPDATE order_milestones SET status = 'Completed' WHERE milestone_id = %s",
+            (milestone_id,))
+    execute(
+        "INSERT INTO scan_events (order_id, milestone_id, status, previous_status, source) "
+        "VALUES (%s, %s, 'Completed', 'In Progress', 'test')",
+        (order_id, milestone_id)
+    )
+
+def test_order_finishes_with_its_last_open_milestone(database):
+    customer = execute(
+        "INSERT INTO customers (name, email) VALUES (%s, %s) RETURNING customer_id",
+        ("Finish Test", "analytics-finish-test@example.com")
+    )
+    order = execute(
+        "INSERT INTO orders (customer_id, invoice_no) VALUES (%s, 'FINISH-TEST') RETURNING order_id",
+        (customer["customer_id"],)
+    )
+    first, last = (
+        execute(
+            "INSERT INTO order_milestones (order_id, milestone_name, status) "
+            "VALUES (%s, %s, 'In Progress') RETURNING milestone_id",
+            (order["order_id"], name)
+        )["milestone_id"]
+        for name in ("Finish Test A", "Finish Test B")
+    )
+
+    # the highest milestone first: the other one is still open
+    complete(order["order_id"], last)
+    assert finished_by_milestone() == {"Finish Test B": 0}
+    complete(order["order_id"], first)
+    assert finished_by_milestone() == {"Finish Test A": 1, "Finish Test B": 0}
+
+    # the rebuild agrees with the trigger
+    execute("SELECT rebuild_analytics()")
+    assert finished_by_milestone() == {"Finish Test A": 1, "Finish Test B": 0}
@@ -0,0 +1,26 @@
+# the in-process order cache (backend/cache.py): invalidations, including
+# invalidate_all() from the change feed, must stop a load that was already
+# running from caching what it read
+from backend.cache import LRUCache
+
+def test_invalidate_all_drops_entries_and_loads_in_flight():
+    cache = LRUCache(max_entries=10, ttl=60)
+    cache.set("order:1", cache.version("order:1"), "cached")
+    loading = cache.version("order:2")   # a load starts...
+    cache.invalidate_all()               # ...another process writes
+    cache.set("order:2", loading, "stale")
+    assert cache.get("order:1") == (False, None)
+    assert cache.get("order:2") == (False, None)
+    cache.set("order:1", cache.version("order:1"), "fresh")
+    assert cache.get("order:1") == (True, "fresh")
+
+def test_bounding_versions_keeps_current_entries():
+    cache = LRUCache(max_entries=2, ttl=60)
+    cache.set("order:1", cache.version("order:1"), "one")
+    loading = cache.version("order:2")
+    cache.invalidate("order:2")
+    for n in range(100, 125):            # enough to prune the version map
+        cache.invalidate(f"order:{n}")
+    cache.set("order:2", loading, "stale")
+    assert cache.get("order:1") == (True, "one")
+    assert cache.get("order:2") == (False, None)
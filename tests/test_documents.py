@@ -0,0 +1,70 @@
+# /work_orders/ only serves the file names stored on an order, and only to
+# staff or (client copy) the customer who owns it; others get a 404 before
+# anything is rendered; batch printing keeps the order it is given
+from datetime import datetime
+
+import pytest
+
+from app import app
+from backend import documents
+from backend.dashboard import fetch_order_ids, parse_filters
+from backend.db import execute
+from tests.test_order_page import order_row
+
+LOUSSO = "/work_orders/lousso_pat_doe_order_42.pdf"
+CLIENT = "/work_orders/client_pat_doe_order_42.pdf"
+
+@pytest.fixture
+def client(fake_db, monkeypatch, tmp_path):
+    monkeypatch.setattr(documents, "WORK_DIR", tmp_path)
+    row = order_row(42, 2)
+    row.update(notes="", order_date=row["created_at"])  # drawn on the PDF
+    fake_db.answer("FROM public.orders o", [row])
+    return app.test_client()
+
+def log_in(client, customer_id: int, staff: bool = False):
+    with client.session_transaction() as session:
+        session.update(customer_id=customer_id, user_id=customer_id, is_staff=staff,
+                       customer_name="Pat",
+                       customer_name_at=int(datetime.now().timestamp()))
+
+def test_anonymous_gets_404(client):
+    assert client.get(CLIENT).status_code == 404
+    assert not list(documents.WORK_DIR.iterdir())
+
+def test_customer_gets_only_their_client_copy(client):
+    log_in(client, 7)
+    assert client.get(CLIENT).status_code == 200
+    assert client.get(LOUSSO).status_code == 404
+    log_in(client, 8)
+    assert client.get(CLIENT).status_code == 404
+
+def test_staff_need_the_stored_name(client):
+    log_in(client, 1, staff=True)
+    assert client.get(LOUSSO).status_code == 200
+    assert client.get("/work_orders/lousso_x_order_42.pdf").status_code == 404
+    # only the finished PDFs are left, no temp files
+    assert sorted(p.name.split("_")[0] for p in documents.WORK_DIR.iterdir()) == ["lousso"]
+
+def test_batch_print_keeps_due_date_order(database, monkeypatch):
+    customer = execute(
+        "INSERT INTO customers (name, email) VALUES (%s, %s) RETURNING customer_id",
+        ("Print Test", "batch-print-test@example.com")
+    )
+    # newer orders are due sooner, so due-date order is the reverse of id order
+    for n, due in enumerate(("2030-03-01", "2030-02-01", "2030-01-01")):
+        execute(
+            "INSERT INTO orders (customer_id, invoice_no, due_date) VALUES (%s, %s, %s)",
+            (customer["customer_id"], f"PRINT-TEST-{n}", due)
+        )
+    ids = fetch_order_ids(parse_filters({"customer_id": str(customer["customer_id"])}), 10)
+    assert ids == sorted(ids, reverse=True)
+
+    printed = []
+    def scan_url(order_id, base_url):
+        printed.append(order_id)
+        return f"{base_url}/scan/{order_id}"
+    monkeypatch.setattr(documents, "order_scan_url", scan_url)
+    pdf = b"".join(documents.stream_work_orders(ids, "http://test", batch=2))
+    assert pdf.startswith(b"%PDF")
+    assert printed == ids
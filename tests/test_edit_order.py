@@ -0,0 +1,53 @@
+# a milestone edit made against an old version of the page is refused with
+# a 409 that shows the statuses as they are now, not as the cache last saw them,
+# on the same page /order/<id> renders (items included)
+import time
+
+import pytest
+
+import app as app_module
+from backend.db import execute
+
+@pytest.fixture
+def order(database):
+    customer = execute(
+        "INSERT INTO customers (name, email) VALUES (%s, %s) RETURNING customer_id",
+        ("Edit Test", "edit-order-test@example.com")
+    )
+    order = execute(
+        "INSERT INTO orders (customer_id, invoice_no) VALUES (%s, 'EDIT-TEST') RETURNING order_id",
+        (customer["customer_id"],)
+    )
+    milestone = execute(
+        "INSERT INTO order_milestones (order_id, milestone_name, status) "
+        "VALUES (%s, 'In Production', 'Not Started') RETURNING milestone_id, version",
+        (order["order_id"],)
+    )
+    execute("INSERT INTO order_items (order_id, product_code) VALUES (%s, 'EDIT-CHAIR')",
+            (order["order_id"],))
+    return order["order_id"], milestone["milestone_id"], milestone["version"]
+
+@pytest.fixture
+def staff_client():
+    client = app_module.app.test_client()
+    with client.session_transaction() as session:
+        session.update(customer_id=1, user_id=1, is_staff=True, customer_name="Staff",
+                       customer_name_at=int(time.time()))
+    return client
+
+def test_conflict_shows_current_statuses(order, staff_client, monkeypatch):
+    order_id, milestone_id, version = order
+    # someone else saves first, and this process's cache hasn't heard yet
+    execute("UPDATE order_milestones SET status = 'Completed' WHERE milestone_id = %s",
+            (milestone_id,))
+    monkeypatch.setattr(app_module, "get_order", lambda order_id: pytest.fail("read the cache"))
+
+    response = staff_client.post(f"/order/{order_id}/edit", data={
+        f"milestone_status_{milestone_id}": "In Progress",
+        f"milestone_was_{milestone_id}": "Not Started",
+        f"milestone_version_{milestone_id}": version,
+    })
+    assert response.status_code == 409
+    page = response.get_data(as_text=True)
+    assert f'name="milestone_was_{milestone_id}" value="Completed"' in page
+    assert "EDIT-CHAIR" in page
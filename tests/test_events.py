@@ -0,0 +1,33 @@
+# the scan event buffer (backend/events.py): a row the database rejects is
+# dropped on its own, so it can't hold back the rest of the batch or every
+# later flush
+import psycopg2
+
+from backend import events
+from backend.db import execute
+from backend.events import EventBuffer
+
+def test_bad_row_is_dropped_and_the_rest_written(database, monkeypatch):
+    buffer = EventBuffer()
+    monkeypatch.setattr(buffer, "_start", lambda: None)  # flushed by hand below
+    for n in range(5):
+        buffer.record(order_id=-1, milestone_id=n, previous_status="Not Started",
+                      source="events-test",
+                      status="No Such Status" if n == 3 else "Completed")
+    assert buffer.flush() == 4
+    assert buffer.flush() == 0   # nothing was put back for retry
+    rows = execute("SELECT milestone_id FROM scan_events WHERE source = 'events-test' "
+                   "ORDER BY scan_id")
+    assert [r["milestone_id"] for r in rows] == [0, 1, 2, 4]
+
+def test_unreachable_database_keeps_the_batch(monkeypatch):
+    def unreachable():
+        raise psycopg2.OperationalError("connection refused")
+    monkeypatch.setattr(events, "transaction", unreachable)
+    buffer = EventBuffer()
+    monkeypatch.setattr(buffer, "_start", lambda: None)
+    for n in range(3):
+        buffer.record(order_id=-1, milestone_id=n, status="Completed",
+                      previous_status="Not Started", source="events-test")
+    assert buffer.flush() == 0
+    assert [row[2] for row in buffer._pending] == [0, 1, 2]
@@ -0,0 +1,36 @@
+# the document job queue (backend/jobs.py): a job whose lease runs out is
+# taken over, but not once it has used its last attempt, since a job that
+# kills its worker never gets to fail_job()
+import pytest
+
+from backend.db import execute
+from backend.jobs import claim_job
+
+@pytest.fixture
+def order_id(database):
+    customer = execute(
+        "INSERT INTO customers (name, email) VALUES (%s, %s) RETURNING customer_id",
+        ("Job Test", "jobs-test@example.com")
+    )
+    return execute(
+        "INSERT INTO orders (customer_id, invoice_no) VALUES (%s, 'JOB-TEST') RETURNING order_id",
+        (customer["customer_id"],)
+    )["order_id"]
+
+def expired_job(order_id: int, kind: str, attempts: int) -> int:
+    # leases that ran out long before anything else in the queue was due
+    return execute(
+        "INSERT INTO document_jobs (order_id, kind, status, attempts, max_attempts, run_after) "
+        "VALUES (%s, %s, 'running', %s, 3, '2000-01-01') RETURNING job_id",
+        (order_id, kind, attempts)
+    )["job_id"]
+
+def job_status(job_id: int) -> str:
+    return execute("SELECT status FROM document_jobs WHERE job_id = %s", (job_id,))[0]["status"]
+
+def test_expired_lease_is_retried_until_attempts_run_out(order_id):
+    spent = expired_job(order_id, "job-test-spent", attempts=3)
+    retry = expired_job(order_id, "job-test-retry", attempts=2)
+    job = claim_job()
+    assert job["job_id"] == retry and job["attempts"] == 3
+    assert job_status(spent) == "failed"
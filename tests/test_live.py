@@ -0,0 +1,34 @@
+# /events streams end after a while so they don't hold a web thread for good;
+# a reconnect with the last event id gets the changes it missed
+import time
+
+import pytest
+
+from backend import live
+
+@pytest.fixture
+def feed(monkeypatch):
+    feed = live.ChangeFeed()
+    monkeypatch.setattr(feed, "start", lambda: None)  # no LISTEN connection
+    monkeypatch.setattr(live, "feed", feed)
+    feed._forget_history()
+    feed._complete_since -= 60  # as if the listener had been up for a minute
+    return feed
+
+def test_stream_ends_after_its_lifetime(feed):
+    started = time.monotonic()
+    chunks = list(live.event_stream(keepalive=0.05, lifetime=0.2))
+    assert time.monotonic() - started < 1
+    assert chunks[0].startswith("retry: 3000\nid: ")
+    assert not feed._subscribers
+
+def test_reconnect_replays_missed_changes(feed):
+    seen = time.time() - 5  # last id the browser saw, older than the margin
+    feed.publish({"orders": [], "deleted": [1]})
+    q = feed.subscribe(since=seen)
+    assert q.get_nowait()[1] == {"orders": [], "deleted": [1]}
+    assert q.empty()
+
+def test_reconnect_from_before_history_reloads(feed):
+    q = feed.subscribe(since=feed._complete_since - 10)
+    assert q.get_nowait()[1] == {"reload": True}
@@ -0,0 +1,54 @@
+# /metrics adds up every process's snapshot file (backend/metrics.py):
+# exited processes are folded into one archive file, counted once, and a
+# reused pid doesn't take over an exited process's numbers
+import json
+import os
+
+import pytest
+
+from backend import metrics
+from backend.db import _statement_label
+
+LINE = 'opts_http_requests_total{endpoint="metrics-test",method="GET",status="200"}'
+
+@pytest.fixture
+def metrics_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    return tmp_path
+
+def exited_snapshot(directory, name: str, requests: int):
+    # this test's own pid, but "started" at another time: a process that
+    # had the pid before and has exited
+    snapshot = {"opts_http_requests_total": [[["metrics-test", "GET", "200"], requests]],
+                "opts_db_pool_connections": [[["idle"], 3]]}
+    (directory / name).write_text(json.dumps(
+        {"pid": os.getpid(), "started": -1, "metrics": snapshot}))
+
+def total(text: str) -> int:
+    return sum(int(line.rsplit(" ", 1)[1]) for line in text.splitlines()
+               if line.startswith(LINE))
+
+def test_exited_processes_are_archived_once(metrics_dir):
+    exited_snapshot(metrics_dir, f"{os.getpid()}-aaaa.json", 2)
+    exited_snapshot(metrics_dir, f"{os.getpid()}-bbbb.json", 3)
+    assert total(metrics.render()) == 5
+    assert sorted(p.name for p in metrics_dir.glob("*.json")) == [metrics.ARCHIVE_FILE]
+    # later scrapes read the archive, still counting each process once
+    exited_snapshot(metrics_dir, f"{os.getpid()}-cccc.json", 1)
+    assert total(metrics.render()) == 6
+    assert total(metrics.render()) == 6
+    assert 'opts_db_pool_connections{state="idle"} 3' not in metrics.render()
+
+def test_interrupted_archive_does_not_count_twice(metrics_dir):
+    exited_snapshot(metrics_dir, f"{os.getpid()}-aaaa.json", 2)
+    metrics.render()
+    # as if the scrape had stopped after writing the archive
+    exited_snapshot(metrics_dir, f"{os.getpid()}-aaaa.json", 2)
+    assert total(metrics.render()) == 2
+
+def test_long_statements_keep_separate_labels():
+    head = "SELECT " + ", ".join(f"column_{n}" for n in range(40))
+    first, second = _statement_label(head + " FROM a"), _statement_label(head + " FROM b")
+    assert first != second
+    assert len(first) <= 120 and first.startswith("SELECT column_0, column_1")
+    assert _statement_label("SELECT 1") == "SELECT 1"
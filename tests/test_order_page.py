@@ -0,0 +1,53 @@
+# /order/<id> loads the order, its specs, items and milestones in one
+# statement (backend/orders.py), so the page costs the same however many
+# milestones and items the order has; staff also get the timeline query
+from datetime import date, datetime
+
+import pytest
+
+from app import app
+from backend.db import record_queries
+
+def order_row(order_id: int, count: int) -> dict:
+    """The single row load_orders() reads, with `count` items and milestones."""
+    return {
+        "order_id": order_id, "id": order_id, "customer_id": 7,
+        "invoice_no": f"INV-{order_id}", "customer_name": "Pat Doe",
+        "email": "pat@example.com", "phone": "555-0100",
+        "due_date": date(2030, 1, 31), "created_at": datetime(2030, 1, 1),
+        "completed_at": None, "progress_status": "In Progress",
+        "lousso_pdf_path": None, "client_pdf_path": None,
+        "specs_json": {"order_id": order_id, "quantity": count},
+        "items_json": [
+            {"item_id": n, "product_code": f"CHAIR-{n}",
+             "barcode": f"IT{n:08d}", "status": "Pending"}
+            for n in range(1, count + 1)
+        ],
+        "milestones_json": [
+            {"milestone_id": n, "milestone_name": f"Stage {n}", "status": "Not Started",
+             "is_approved": False, "is_client_action": False,
+             "timestamp": None, "version": 1}
+            for n in range(1, count + 1)
+        ],
+    }
+
+def statements_for_order_page(fake_db, count: int, staff: bool) -> int:
+    fake_db.answer("FROM public.orders o", [order_row(42, count)])
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session.update(customer_id=1, user_id=1, is_staff=staff,
+                       customer_name="Staff" if staff else "Pat",
+                       customer_name_at=int(datetime.now().timestamp()))
+    with record_queries() as queries:
+        response = client.get("/order/42")
+    assert response.status_code == 200
+    assert f"Stage {count}" in response.get_data(as_text=True)
+    return queries.count
+
+@pytest.mark.parametrize("count", [1, 50])
+def test_order_page_is_one_statement(fake_db, count):
+    assert statements_for_order_page(fake_db, count, staff=False) == 1
+
+@pytest.mark.parametrize("count", [1, 50])
+def test_staff_order_page_adds_only_the_timeline(fake_db, count):
+    assert statements_for_order_page(fake_db, count, staff=True) == 2
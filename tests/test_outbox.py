@@ -0,0 +1,58 @@
+# the outbox sender against a local SMTP server (aiosmtpd), as production
+# would use Gmail: queued rows go out over one connection and are marked sent
+import socket
+
+import pytest
+
+from backend.db import execute, transaction
+from backend.outbox import SMTPSender, drain_outbox, queue_email
+
+aiosmtpd = pytest.importorskip("aiosmtpd.controller")
+
+class Inbox:
+    """aiosmtpd handler that keeps every message it receives."""
+
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        return "250 OK"
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def smtp_server():
+    inbox = Inbox()
+    controller = aiosmtpd.Controller(inbox, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    try:
+        yield controller, inbox
+    finally:
+        controller.stop()
+
+def test_drain_outbox_sends_queued_emails(database, smtp_server):
+    controller, inbox = smtp_server
+    recipients = ["outbox-test-1@example.com", "outbox-test-2@example.com"]
+    with transaction() as tx:
+        for n, recipient in enumerate(recipients, start=1):
+            queue_email(tx, recipient, f"Test {n}", f"Body {n}")
+
+    sender = SMTPSender(host=controller.hostname, port=controller.port, use_tls=False,
+                        username="", password="", default_sender="opts@example.com")
+    try:
+        assert drain_outbox(sender) >= 2
+    finally:
+        sender.close()
+
+    delivered = {rcpt for m in inbox.messages for rcpt in m.rcpt_tos}
+    assert set(recipients) <= delivered
+    rows = execute(
+        "SELECT recipient, status, sent_at FROM email_outbox WHERE recipient = ANY(%s)",
+        (recipients,)
+    )
+    assert len(rows) == 2
+    assert all(r["status"] == "sent" and r["sent_at"] for r in rows)
@@ -0,0 +1,13 @@
+# the query-plan check (backend/plan_check.py) as part of the suite: every
+# statement plans, none scans a hot table, and SQL built at run time is
+# reached by a sample call
+import pytest
+
+from backend import plan_check
+
+def test_query_plans(database_server):
+    if database_server < 160000:
+        pytest.skip("EXPLAIN (GENERIC_PLAN) needs PostgreSQL 16+")
+    failures = [r for r in plan_check.check_plans() if "error" in r]
+    assert not failures, "\n".join(
+        f"{r['source']}: {r['error']}\n    {r['sql'][:200]}" for r in failures)
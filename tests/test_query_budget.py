@@ -0,0 +1,55 @@
+# statement budgets for the busiest staff pages, checked with
+# assert_max_queries against the fake pool (no server needed): the portal
+# is one page of orders, the milestone summary and the facet counts however
+# many orders are shown; an order page is the order plus the staff timeline
+from datetime import date, datetime
+
+import pytest
+
+from app import app
+from backend.db import assert_max_queries
+from tests.test_order_page import order_row
+
+def dashboard_rows(count: int) -> list:
+    return [
+        {"order_id": n, "invoice_no": f"INV-{n}", "due_date": date(2030, 1, 31),
+         "lousso_pdf_path": None, "customer_name": f"Customer {n}",
+         "customer_email": f"c{n}@example.com", "computed_status": "In Progress"}
+        for n in range(count, 0, -1)
+    ]
+
+FACET_ROWS = [
+    {"facet": "customer", "customer_id": 7, "customer_name": "Pat Doe",
+     "computed_status": None, "due_date": None, "count": 3},
+    {"facet": "status", "customer_id": None, "customer_name": None,
+     "computed_status": "In Progress", "due_date": None, "count": 3},
+    {"facet": "due_date", "customer_id": None, "customer_name": None,
+     "computed_status": None, "due_date": date(2030, 1, 31), "count": 3},
+]
+
+@pytest.fixture
+def staff_client():
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session.update(customer_id=1, user_id=1, is_staff=True, customer_name="Staff",
+                       customer_name_at=int(datetime.now().timestamp()))
+    return client
+
+@pytest.mark.parametrize("count", [1, 50])
+def test_portal_is_three_statements(fake_db, staff_client, count):
+    fake_db.answer("o.lousso_pdf_path", dashboard_rows(count))
+    fake_db.answer("FROM milestone_summary", [{"milestone_name": "In Production", "total": 3}])
+    fake_db.answer("FROM order_facet_customers", FACET_ROWS)
+    with assert_max_queries(3) as queries:
+        response = staff_client.get("/portal")
+    assert response.status_code == 200
+    assert queries.count == 3   # the budget is met, not skipped
+    assert f"INV-{count}" in response.get_data(as_text=True)
+
+@pytest.mark.parametrize("count", [1, 50])
+def test_staff_order_page_is_two_statements(fake_db, staff_client, count):
+    fake_db.answer("FROM public.orders o", [order_row(42, count)])
+    with assert_max_queries(2) as queries:
+        response = staff_client.get("/order/42")
+    assert response.status_code == 200
+    assert queries.count == 2
@@ -0,0 +1,43 @@
+# POST /scan/<order_id> completes a milestone of that order only; a milestone
+# id from another order is a 404 and changes nothing
+import pytest
+
+from app import app
+from backend.db import execute
+
+def new_order(customer_id: int, invoice_no: str) -> tuple[int, int]:
+    order = execute(
+        "INSERT INTO orders (customer_id, invoice_no) VALUES (%s, %s) RETURNING order_id",
+        (customer_id, invoice_no)
+    )
+    milestone = execute(
+        "INSERT INTO order_milestones (order_id, milestone_name, status) "
+        "VALUES (%s, 'In Production', 'In Progress') RETURNING milestone_id",
+        (order["order_id"],)
+    )
+    return order["order_id"], milestone["milestone_id"]
+
+@pytest.fixture
+def orders(database):
+    customer = execute(
+        "INSERT INTO customers (name, email) VALUES (%s, %s) RETURNING customer_id",
+        ("Scan Test", "scan-update-test@example.com")
+    )
+    return (new_order(customer["customer_id"], "SCAN-TEST-1"),
+            new_order(customer["customer_id"], "SCAN-TEST-2"))
+
+def milestone_status(milestone_id: int) -> str:
+    return execute("SELECT status FROM order_milestones WHERE milestone_id = %s",
+                   (milestone_id,))[0]["status"]
+
+def test_scan_completes_the_orders_milestone(orders):
+    (order_id, milestone_id), _ = orders
+    response = app.test_client().post(f"/scan/{order_id}", json={"milestone_id": milestone_id})
+    assert response.status_code == 201
+    assert milestone_status(milestone_id) == "Completed"
+
+def test_scan_of_another_orders_milestone_is_404(orders):
+    (order_id, _), (_, other_milestone) = orders
+    response = app.test_client().post(f"/scan/{order_id}", json={"milestone_id": other_milestone})
+    assert response.status_code == 404
+    assert milestone_status(other_milestone) == "In Progress"
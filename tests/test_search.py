@@ -0,0 +1,44 @@
+# order search (backend/search.py): the WHERE condition match_sql() builds
+# with and without pg_trgm, and an exact invoice hit that is older than
+# every ranked prefix match
+from backend import search
+from backend.db import execute
+
+def test_match_sql_without_trigram(monkeypatch):
+    monkeypatch.setattr(search, "_trigram", False)
+    assert search.match_sql("  INV-10 ") == (
+        "(s.document @@ order_search_query(%(search_text)s))",
+        {"search_text": "INV-10"},
+    )
+    # nothing to look up word by word, and no trigram index for the rest
+    assert search.match_sql("--") is None
+    assert search.match_sql("   ") is None
+
+def test_match_sql_with_trigram(monkeypatch):
+    monkeypatch.setattr(search, "_trigram", True)
+    where, params = search.match_sql("50%_off", alias="hit")
+    assert where == (
+        "(hit.document @@ order_search_query(%(search_text)s)"
+        " OR hit.content ILIKE %(search_like)s"
+        " OR %(search_text)s <%% hit.content)"
+    )
+    assert params == {"search_text": "50%_off", "search_like": "%50\\%\\_off%"}
+    assert search.match_sql("--") is not None
+
+def test_match_sql_caps_the_query_length(monkeypatch):
+    monkeypatch.setattr(search, "_trigram", False)
+    _, params = search.match_sql("x" * (search.MAX_QUERY_LENGTH + 50))
+    assert len(params["search_text"]) == search.MAX_QUERY_LENGTH
+
+def test_exact_invoice_beats_newer_prefix_matches(database, monkeypatch):
+    monkeypatch.setattr(search, "MAX_CANDIDATES", 2)
+    customer = execute(
+        "INSERT INTO customers (name, email) VALUES (%s, %s) RETURNING customer_id",
+        ("Search Test", "search-test@example.com")
+    )
+    # the exact match is the oldest; three newer orders match its prefix
+    for invoice_no in ("ZQXS-1", "ZQXS-10", "ZQXS-11", "ZQXS-12"):
+        execute("INSERT INTO orders (customer_id, invoice_no) VALUES (%s, %s)",
+                (customer["customer_id"], invoice_no))
+    results = search.search_orders("ZQXS-1")["results"]
+    assert results[0]["invoice_no"] == "ZQXS-1"
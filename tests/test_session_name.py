@@ -0,0 +1,45 @@
+# the display name kept in the session (load_customer in app.py): file
+# downloads never touch the database, and pages read the name again only
+# once the stored copy is CUSTOMER_NAME_MAX_AGE seconds old
+import time
+
+import pytest
+
+import app as app_module
+from backend.db import execute, record_queries
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+def log_in(client, customer_id: int, name: str, read_at: int):
+    with client.session_transaction() as session:
+        session.update(customer_id=customer_id, user_id=customer_id,
+                       customer_name=name, customer_name_at=read_at)
+
+def test_static_file_runs_no_statements(client):
+    log_in(client, 1, "Pat", read_at=0)   # stale, but files skip the lookup
+    with record_queries() as queries:
+        response = client.get("/static/images/logo.png")
+        response.close()
+    assert response.status_code == 200
+    assert queries.count == 0
+
+def test_fresh_name_is_not_read_again(client):
+    log_in(client, 1, "Pat", read_at=int(time.time()))
+    with record_queries() as queries:
+        client.get("/")
+    assert queries.count == 0
+
+def test_stale_name_is_read_again(client, database):
+    row = execute(
+        "INSERT INTO customers (name, email) VALUES (%s, %s) RETURNING customer_id",
+        ("Pat Renamed", "session-name-test@example.com")
+    )
+    log_in(client, row["customer_id"], "Pat",
+           read_at=int(time.time()) - app_module.CUSTOMER_NAME_MAX_AGE)
+    with record_queries() as queries:
+        client.get("/")
+    assert queries.count == 1
+    with client.session_transaction() as session:
+        assert session["customer_name"] == "Pat Renamed"